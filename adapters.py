@@ -0,0 +1,188 @@
+"""
+Adapters por plataforma (ATS) que leem a vaga já estruturada.
+
+Gupy, Greenhouse e Workday expõem título, local, modelo de trabalho, data e
+link em JSON. Com isso os campos vão direto para as colunas de `jobs` e só a
+descrição (texto livre) segue para a IA (score/requisitos/tecnologias), ou
+nem isso, com ADAPTERS_SKIP_LLM=1.
+
+Cada adapter recebe a URL normalizada e devolve:
+    {"fields": {...colunas de jobs...}, "text": "cabeçalho + descrição"}
+ou None (cai no scraping normal).
+
+    adapter(url, conditional=True)   # GET condicional: 304 levanta NotModified
+    adapter(url, body=corpo)         # sem rede: lê o corpo salvo no cache
+                                     # (scraper.get_cached_adapter_body)
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import re
+import json
+import html
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+from scraper import fetch_json, fetch_html, _html_to_text
+
+ADAPTERS_ENABLED = os.getenv("ADAPTERS_ENABLED", "1") == "1"
+ADAPTERS_SKIP_LLM = os.getenv("ADAPTERS_SKIP_LLM", "0") == "1"
+
+AdapterFn = Callable[..., Optional[Dict[str, Any]]]
+ADAPTERS: Dict[str, AdapterFn] = {}
+
+
+def register_adapter(platform: str):
+    def deco(fn: AdapterFn) -> AdapterFn:
+        ADAPTERS[platform] = fn
+        return fn
+    return deco
+
+
+def get_adapter(platform: str) -> Optional[AdapterFn]:
+    if not ADAPTERS_ENABLED:
+        return None
+    return ADAPTERS.get(platform)
+
+
+# ---------- helpers ----------
+def _tipo_trabalho(*values: Any) -> Optional[str]:
+    """Mapeia remote/hybrid/on-site (e variações pt) para o vocabulário do projeto."""
+    t = " ".join(str(v) for v in values if v).lower()
+    if not t:
+        return None
+    if "hybrid" in t or "híbrido" in t or "hibrido" in t:
+        return "hibrido"
+    if "remote" in t or "remoto" in t or "home office" in t:
+        return "remoto"
+    if "on-site" in t or "onsite" in t or "on_site" in t or "presencial" in t or "in office" in t:
+        return "presencial"
+    return None
+
+
+def _join_location(*parts: Any) -> Optional[str]:
+    vals = [str(p).strip() for p in parts if p and str(p).strip()]
+    return ", ".join(vals) or None
+
+
+def _build(fields: Dict[str, Any], description_html: str) -> Dict[str, Any]:
+    description = _html_to_text(description_html or "")
+    header = [
+        f"Cargo: {fields.get('cargo')}" if fields.get("cargo") else "",
+        f"Empresa: {fields.get('empresa')}" if fields.get("empresa") else "",
+        f"Localidade: {fields.get('localidade')}" if fields.get("localidade") else "",
+    ]
+    text = "\n".join([h for h in header if h] + [description])
+    return {"fields": fields, "text": text}
+
+
+# ---------- Gupy ----------
+_NEXT_DATA_RE = re.compile(
+    r'<script[^>]+id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL | re.IGNORECASE
+)
+
+
+@register_adapter("gupy")
+def gupy_adapter(url: str, body: Optional[str] = None, conditional: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Páginas *.gupy.io/jobs/<id> são Next.js: a vaga inteira vem em __NEXT_DATA__.
+    """
+    page = body if body is not None else fetch_html(url, page_url=url, conditional=conditional)
+    m = _NEXT_DATA_RE.search(page)
+    if not m:
+        return None
+    data = json.loads(m.group(1))
+    props = (data.get("props") or {}).get("pageProps") or {}
+    job = props.get("job") or {}
+    if not job:
+        return None
+
+    career = props.get("careerPage") or {}
+    fields = {
+        "cargo": job.get("name") or job.get("title"),
+        "empresa": career.get("name") or job.get("careerPageName") or job.get("companyName"),
+        "localidade": _join_location(
+            job.get("addressCity"), job.get("addressState"), job.get("addressCountry")
+        ),
+        "tipo_trabalho": _tipo_trabalho(job.get("workplaceType"), job.get("isRemoteWork") and "remote"),
+        "data_publicacao": job.get("publishedDate") or job.get("publishedAt"),
+        "link_candidatura": url,
+    }
+    description = "\n".join(
+        str(job.get(k) or "")
+        for k in ("description", "responsibilities", "prerequisites", "relevantExperiences", "additionalInformation")
+    )
+    return _build(fields, description)
+
+
+# ---------- Greenhouse ----------
+@register_adapter("greenhouse")
+def greenhouse_adapter(url: str, body: Optional[str] = None, conditional: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    boards.greenhouse.io/<board>/jobs/<id> -> boards-api.greenhouse.io/v1/boards/<board>/jobs/<id>
+    """
+    p = urlparse(url)
+    m = re.search(r"^/([^/]+)/jobs/(\d+)", p.path)
+    if not m:
+        return None
+    board, job_id = m.group(1), m.group(2)
+    job_id = (parse_qs(p.query).get("gh_jid") or [job_id])[0]
+
+    api = f"https://boards-api.greenhouse.io/v1/boards/{board}/jobs/{job_id}"
+    job = json.loads(body) if body is not None else fetch_json(api, page_url=url, conditional=conditional)
+    location = (job.get("location") or {}).get("name")
+    fields = {
+        "cargo": job.get("title"),
+        "empresa": job.get("company_name"),
+        "localidade": location,
+        "tipo_trabalho": _tipo_trabalho(location),
+        "data_publicacao": job.get("first_published") or job.get("updated_at"),
+        "link_candidatura": job.get("absolute_url") or url,
+    }
+    # "content" vem com HTML escapado (&lt;p&gt;...)
+    return _build(fields, html.unescape(job.get("content") or ""))
+
+
+# ---------- Workday ----------
+_LOCALE_RE = re.compile(r"^[a-z]{2}-[a-z]{2}$", re.IGNORECASE)
+
+
+@register_adapter("workday")
+def workday_adapter(url: str, body: Optional[str] = None, conditional: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    <tenant>.wdN.myworkdayjobs.com/[locale/]<site>/job/<...>
+      -> <host>/wday/cxs/<tenant>/<site>/job/<...>
+    """
+    p = urlparse(url)
+    tenant = p.netloc.split(".")[0]
+    segs = [s for s in p.path.split("/") if s]
+    if segs and _LOCALE_RE.match(segs[0]):
+        segs = segs[1:]
+    if len(segs) < 3 or segs[1] != "job":
+        return None
+    site, job_path = segs[0], "/".join(segs[2:])
+
+    api = f"{p.scheme}://{p.netloc}/wday/cxs/{tenant}/{site}/job/{job_path}"
+    data = json.loads(body) if body is not None else fetch_json(api, page_url=url, conditional=conditional)
+    info = data.get("jobPostingInfo") or {}
+    if not info:
+        return None
+    org = data.get("hiringOrganization") or {}
+    fields = {
+        "cargo": info.get("title"),
+        "empresa": org.get("name"),
+        "localidade": info.get("location"),
+        "tipo_trabalho": _tipo_trabalho(info.get("remoteType"), info.get("location")),
+        "data_publicacao": info.get("startDate") or info.get("postedOn"),
+        "link_candidatura": info.get("externalUrl") or url,
+    }
+    return _build(fields, info.get("jobDescription") or "")
+
+
+def merge_structured(result: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos do ATS têm prioridade sobre o que a IA devolveu (quando não vazios)."""
+    for k, v in fields.items():
+        if v not in (None, ""):
+            result[k] = v
+    return result
@@ -0,0 +1,967 @@
+"""
+Benchmarks locais do pipeline (sem rede).
+
+Corpus: arquivos .html de um diretório (--corpus) ou, por padrão, as páginas
+salvas no cache em disco (cache/pages, ver page_cache.py).
+
+Uso:
+    python bench.py extract                     # extratores HTML -> texto
+    python bench.py extract --corpus pages/ --repeat 3
+    python bench.py llm --limit 10              # /api/chat (prefixo fixo) vs /api/generate
+    python bench.py reduce --budgets 800,1500   # tokens do prompt x concordância dos campos
+    python bench.py clean --variants 50          # text_cleaner: CPU por página + paridade com a versão anterior
+    python bench.py neardup --size 300000         # índice de quase-duplicatas: latência da busca
+    python bench.py boilerplate --min-pages 5     # template por domínio: tokens poupados x campos
+    python bench.py fingerprint --days 7          # recoleta diária: vagas puladas (sha256 x impressão digital)
+    python bench.py recrawl --urls 20000 --days 60   # agenda de revisita: coletas/dia x atraso para ver mudanças
+    python bench.py e2e --fixtures fixtures/run1 --record   # grava um run (com rede)
+    python bench.py e2e --fixtures fixtures/run1 --token-ms 20   # reproduz (sem rede)
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from typing import Dict, List
+
+import text_cleaner as tc
+from text_cleaner import clean_text
+
+
+# ---------- corpus ----------
+def load_html_corpus(corpus_dir: str | None = None, limit: int | None = None) -> List[Dict[str, str]]:
+    """Lista de {"name", "html"}."""
+    docs = []
+    if corpus_dir:
+        for root, _, files in os.walk(corpus_dir):
+            for fn in sorted(files):
+                if fn.lower().endswith((".html", ".htm")):
+                    path = os.path.join(root, fn)
+                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                        docs.append({"name": path, "html": f.read()})
+    else:
+        from db import init_db
+        from page_cache import PageCache
+        init_db()
+        pc = PageCache()
+        try:
+            for e in pc.iter_entries(strategy="direct"):
+                docs.append({"name": e["url_norm"], "html": e["raw"]})
+        finally:
+            pc.close()
+    return docs[:limit] if limit else docs
+
+
+def load_text_corpus(corpus_dir: str | None = None, limit: int | None = None, raw: bool = False) -> List[Dict[str, str]]:
+    """Lista de {"name", "text"} já reduzido (o que vai para a IA); raw=True: texto completo."""
+    from extractors import extract_text
+    from text_cleaner import reduce_text
+
+    keywords = _keywords()
+    reduce = (lambda t: t) if raw else (lambda t: reduce_text(t, keywords))
+
+    docs = []
+    if corpus_dir:
+        for d in load_html_corpus(corpus_dir, limit):
+            docs.append({"name": d["name"], "text": reduce(extract_text(d["html"]))})
+    else:
+        from db import init_db
+        from page_cache import PageCache
+        init_db()
+        pc = PageCache()
+        try:
+            seen = set()
+            for e in pc.iter_entries():
+                # "adapter" guarda o JSON/HTML bruto do ATS, não texto de página
+                if e["strategy"] == "adapter" or e["url_norm"] in seen:
+                    continue
+                seen.add(e["url_norm"])
+                docs.append({"name": e["url_norm"], "text": reduce(e["text"])})
+        finally:
+            pc.close()
+    return docs[:limit] if limit else docs
+
+
+def _keywords() -> List[str]:
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            return json.load(f).get("termos_busca", [])
+    except (OSError, ValueError):
+        return []
+
+
+def _line_jaccard(a: str, b: str) -> float:
+    sa, sb = set(a.splitlines()), set(b.splitlines())
+    if not sa and not sb:
+        return 1.0
+    return len(sa & sb) / len(sa | sb)
+
+
+# ---------- extract ----------
+def bench_extract(args) -> int:
+    from extractors import EXTRACTORS
+
+    docs = load_html_corpus(args.corpus, args.limit)
+    if not docs:
+        print("Corpus vazio (use --corpus DIR ou rode o pipeline para popular cache/pages).")
+        return 1
+    total_mb = sum(len(d["html"].encode("utf-8", errors="ignore")) for d in docs) / 1e6
+    print(f"Corpus: {len(docs)} páginas | {total_mb:.1f} MB | repeat={args.repeat}")
+
+    outputs: Dict[str, List[str]] = {}
+    print(f"{'extrator':<10} {'seg':>8} {'pág/s':>9} {'MB/s':>8}")
+    for name, fn in EXTRACTORS.items():
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            out = [fn(d["html"]) for d in docs]
+        dt = time.perf_counter() - t0
+        outputs[name] = out
+        n = len(docs) * args.repeat
+        print(f"{name:<10} {dt:>8.3f} {n / dt:>9.1f} {total_mb * args.repeat / dt:>8.2f}")
+
+    base = outputs.get(args.baseline)
+    if base is None:
+        return 0
+    print(f"\nParidade vs {args.baseline}:")
+    print(f"{'extrator':<10} {'idêntico':>9} {'pós-clean':>10} {'jaccard':>9}")
+    for name, out in outputs.items():
+        if name == args.baseline:
+            continue
+        same = sum(1 for a, b in zip(base, out) if a == b)
+        same_clean = sum(1 for a, b in zip(base, out) if clean_text(a) == clean_text(b))
+        jac = sum(_line_jaccard(a, b) for a, b in zip(base, out)) / len(docs)
+        print(f"{name:<10} {same / len(docs):>9.1%} {same_clean / len(docs):>10.1%} {jac:>9.3f}")
+        if args.show_diff:
+            for d, a, b in zip(docs, base, out):
+                if a != b:
+                    print(f"  diff: {d['name']}")
+    return 0
+
+
+# ---------- llm ----------
+def bench_llm(args) -> int:
+    """
+    Mesmas vagas nos dois modos de chamada ao Ollama (LLM_ENDPOINTS, real ou
+    stub). Com o prefixo em "system" (chat), prompt_eval deve cair para ~o
+    tamanho da vaga a partir da 2ª chamada.
+    """
+    import processor
+
+    docs = load_text_corpus(args.corpus, args.limit)
+    if not docs:
+        print("Corpus vazio (use --corpus DIR ou rode o pipeline para popular cache/pages).")
+        return 1
+    template = processor.load_prompt(args.prompt)
+    prefix, _ = processor.split_prompt(template)
+    avg_chars = sum(len(d["text"]) for d in docs) / len(docs)
+    print(f"Corpus: {len(docs)} vagas | texto médio={avg_chars:.0f} chars | prefixo fixo={len(prefix)} chars")
+    endpoints = ", ".join(e.label() for e in processor.get_pool().endpoints)
+    print(f"Modelo: {processor.OLLAMA_MODEL} @ {endpoints}")
+
+    apis = ["chat", "generate"] if args.api == "both" else [args.api]
+    print(f"\n{'modo':<9} {'warmup_ms':>9} {'wall_ms':>8} {'prompt_tok':>10} {'prompt_ms':>9} {'eval_tok':>8} {'eval_ms':>8}")
+    for api in apis:
+        warm_ms = processor.warm_up(template, api=api) if args.warmup else 0
+        rows = []
+        for d in docs:
+            endpoint, payload = processor.build_request(template, d["text"], d["name"], api=api)
+            t0 = time.perf_counter()
+            _, final = processor._stream_llm(endpoint, payload)
+            rows.append((
+                (time.perf_counter() - t0) * 1000,
+                final.get("prompt_eval_count") or 0,
+                (final.get("prompt_eval_duration") or 0) / 1e6,
+                final.get("eval_count") or 0,
+                (final.get("eval_duration") or 0) / 1e6,
+            ))
+        n = len(rows)
+        avg = [sum(r[i] for r in rows) / n for i in range(5)]
+        print(
+            f"{api:<9} {warm_ms or 0:>9} {avg[0]:>8.0f} {avg[1]:>10.0f} {avg[2]:>9.0f} "
+            f"{avg[3]:>8.0f} {avg[4]:>8.0f}"
+        )
+    return 0
+
+
+# ---------- reduce ----------
+# linhas curtas de conteúdo que parecem menu (e menus de verdade) para
+# `bench.py reduce`: as de "keep" precisam chegar à IA, as de "drop" não
+_REDUCE_CASES = {
+    "keep": ["Home office", "SharePoint", "Concentrar esforços", "100% remoto"],
+    "drop": ["Home", "» Menu", "Entrar", "Aceitar cookies"],
+}
+
+
+def _check_reduce_cases() -> List[str]:
+    """Falhas (linha, esperado) de reduce_to_budget nos _REDUCE_CASES."""
+    from text_cleaner import reduce_to_budget
+
+    text = "\n".join(
+        ["Home", "» Menu", "Entrar", "Analista de Dados Pleno", "Empresa Exemplo",
+         "Modelo de trabalho:", "Home office", "100% remoto",
+         "Requisitos:", "SharePoint", "Concentrar esforços", "Python e SQL para análise de dados"]
+        + ["Sobre a empresa:"] + ["Somos uma empresa que cresce todo ano com clientes em vários países."] * 40
+        + ["Aceitar cookies"]
+    )
+    out = set(reduce_to_budget(text, 200, ["python", "sql"]).split("\n"))
+    return [f"{ln!r} devia {'ficar' if want == 'keep' else 'sair'}"
+            for want, lines in _REDUCE_CASES.items() for ln in lines if (ln in out) != (want == "keep")]
+
+
+def bench_reduce(args) -> int:
+    """
+    Redução do texto (legacy x orçamento de tokens) sobre o mesmo corpus.
+
+    Referência = campos extraídos do texto completo; concordância = fração
+    desses campos que continua igual depois da redução. Por padrão os campos
+    vêm das regras (pre_extract, sem IA); com --llm, da IA (referência = IA
+    sobre o texto completo).
+    """
+    from pre_extract import pre_extract, norm_for_compare
+    from text_cleaner import estimate_tokens, extract_relevant_sections, reduce_to_budget
+
+    failures = _check_reduce_cases()
+    print(f"Casos fixos (menu x conteúdo curto): {'ok' if not failures else 'FALHOU'}")
+    for f in failures:
+        print(f"  - {f}")
+    if failures:
+        return 1
+
+    docs = load_text_corpus(args.corpus, args.limit, raw=True)
+    if not docs:
+        print("Corpus vazio (use --corpus DIR ou rode o pipeline para popular cache/pages).")
+        return 1
+    keywords = _keywords()
+
+    if args.llm:
+        import processor
+        template = processor.load_prompt(args.prompt)
+
+        def fields(text: str, name: str) -> Dict[str, object]:
+            out = processor.call_llm_extract_json(template, text, name)
+            return {} if processor.is_failed_result(out) else out
+    else:
+        def fields(text: str, name: str) -> Dict[str, object]:
+            return {k: v["value"] for k, v in pre_extract(text).items()}
+
+    reducers = {"legacy": lambda t: extract_relevant_sections(t, max_chars=9000)}
+    for b in (int(x) for x in args.budgets.split(",") if x.strip()):
+        reducers[f"budget@{b}"] = lambda t, b=b: reduce_to_budget(t, b, keywords)
+
+    full_tok = [estimate_tokens(d["text"]) for d in docs]
+    refs = [fields(d["text"], d["name"]) for d in docs]
+    n_ref = sum(len(r) for r in refs)
+    print(f"Corpus: {len(docs)} vagas | tokens médios (texto completo)={sum(full_tok) / len(docs):.0f} "
+          f"| campos de referência={n_ref} ({'IA' if args.llm else 'regras'})")
+    print(f"\n{'redução':<14} {'tokens':>7} {'máx':>6} {'redução':>8} {'ms/vaga':>8} {'concordância':>12}")
+    for name, fn in reducers.items():
+        t0 = time.perf_counter()
+        reduced = [fn(d["text"]) for d in docs]
+        ms = (time.perf_counter() - t0) * 1000 / len(docs)
+        tok = [estimate_tokens(t) for t in reduced]
+        agree = 0
+        for d, ref, text in zip(docs, refs, reduced):
+            got = fields(text, d["name"]) if ref else {}
+            agree += sum(1 for k, v in ref.items() if norm_for_compare(k, v) == norm_for_compare(k, got.get(k)))
+        saved = 1 - sum(tok) / max(1, sum(full_tok))
+        rate = f"{agree / n_ref:.1%}" if n_ref else "-"
+        print(f"{name:<14} {sum(tok) / len(docs):>7.0f} {max(tok):>6} {saved:>8.1%} {ms:>8.2f} {rate:>12}")
+    return 0
+
+
+# ---------- clean ----------
+# Implementação anterior ao motor de uma passada (text_cleaner), congelada
+# aqui só como referência de paridade para `bench.py clean`.
+def _ref_detect_status_from_text(text: str) -> str:
+    t = (text or "").lower()
+    for h in tc.REMOVAL_HINTS:
+        if h in t:
+            return "removida"
+    if len(t.strip()) < 400:
+        return "duvidosa"
+    return "ativa"
+
+
+def _ref_clean_text(text: str) -> str:
+    if not text:
+        return ""
+    t = text
+
+    # Normaliza espaços
+    t = t.replace("\r\n", "\n")
+    t = re.sub(r"[ \t]+", " ", t)
+    t = re.sub(r"\n{3,}", "\n\n", t)
+
+    # Remove linhas muito repetitivas (heurística simples)
+    lines = [ln.strip() for ln in t.split("\n")]
+    filtered = []
+    for ln in lines:
+        if not ln:
+            continue
+        if len(ln) <= 2:
+            continue
+        filtered.append(ln)
+    return "\n".join(filtered)
+
+
+def _ref_extract_relevant_sections(text: str, max_chars: int = 9000) -> str:
+    t = _ref_clean_text(text)
+    if not t:
+        return ""
+
+    lines = t.split("\n")
+
+    head_lines = lines[:40]
+    mid_lines = lines[40:220]
+
+    chosen_lines = []
+    for ln in lines:
+        low = ln.lower()
+        if any(h in low for h in tc.SECTION_HINTS):
+            chosen_lines.append(ln)
+
+    # monta e deduplica mantendo ordem
+    combined = head_lines + [""] + mid_lines + [""] + chosen_lines[:200]
+
+    seen = set()
+    out_lines = []
+    for ln in combined:
+        key = ln.strip().lower()
+        if not key:
+            # mantém separadores de bloco (vazios) com parcimônia
+            if out_lines and out_lines[-1] != "":
+                out_lines.append("")
+            continue
+        if key in seen:
+            continue
+        seen.add(key)
+        out_lines.append(ln)
+
+    out = "\n".join(out_lines).strip()
+
+    if len(out) > max_chars:
+        out = out[:max_chars] + "\n\n[TRUNCADO]"
+
+    return out
+
+
+def _ref_is_header(line: str) -> bool:
+    words = line.split()
+    if not words or len(words) > tc._HEADER_MAX_WORDS:
+        return False
+    low = line.lower()
+    return line.endswith(":") or line.isupper() or any(low.startswith(h) for h in tc.SECTION_HINTS)
+
+
+def _ref_has_boilerplate(text: str) -> bool:
+    for ln in text.split("\n"):
+        if re.sub(r"^\W+|\W+$", "", ln) in tc.BOILERPLATE_LINES:
+            return True
+        if any(re.search(rf"\b{re.escape(b)}\b", ln) for b in tc.BOILERPLATE_HINTS):
+            return True
+    return False
+
+
+def _ref_is_nav_line(line: str) -> bool:
+    low = line.lower()
+    return len(low.split()) <= 3 and _ref_has_boilerplate(low)
+
+
+def _ref_split_blocks(lines: List[str]) -> List[List[str]]:
+    blocks: List[List[str]] = []
+    cur: List[str] = []
+    for ln in lines:
+        if cur and (_ref_is_header(ln) or len(cur) >= tc._BLOCK_MAX_LINES):
+            blocks.append(cur)
+            cur = []
+        cur.append(ln)
+    if cur:
+        blocks.append(cur)
+    return blocks
+
+
+def _ref_block_score(block: List[str], keywords: List[str]) -> float:
+    text = "\n".join(block).lower()
+    head = block[0].lower()
+    n_words = max(1, len(text.split()))
+
+    score = 0.0
+    if any(h in head for h in tc.SECTION_HINTS):
+        score += 3.0  # cabeçalho de seção conhecida
+    score += sum(1 for ln in block if any(h in ln.lower() for h in tc.SECTION_HINTS)) * 0.5
+    if keywords:
+        hits = sum(text.count(k) for k in keywords)
+        score += min(3.0, 30.0 * hits / n_words)  # densidade dos termos_busca
+    # prosa (linhas longas) vale mais que menu/rodapé (linhas curtas)
+    avg_words = n_words / len(block)
+    score += min(2.0, avg_words / 6)
+    if avg_words < 5 and _ref_has_boilerplate(text):
+        score -= 2.0
+    return score
+
+
+def _ref_reduce_to_budget(text: str, max_tokens: int | None = None, keywords=None) -> str:
+    max_tokens = max_tokens or tc.TEXT_TOKEN_BUDGET
+    t = _ref_clean_text(text)
+    if not t:
+        return ""
+    if tc.estimate_tokens(t) <= max_tokens:
+        return t
+
+    kws = [k.lower() for k in (keywords or []) if k]
+    blocks = _ref_split_blocks([ln for ln in t.split("\n") if not _ref_is_nav_line(ln)])
+    if not blocks:
+        return ""
+    scores = [_ref_block_score(b, kws) for b in blocks]
+    for i in range(1, len(blocks)):
+        # continuidade: seção longa quebrada em vários blocos
+        if not _ref_is_header(blocks[i][0]) and scores[i - 1] >= 3.0:
+            scores[i] += 0.5 * scores[i - 1]
+    # título/empresa: primeiro bloco que não é menu
+    first = next((i for i, sc in enumerate(scores) if sc > 0), 0)
+    scores[first] += 100.0
+
+    costs = [tc.estimate_tokens("\n".join(b)) for b in blocks]
+    order = sorted(range(len(blocks)), key=lambda i: scores[i] / max(1, costs[i]) ** 0.5, reverse=True)
+
+    chosen, used = set(), 0
+    for i in order:
+        if scores[i] <= 0:
+            continue
+        if used + costs[i] > max_tokens:
+            continue
+        chosen.add(i)
+        used += costs[i]
+
+    if not chosen:
+        # nem o bloco do título coube: corta por linhas
+        out, used = [], 0
+        for ln in blocks[first]:
+            c = tc.estimate_tokens(ln)
+            if used + c > max_tokens:
+                break
+            out.append(ln)
+            used += c
+        return "\n".join(out)
+
+    seen = set()
+    out_lines = []
+    for i in sorted(chosen):
+        for ln in blocks[i]:
+            key = ln.strip().lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            out_lines.append(ln)
+    return "\n".join(out_lines)
+
+
+def _variant(text: str, rng: random.Random) -> str:
+    """Mesma página com ruído que a limpeza precisa absorver (CRLF, tabs, espaços, linhas vazias, caixa)."""
+    out = []
+    for ln in text.split("\n"):
+        r = rng.random()
+        if r < 0.1:
+            ln = ln.replace(" ", " \t  ")
+        elif r < 0.2:
+            ln = "  " + ln.upper() + " \xa0"
+        elif r < 0.25:
+            ln = ln[:2]
+        out.append(ln)
+        if rng.random() < 0.1:
+            out.append(rng.choice(["", "   ", "\t", "Entrar", "Requisitos:", "vaga encerrada", "ok"]))
+    return ("\r\n" if rng.random() < 0.5 else "\n").join(out)
+
+
+def bench_clean(args) -> int:
+    """
+    text_cleaner (motor de uma passada) x implementação anterior, sobre o
+    corpus (+ --variants cópias com ruído por página): ms/página de cada
+    função e paridade exata das saídas. Sai com 1 se alguma saída divergir.
+    """
+    docs = load_text_corpus(args.corpus, args.limit, raw=True)
+    if not docs:
+        print("Corpus vazio (use --corpus DIR ou rode o pipeline para popular cache/pages).")
+        return 1
+    rng = random.Random(7)
+    texts = [d["text"] for d in docs]
+    texts += [_variant(t, rng) for t in texts for _ in range(args.variants)]
+    keywords = [k.lower() for k in _keywords()]
+    budgets = [int(x) for x in args.budgets.split(",") if x.strip()]
+
+    cases = [
+        ("clean_text", _ref_clean_text, tc.clean_text),
+        ("status", _ref_detect_status_from_text, tc.detect_status_from_text),
+        ("legacy", _ref_extract_relevant_sections, tc.extract_relevant_sections),
+    ]
+    for b in budgets:
+        cases.append((
+            f"budget@{b}",
+            lambda t, b=b: _ref_reduce_to_budget(t, b, keywords),
+            lambda t, b=b: tc.reduce_to_budget(t, b, keywords),
+        ))
+
+    print(f"Corpus: {len(docs)} páginas + {len(texts) - len(docs)} variantes | repeat={args.repeat}")
+    print(f"\n{'função':<14} {'ref_ms':>8} {'novo_ms':>8} {'ganho':>7} {'iguais':>9}")
+    failed = False
+    for name, ref_fn, new_fn in cases:
+        timings = []
+        for fn in (ref_fn, new_fn):
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                out = [fn(t) for t in texts]
+            timings.append(((time.perf_counter() - t0) * 1000 / (len(texts) * args.repeat), out))
+        (ref_ms, ref_out), (new_ms, new_out) = timings
+        diff = [i for i, (a, b) in enumerate(zip(ref_out, new_out)) if a != b]
+        failed = failed or bool(diff)
+        same = f"{len(texts) - len(diff)}/{len(texts)}"
+        print(f"{name:<14} {ref_ms:>8.3f} {new_ms:>8.3f} {1 - new_ms / ref_ms:>7.0%} {same:>9}")
+        if diff and args.show_diff:
+            print(f"  diverge: {[docs[i % len(docs)]['name'] for i in diff[:5]]}")
+    return 1 if failed else 0
+
+
+# ---------- neardup ----------
+def bench_neardup(args) -> int:
+    """
+    Latência do índice de quase-duplicatas (near_dup.py) com --size vagas
+    sintéticas num jobs.db temporário: buscas que acham (assinatura de uma
+    vaga do índice com ~10% dos mínimos trocados) e que não acham.
+    Com corpus, mede também o tempo da assinatura por vaga.
+    """
+    import random
+    import sqlite3
+    from db import SCHEMA
+    from near_dup import NearDupIndex, signature, band_keys, _pack, _PERMS
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix="bench_neardup_")
+    db_path = os.path.join(workdir, "jobs.db")
+    try:
+        conn = sqlite3.connect(db_path)
+        conn.executescript(SCHEMA)
+        sigs = [[rng.getrandbits(32) for _ in range(_PERMS)] for _ in range(args.size)]
+        t0 = time.perf_counter()
+        conn.executemany(
+            "INSERT INTO near_dup (id, url_norm, sig, cluster_id, result_json, created_at) VALUES (?, ?, ?, ?, '{}', 0)",
+            ((i + 1, f"https://x/{i}", _pack(sig), i + 1) for i, sig in enumerate(sigs)),
+        )
+        conn.executemany(
+            "INSERT INTO near_dup_bands (key, dup_id) VALUES (?, ?)",
+            ((k, i + 1) for i, sig in enumerate(sigs) for k in band_keys(sig)),
+        )
+        conn.commit()
+        conn.close()
+        print(f"Índice: {args.size} vagas | carga={time.perf_counter() - t0:.1f}s")
+
+        idx = NearDupIndex(db_path)
+        print(f"\n{'busca':<10} {'n':>6} {'achou':>6} {'p50_ms':>8} {'p99_ms':>8} {'máx_ms':>8}")
+        for name in ("vizinho", "nova"):
+            found, lat = 0, []
+            for _ in range(args.queries):
+                if name == "vizinho":
+                    sig = list(rng.choice(sigs))
+                    for b in rng.sample(range(_PERMS), _PERMS // 10):
+                        sig[b] = rng.getrandbits(32)
+                else:
+                    sig = [rng.getrandbits(32) for _ in range(_PERMS)]
+                t1 = time.perf_counter()
+                found += idx.find(sig) is not None
+                lat.append((time.perf_counter() - t1) * 1000)
+            lat.sort()
+            p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))]
+            print(f"{name:<10} {len(lat):>6} {found:>6} {p(0.5):>8.3f} {p(0.99):>8.3f} {lat[-1]:>8.3f}")
+        idx.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    docs = load_text_corpus(args.corpus, args.limit)
+    if docs:
+        t0 = time.perf_counter()
+        got = [signature(d["text"]) for d in docs]
+        ms = (time.perf_counter() - t0) * 1000 / len(docs)
+        print(f"\nAssinatura: {len(docs)} vagas | {ms:.2f} ms/vaga | curtas demais={got.count(None)}")
+    return 0
+
+
+# ---------- boilerplate ----------
+def bench_boilerplate(args) -> int:
+    """
+    Template por domínio (boilerplate.py): aprende com todas as páginas do
+    corpus (um domínio por host via stats_domain; com --corpus, uma pasta =
+    um domínio) e compara o texto reduzido com e sem as linhas de template.
+    Concordância = campos das regras (pre_extract) do texto completo que
+    continuam iguais no texto reduzido.
+    """
+    from boilerplate import BoilerplateModel
+    from pre_extract import pre_extract, norm_for_compare
+    from strategy_stats import stats_domain
+    from text_cleaner import estimate_tokens, reduce_text
+
+    docs = load_text_corpus(args.corpus, args.limit, raw=True)
+    if not docs:
+        print("Corpus vazio (use --corpus DIR ou rode o pipeline para popular cache/pages).")
+        return 1
+    keywords = _keywords()
+    domain = (lambda name: os.path.dirname(name)) if args.corpus else stats_domain
+
+    model = BoilerplateModel(min_freq=args.min_freq, min_pages=args.min_pages)
+    t0 = time.perf_counter()
+    for d in docs:
+        model.learn(domain(d["name"]), d["text"])
+    learn_ms = (time.perf_counter() - t0) * 1000 / len(docs)
+
+    per: Dict[str, Dict[str, float]] = {}
+    strip_s = 0.0
+    for d in docs:
+        dom = domain(d["name"])
+        t1 = time.perf_counter()
+        stripped, removed = model.strip(dom, d["text"])
+        strip_s += time.perf_counter() - t1
+        ref = {k: v["value"] for k, v in pre_extract(d["text"]).items()}
+        st = per.setdefault(dom, {"pages": 0, "lines": 0, "before": 0, "after": 0, "ref": 0, "agree_before": 0, "agree_after": 0})
+        st["pages"] += 1
+        st["lines"] += removed
+        st["ref"] += len(ref)
+        for key, text in (("before", d["text"]), ("after", stripped)):
+            reduced = reduce_text(text, keywords)
+            st[key] += estimate_tokens(reduced)
+            got = pre_extract(reduced)
+            st[f"agree_{key}"] += sum(
+                1 for k, v in ref.items()
+                if norm_for_compare(k, v) == norm_for_compare(k, (got.get(k) or {}).get("value"))
+            )
+
+    print(f"Corpus: {len(docs)} páginas | {len(per)} domínios | aprender={learn_ms:.2f} ms/página "
+          f"| limpar={strip_s * 1000 / len(docs):.2f} ms/página")
+    print(f"\n{'domínio':<32} {'págs':>5} {'linhas/pág':>10} {'tokens':>7} {'sem tpl':>7} {'redução':>8} "
+          f"{'campos':>7} {'sem tpl':>7}")
+    rows = sorted(per.items(), key=lambda kv: kv[1]["pages"], reverse=True)
+    tot = {k: sum(st[k] for _, st in rows) for k in ("pages", "lines", "before", "after", "ref", "agree_before", "agree_after")}
+    for name, st in rows + [("TOTAL", tot)]:
+        rate = (lambda a: f"{a / st['ref']:.1%}") if st["ref"] else (lambda a: "-")
+        print(f"{name[-32:]:<32} {st['pages']:>5.0f} {st['lines'] / st['pages']:>10.1f} "
+              f"{st['before'] / st['pages']:>7.0f} {st['after'] / st['pages']:>7.0f} "
+              f"{1 - st['after'] / max(1, st['before']):>8.1%} {rate(st['agree_before']):>7} {rate(st['agree_after']):>7}")
+    return 0
+
+
+# ---------- fingerprint ----------
+def _recrawl(text: str, day: int, rng: random.Random) -> str:
+    """A mesma vaga coletada em outro dia: tempo relativo, contadores, horário e recomendações mudam."""
+    lines = text.split("\n")
+    noise = [
+        f"Publicada há {day + rng.randint(1, 3)} dias · {rng.randint(10, 900)} candidatos",
+        f"Atualizado em 2026-01-{1 + day % 28:02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z",
+    ]
+    recs = ["Vagas similares"] + [f"Vaga {rng.randint(1, 99999)} em outra empresa - há {rng.randint(1, 9)} horas" for _ in range(3)]
+    cut = min(len(lines), 2)
+    return "\n".join(lines[:cut] + noise + lines[cut:] + recs)
+
+
+def _real_edit(text: str, rng: random.Random) -> str:
+    """Mudança que importa: um requisito novo (logo depois do cabeçalho de requisitos, se houver)."""
+    lines = text.split("\n")
+    req = f"Experiência com {rng.choice(['Kubernetes', 'Terraform', 'Kafka', 'Spark', 'Go'])} em produção"
+    for i, ln in enumerate(lines):
+        if ln.strip().lower().startswith(("requisitos", "requirements", "qualificações")):
+            lines.insert(i + 1, req)
+            return "\n".join(lines)
+    return "\n".join(lines + ["Requisitos:", req])
+
+
+def bench_fingerprint(args) -> int:
+    """
+    Recoleta diária simulada (--days por vaga): quantas versões são puladas
+    (hash igual ao do dia anterior) com o sha256 do texto limpo x a impressão
+    digital (fingerprint.py), e quantas mudanças reais cada um detecta.
+    """
+    from fingerprint import fingerprint, changed_sections, relevant_change
+    from utils import sha256_text
+
+    docs = load_text_corpus(args.corpus, args.limit, raw=True)
+    if not docs:
+        print("Corpus vazio (use --corpus DIR ou rode o pipeline para popular cache/pages).")
+        return 1
+    rng = random.Random(7)
+    hashers = {
+        "sha256": lambda t: (sha256_text(clean_text(t)), None),
+        "fingerprint": lambda t: (lambda fp: (fp["hash"], fp["sections"]))(fingerprint(t)),
+    }
+    print(f"Corpus: {len(docs)} vagas | {args.days} dias | mudança real em {args.edit_rate:.0%} das recoletas")
+    print(f"\n{'hash':<12} {'ms/pág':>7} {'puladas':>8} {'ruído pulado':>13} {'mudanças vistas':>16}")
+    for name, fn in hashers.items():
+        rng.seed(7)
+        skipped = noise_total = noise_skipped = edits = edits_seen = n = 0
+        elapsed = 0.0
+        for d in docs:
+            text = d["text"]
+            t0 = time.perf_counter()
+            prev, prev_secs = fn(_recrawl(text, 0, rng))
+            elapsed += time.perf_counter() - t0
+            for day in range(1, args.days + 1):
+                edited = rng.random() < args.edit_rate
+                if edited:
+                    text = _real_edit(text, rng)
+                t0 = time.perf_counter()
+                cur, secs = fn(_recrawl(text, day, rng))
+                elapsed += time.perf_counter() - t0
+                n += 1
+                same = cur == prev or (secs is not None and not relevant_change(changed_sections(prev_secs, secs)))
+                skipped += same
+                if edited:
+                    edits += 1
+                    edits_seen += not same
+                else:
+                    noise_total += 1
+                    noise_skipped += same
+                prev, prev_secs = cur, secs
+        print(f"{name:<12} {elapsed * 1000 / (n + len(docs)):>7.2f} {skipped / n:>8.1%} "
+              f"{noise_skipped / max(1, noise_total):>13.1%} {f'{edits_seen}/{edits}':>16}")
+    return 0
+
+
+# ---------- recrawl ----------
+def bench_recrawl(args) -> int:
+    """
+    Agenda de revisita (recrawl.py) simulada, sem rede: --urls vagas, um run
+    por dia durante --days dias. Cada vaga tem idade inicial e duração
+    aleatórias; muda com probabilidade --fresh-change por dia nos primeiros
+    dias e --stable-change depois; some ao fim da duração. Compara coletar
+    tudo todo dia x só as vencidas: coletas por run e atraso (dias) até
+    perceber uma mudança/remoção. Os primeiros --warmup dias ficam fora das
+    médias (na partida toda vaga é nova).
+    """
+    import recrawl
+
+    rng = random.Random(11)
+    day_s = 86400.0
+    jobs = {}
+    for i in range(args.urls):
+        born = -rng.uniform(0, 60) * day_s
+        jobs[f"https://vagas.example/{i}"] = {"born": born, "dies": born + rng.uniform(10, 90) * day_s}
+
+    def changes_between(u: str, t0: float, t1: float) -> List[float]:
+        """Instantes (fim de cada dia) em que a vaga mudou em (t0, t1]; determinístico por vaga/dia."""
+        j, out = jobs[u], []
+        d = int(t0 // day_s) + 1
+        while d * day_s <= t1:
+            t = d * day_s
+            if j["born"] <= t < j["dies"]:
+                fresh = t - j["born"] < recrawl.RECRAWL_FRESH_DAYS * day_s
+                p = args.fresh_change if fresh else args.stable_change
+                if random.Random(f"{u}:{d}").random() < p:
+                    out.append(t)
+            d += 1
+        return out
+
+    print(f"Vagas: {args.urls} | dias: {args.days} | orçamento: {args.budget or 'sem limite'} | "
+          f"intervalo {recrawl.RECRAWL_MIN_HOURS:g}h..{recrawl.RECRAWL_MAX_HOURS:g}h x{recrawl.RECRAWL_BACKOFF:g}")
+    print(f"\n{'estratégia':<12} {'coletas/run':>12} {'percebidas':>10} {'atraso_méd_d':>13} {'atraso_máx_d':>13} "
+          f"{'remoção_méd_d':>14} {'ms/run':>7}")
+    for name in ("todas", "agenda"):
+        schedule: Dict[str, Dict[str, object]] = {}
+        last_fetch = {u: None for u in jobs}
+        fetches, delays, removal_delays, sel_ms = 0, [], [], 0.0
+        runs = 0
+        for day in range(args.days):
+            now = day * day_s + 6 * 3600  # run diário às 6h
+            urls = list(jobs)
+            if name == "agenda":
+                t0 = time.perf_counter()
+                chosen, _ = recrawl.select_due(urls, schedule, budget=args.budget, now=now)
+                sel_ms += (time.perf_counter() - t0) * 1000
+            else:
+                chosen = urls
+            counted = day >= args.warmup
+            runs += counted
+            for u in chosen:
+                j, prev = jobs[u], last_fetch[u]
+                if prev is None:
+                    outcome = "removed" if now >= j["dies"] else "changed"
+                elif now >= j["dies"]:
+                    outcome = "removed"
+                    if prev < j["dies"] and counted:
+                        removal_delays.append((now - j["dies"]) / day_s)
+                else:
+                    seen = changes_between(u, prev, now)
+                    outcome = "changed" if seen else "same"
+                    if counted:
+                        delays.extend((now - t) / day_s for t in seen)
+                last_fetch[u] = now
+                fetches += counted
+                if name == "agenda":
+                    schedule[u] = recrawl.schedule_entry(schedule.get(u), outcome, now=now, rng=rng)
+        avg = lambda xs: sum(xs) / len(xs) if xs else 0.0
+        print(f"{name:<12} {fetches / max(1, runs):>12.0f} {len(delays):>10} {avg(delays):>13.2f} "
+              f"{max(delays or [0]):>13.2f} {avg(removal_delays):>14.2f} {sel_ms / args.days:>7.1f}")
+    return 0
+
+
+# ---------- e2e ----------
+def _copy_inputs(fixtures: str, workdir: str) -> None:
+    """config.json + prompts/ gravados junto das fixtures (senão, os do diretório atual)."""
+    src = os.path.join(fixtures, "inputs")
+    if not os.path.exists(os.path.join(src, "config.json")):
+        src = "."
+    shutil.copyfile(os.path.join(src, "config.json"), os.path.join(workdir, "config.json"))
+    prompts = os.path.join(src, "prompts") if os.path.isdir(os.path.join(src, "prompts")) else "prompts"
+    shutil.copytree(prompts, os.path.join(workdir, "prompts"))
+
+
+def bench_e2e(args) -> int:
+    """
+    Pipeline inteiro (main.main) sobre um corpus fixo.
+
+    --record: roda com rede e grava respostas HTTP + streams da IA em --fixtures.
+    Sem --record: reproduz as gravações (sem rede) com um Ollama falso local
+    (fake_ollama.py, latência por token configurável). Cada run usa um
+    diretório temporário (cache/ e jobs.db vazios), então nada vem do cache.
+    """
+    fixtures = os.path.abspath(args.fixtures)
+    if not args.record and not os.path.isdir(fixtures):
+        print(f"Sem gravações em {fixtures} (grave antes com --record).")
+        return 1
+    # antes de importar main/scraper/llm_provider: a config é lida no import
+    os.environ["HTTP_REPLAY_MODE"] = "record" if args.record else "replay"
+    os.environ["HTTP_REPLAY_DIR"] = fixtures
+    # auditoria por sorteio mudaria quais vagas vão para a IA entre gravação e reprodução
+    os.environ.setdefault("PRE_EXTRACT_AUDIT_RATE", "0")
+    if not args.keep_rate:
+        os.environ["RATE_MIN_INTERVAL"] = "0"
+        os.environ["RATE_JITTER"] = "0"
+
+    server = None
+    if not args.record:
+        import fake_ollama
+        server = fake_ollama.start(token_ms=args.token_ms, prefill_ms=args.prefill_ms, fixtures=fixtures)
+        os.environ["LLM_ENDPOINTS"] = f"http://127.0.0.1:{server.server_port}"
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    try:
+        if args.record:
+            os.makedirs(fixtures, exist_ok=True)
+            shutil.copyfile("config.json", os.path.join(workdir, "config.json"))
+            shutil.copytree("prompts", os.path.join(workdir, "prompts"))
+        else:
+            _copy_inputs(fixtures, workdir)
+        os.chdir(workdir)
+        sys.path.insert(0, cwd)
+        import main as pipeline_main
+        stats = pipeline_main.main()
+    finally:
+        os.chdir(cwd)
+        if args.keep_workdir:
+            print(f"Diretório do run: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    wall = stats["wall_s"]
+    pages = stats["pages"]
+    mode = "gravação" if args.record else f"reprodução (token_ms={args.token_ms:g}, prefill_ms={args.prefill_ms:g})"
+    print(f"\n=== e2e: {mode} ===")
+    print(f"páginas={pages} puladas={stats['skipped']} fora_da_agenda={stats['not_due'] + stats['deferred']} "
+          f"erros={stats['errors']} wall={wall:.2f}s vazão={pages / wall if wall else 0:.2f} páginas/s")
+    print(f"\n{'estágio':<10} {'workers':>7} {'itens':>6} {'busy_s':>8} {'ms/item':>8} {'itens/s':>8}")
+    rows = [(s["name"], s["workers"], s["n"], s["busy_s"]) for s in stats["stages"]]
+    rows.insert(0, ("fetch", pipeline_main.FETCH_CONCURRENCY, pages, stats["fetch_ms"] / 1000))
+    rows.append(("db", 1, pages, stats["persist_ms"] / 1000))
+    for name, workers, n, busy in rows:
+        per = busy * 1000 / n if n else 0.0
+        # itens/s com todos os workers ocupados
+        rate = n / busy * workers if busy else 0.0
+        print(f"{name:<10} {workers:>7} {n:>6} {busy:>8.2f} {per:>8.1f} {rate:>8.1f}")
+    if server is not None:
+        print(f"\nIA falsa: chamadas={server.calls} reproduzidas={server.replayed} "
+              f"sintetizadas={server.calls - server.replayed}")
+        server.shutdown()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do job_scraper_ia")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("extract", help="extratores HTML -> texto (velocidade + paridade)")
+    p.add_argument("--corpus", help="diretório com .html (padrão: cache de páginas)")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--baseline", default="bs4")
+    p.add_argument("--show-diff", action="store_true")
+    p.set_defaults(func=bench_extract)
+
+    p = sub.add_parser("llm", help="chamada à IA: /api/chat com prefixo fixo vs /api/generate")
+    p.add_argument("--corpus", help="diretório com .html (padrão: cache de páginas)")
+    p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--api", choices=["both", "chat", "generate"], default="both")
+    p.add_argument("--prompt", default="prompts/prompt_extracao.txt")
+    p.add_argument("--no-warmup", dest="warmup", action="store_false")
+    p.set_defaults(func=bench_llm)
+
+    p = sub.add_parser("reduce", help="redução do texto: tokens do prompt x concordância dos campos")
+    p.add_argument("--corpus", help="diretório com .html (padrão: cache de páginas)")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--budgets", default="600,1000,1500,2500", help="orçamentos de tokens, separados por vírgula")
+    p.add_argument("--llm", action="store_true", help="campos da IA (Ollama) em vez das regras")
+    p.add_argument("--prompt", default="prompts/prompt_extracao.txt")
+    p.set_defaults(func=bench_reduce)
+
+    p = sub.add_parser("clean", help="text_cleaner: ms/página e paridade com a implementação anterior")
+    p.add_argument("--corpus", help="diretório com .html (padrão: cache de páginas)")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--variants", type=int, default=20, help="cópias com ruído por página")
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--budgets", default="600,1500")
+    p.add_argument("--show-diff", action="store_true")
+    p.set_defaults(func=bench_clean)
+
+    p = sub.add_parser("neardup", help="índice de quase-duplicatas: latência da busca com N vagas")
+    p.add_argument("--size", type=int, default=300000, help="vagas sintéticas no índice")
+    p.add_argument("--queries", type=int, default=2000)
+    p.add_argument("--corpus", help="diretório com .html (padrão: cache de páginas) para medir a assinatura")
+    p.add_argument("--limit", type=int, default=None)
+    p.set_defaults(func=bench_neardup)
+
+    p = sub.add_parser("boilerplate", help="template por domínio: tokens poupados x campos preservados")
+    p.add_argument("--corpus", help="diretório com .html, uma subpasta por domínio (padrão: cache de páginas)")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--min-freq", type=float, default=None, help="padrão: BOILERPLATE_MIN_FREQ")
+    p.add_argument("--min-pages", type=int, default=None, help="padrão: BOILERPLATE_MIN_PAGES")
+    p.set_defaults(func=bench_boilerplate)
+
+    p = sub.add_parser("fingerprint", help="recoleta diária simulada: vagas puladas com sha256 x impressão digital")
+    p.add_argument("--corpus", help="diretório com .html (padrão: cache de páginas)")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--days", type=int, default=7)
+    p.add_argument("--edit-rate", type=float, default=0.1, help="fração das recoletas com mudança real na vaga")
+    p.set_defaults(func=bench_fingerprint)
+
+    p = sub.add_parser("recrawl", help="agenda de revisita simulada: coletas por run x atraso para ver mudanças")
+    p.add_argument("--urls", type=int, default=20000)
+    p.add_argument("--days", type=int, default=60)
+    p.add_argument("--budget", type=int, default=0, help="coletas por run (0 = sem limite)")
+    p.add_argument("--fresh-change", type=float, default=0.3, help="chance de mudar por dia nos primeiros dias")
+    p.add_argument("--stable-change", type=float, default=0.01, help="chance de mudar por dia depois")
+    p.add_argument("--warmup", type=int, default=14, help="dias iniciais fora das médias")
+    p.set_defaults(func=bench_recrawl)
+
+    p = sub.add_parser("e2e", help="pipeline inteiro gravado/reproduzido (sem rede): vazão por estágio")
+    p.add_argument("--fixtures", default="fixtures/default", help="diretório das gravações")
+    p.add_argument("--record", action="store_true", help="grava (com rede) em vez de reproduzir")
+    p.add_argument("--token-ms", type=float, default=20.0, help="IA falsa: ms por pedaço (~token)")
+    p.add_argument("--prefill-ms", type=float, default=0.0, help="IA falsa: ms por 1000 tokens do prompt")
+    p.add_argument("--keep-rate", action="store_true", help="mantém RATE_MIN_INTERVAL/RATE_JITTER do .env")
+    p.add_argument("--keep-workdir", action="store_true", help="não apaga o diretório temporário do run")
+    p.set_defaults(func=bench_e2e)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
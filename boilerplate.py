@@ -0,0 +1,175 @@
+"""
+Boilerplate por domínio: linhas de template (menu, banner de cookies,
+rodapé) que se repetem nas páginas do mesmo ATS/site.
+
+Para cada domínio (stats_domain: todo *.gupy.io conta como gupy.io, todo
+tenant Workday como myworkdayjobs.com) guarda em quantas páginas cada linha
+apareceu. Linha presente em >= BOILERPLATE_MIN_FREQ das páginas do domínio
+(com pelo menos BOILERPLATE_MIN_PAGES páginas vistas) sai do texto antes da
+redução e do hash de conteúdo: menos tokens no prompt, menos prefill, e
+mudança só no template não conta como vaga alterada. Página sem linha de
+template passa intacta (mesmo hash de antes do modelo existir).
+
+- cada URL ensina uma vez (a primeira vez que é vista), senão a mesma vaga
+  coletada todo dia pareceria template
+- linhas com hint de seção ("Requisitos:", "Benefícios") nunca saem: são
+  iguais em todas as páginas, mas estruturam o texto
+- histerese: a linha entra no template com >= BOILERPLATE_MIN_FREQ e só
+  sai abaixo de BOILERPLATE_DROP_FREQ. O conjunto ativo fica estável
+  enquanto as contagens se mexem (cada página aprendida, decaimento,
+  poda), senão linhas na fronteira entrariam e sairiam do texto e o hash
+  de vagas que não mudaram oscilaria junto
+- acima de BOILERPLATE_MAX_LINES linhas por domínio, as mais raras saem;
+  com BOILERPLATE_DECAY_AT páginas as contagens caem pela metade (template
+  novo do site substitui o antigo)
+- persistido em cache/jobs.db (boilerplate_pages / boilerplate_lines /
+  boilerplate_active)
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import text_cleaner
+from text_cleaner import iter_clean_lines
+
+BOILERPLATE_ENABLED = os.getenv("BOILERPLATE_ENABLED", "1") == "1"
+BOILERPLATE_MIN_FREQ = float(os.getenv("BOILERPLATE_MIN_FREQ", "0.6"))
+BOILERPLATE_DROP_FREQ = float(os.getenv("BOILERPLATE_DROP_FREQ", "0.4"))
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "8"))
+BOILERPLATE_MAX_LINES = int(os.getenv("BOILERPLATE_MAX_LINES", "5000"))
+BOILERPLATE_DECAY_AT = int(os.getenv("BOILERPLATE_DECAY_AT", "400"))
+
+
+def line_key(low: str) -> int:
+    """Hash (64 bits com sinal, como o SQLite guarda) da linha em minúsculas."""
+    return int.from_bytes(hashlib.blake2b(low.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+class BoilerplateModel:
+    """
+    Uso (thread-safe, compartilhado pelos workers de limpeza):
+        bp = BoilerplateModel()
+        bp.load(get_boilerplate(conn))
+        texto, removidas = bp.strip(domain, texto)
+        bp.learn(domain, texto_original)      # uma vez por URL
+        save_boilerplate(conn, bp.rows(), now)
+    """
+    def __init__(
+        self,
+        min_freq: Optional[float] = None,
+        min_pages: Optional[int] = None,
+        max_lines: Optional[int] = None,
+        drop_freq: Optional[float] = None,
+    ):
+        self.min_freq = BOILERPLATE_MIN_FREQ if min_freq is None else float(min_freq)
+        self.drop_freq = min(self.min_freq, BOILERPLATE_DROP_FREQ if drop_freq is None else float(drop_freq))
+        self.min_pages = BOILERPLATE_MIN_PAGES if min_pages is None else int(min_pages)
+        self.max_lines = BOILERPLATE_MAX_LINES if max_lines is None else int(max_lines)
+        self._lock = threading.Lock()
+        # domain -> {"pages": n, "lines": {line_key: n}, "active": {line_key}}
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._dirty: set = set()
+        self.stripped_lines = 0
+        self.stripped_chars = 0
+
+    # ---------- persistência ----------
+    def load(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock:
+            self._data = {
+                d: {"pages": v["pages"], "lines": dict(v["lines"]), "active": set(v.get("active") or ())}
+                for d, v in rows.items()
+            }
+            for st in self._data.values():
+                if not st["active"]:
+                    self._update_active(st, None)  # banco sem o conjunto ativo
+            self._dirty = set()
+
+    def rows(self, only_dirty: bool = True) -> Dict[str, Dict[str, Any]]:
+        """{domain: {"pages", "lines", "active"}} (por padrão só os domínios que mudaram no run)."""
+        with self._lock:
+            domains = self._dirty if only_dirty else set(self._data)
+            return {
+                d: {"pages": self._data[d]["pages"], "lines": dict(self._data[d]["lines"]), "active": set(self._data[d]["active"])}
+                for d in domains
+            }
+
+    # ---------- aprendizado ----------
+    def learn(self, domain: str, text: str) -> None:
+        keys = {line_key(ln.lower()) for ln in iter_clean_lines(text)}
+        if not keys:
+            return
+        with self._lock:
+            st = self._data.setdefault(domain, {"pages": 0, "lines": {}, "active": set()})
+            if st["pages"] >= BOILERPLATE_DECAY_AT:
+                st["pages"] //= 2
+                st["lines"] = {k: n // 2 for k, n in st["lines"].items() if n >= 2}
+            st["pages"] += 1
+            lines = st["lines"]
+            for k in keys:
+                lines[k] = lines.get(k, 0) + 1
+            if len(lines) > self.max_lines:
+                keep = sorted(lines.items(), key=lambda kv: kv[1], reverse=True)[: self.max_lines * 3 // 4]
+                st["lines"] = dict(keep)
+            # só as linhas desta página podem ter cruzado o limiar de entrada
+            # (as demais só perderam frequência); no primeiro limiar, todas
+            self._update_active(st, None if st["pages"] == self.min_pages else keys)
+            self._dirty.add(domain)
+
+    def _update_active(self, st: Dict[str, Any], candidates) -> None:
+        """Entra quem passou de min_freq (entre `candidates`, ou todas); sai quem caiu abaixo de drop_freq."""
+        pages, lines, active = st["pages"], st["lines"], st["active"]
+        if pages < self.min_pages:
+            return
+        drop = self.drop_freq * pages
+        active.difference_update([k for k in active if lines.get(k, 0) < drop])
+        add = self.min_freq * pages
+        for k in (lines if candidates is None else candidates):
+            if lines.get(k, 0) >= add:
+                active.add(k)
+
+    # ---------- limpeza ----------
+    def _template_keys(self, domain: str) -> Optional[set]:
+        st = self._data.get(domain)
+        if st is None or st["pages"] < self.min_pages or not st["active"]:
+            return None
+        return st["active"]
+
+    def strip(self, domain: str, text: str) -> Tuple[str, int]:
+        """
+        (texto limpo sem as linhas de template do domínio, nº de linhas removidas).
+        Sem nada a remover devolve `text` como veio: o hash de conteúdo das
+        páginas fica igual ao de antes do modelo de template.
+        """
+        lines = list(iter_clean_lines(text))
+        with self._lock:
+            active = self._template_keys(domain)
+            if active is None:
+                return text, 0
+            section = text_cleaner._SECTION_RE.search
+            out, removed, removed_chars = [], 0, 0
+            for ln in lines:
+                low = ln.lower()
+                if line_key(low) in active and not section(low):
+                    removed += 1
+                    removed_chars += len(ln)
+                    continue
+                out.append(ln)
+            if not removed:
+                return text, 0
+            self.stripped_lines += removed
+            self.stripped_chars += removed_chars
+        return "\n".join(out), removed
+
+    def summary_lines(self) -> List[str]:
+        """Uma linha por domínio com template aprendido, para o log do run."""
+        with self._lock:
+            out = []
+            for d, st in sorted(self._data.items()):
+                if st["pages"] < self.min_pages:
+                    continue
+                out.append(f"{d} | páginas={st['pages']} | linhas de template={len(st['active'])}")
+            return out
@@ -0,0 +1,199 @@
+"""
+Cascata de modelos: primeiro um modelo pequeno/rápido, o maior só quando
+a resposta do pequeno não serve.
+
+    LLM_CASCADE_MODELS=qwen2.5:1.5b,qwen2.5:7b
+
+Escala para o próximo estágio quando:
+- a chamada falhou (timeout/conexão) ou o JSON veio cortado/não-JSON
+  (is_failed_result)
+- faltam chaves pedidas (basic_validate_result, ou só as `fields` pedidas)
+- campo obrigatório (LLM_CASCADE_REQUIRED) veio null
+- a confiança heurística fica abaixo de LLM_CASCADE_MIN_CONF
+
+Cada estágio usa o próprio modelo, num_predict e timeout (processor.llm_tiers).
+O último estágio não escala: o resultado dele vale como está.
+
+CascadeStats conta, por run, quantas vagas pararam em cada estágio, os
+motivos de escalada e o tempo estimado economizado (vagas resolvidas pelo
+pequeno x tempo médio do maior, menos o tempo gasto no pequeno pelas que
+escalaram).
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import re
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from processor import extract_many, is_failed_result, llm_tiers, Tier
+from pre_extract import PRE_EXTRACT_MIN_CONF, norm_for_compare
+from utils import basic_validate_result
+
+LLM_CASCADE_REQUIRED = [f.strip() for f in os.getenv("LLM_CASCADE_REQUIRED", "cargo,empresa").split(",") if f.strip()]
+LLM_CASCADE_MIN_CONF = float(os.getenv("LLM_CASCADE_MIN_CONF", "0.6"))
+
+_EMPTY = (None, "", [], "desconhecido")
+_WORD_RE = re.compile(r"\w{3,}")
+
+
+def cascade_enabled() -> bool:
+    return len(llm_tiers()) > 1
+
+
+def confidence(result: Dict[str, Any], text: str, pre: Optional[Dict[str, Dict[str, Any]]] = None) -> float:
+    """
+    0..1, heurística barata:
+    - campos vazios/"desconhecido" derrubam a nota
+    - cada campo consertado pelo schema (_schema_fixes) derruba mais
+    - cargo que não aparece no texto (palavras do cargo) é suspeito
+    - divergência com regra de confiança alta (pre_extract)
+    """
+    keys = [k for k in result if not k.startswith("_") and k != "url"]
+    if not keys:
+        return 0.0
+    conf = 1.0
+    empty = sum(1 for k in keys if result[k] in _EMPTY)
+    conf -= 0.5 * empty / len(keys)
+    conf -= 0.15 * len(result.get("_schema_fixes") or [])
+
+    cargo = result.get("cargo")
+    if isinstance(cargo, str) and cargo.strip():
+        words = _WORD_RE.findall(cargo.lower())
+        low = text.lower()
+        if words and not any(w in low for w in words):
+            conf -= 0.3
+
+    for k, f in (pre or {}).items():
+        if f["conf"] >= PRE_EXTRACT_MIN_CONF and k in result:
+            if norm_for_compare(k, f["value"]) != norm_for_compare(k, result[k]):
+                conf -= 0.2
+    return max(0.0, round(conf, 2))
+
+
+def escalation_reason(
+    result: Optional[Dict[str, Any]],
+    text: str,
+    fields: Optional[List[str]] = None,
+    pre: Optional[Dict[str, Dict[str, Any]]] = None,
+    min_conf: Optional[float] = None,
+) -> Optional[str]:
+    """Motivo para chamar o próximo modelo, ou None se o resultado serve."""
+    min_conf = LLM_CASCADE_MIN_CONF if min_conf is None else min_conf
+    if not isinstance(result, dict) or is_failed_result(result):
+        return "falha"
+    if fields:
+        if any(k not in result for k in fields):
+            return "validação"
+    elif not basic_validate_result(result):
+        return "validação"
+    if any(k in result and result[k] in _EMPTY for k in LLM_CASCADE_REQUIRED if not fields or k in fields):
+        return "obrigatório"
+    if confidence(result, text, pre) < min_conf:
+        return "confiança"
+    return None
+
+
+class CascadeStats:
+    """Contadores por run (thread-safe): vagas e tempo por estágio, motivos de escalada."""
+    def __init__(self, tiers: Optional[List[Tier]] = None):
+        self.tiers = tiers or llm_tiers()
+        self._lock = threading.Lock()
+        n = len(self.tiers)
+        self.calls = [0] * n        # vagas que passaram pelo estágio
+        self.ms = [0.0] * n         # tempo (ms) somado por vaga no estágio
+        self.resolved = [0] * n     # vagas cujo resultado final saiu do estágio
+        self.wasted_ms = 0.0        # tempo gasto nos estágios que não resolveram a vaga
+        self.reasons: Dict[str, int] = {}
+
+    def record(self, tier_idx: int, ms: float, reason: Optional[str]) -> None:
+        with self._lock:
+            self.calls[tier_idx] += 1
+            self.ms[tier_idx] += ms
+            last = tier_idx == len(self.tiers) - 1
+            if reason is None or last:
+                self.resolved[tier_idx] += 1
+            else:
+                self.wasted_ms += ms
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def summary_lines(self) -> List[str]:
+        with self._lock:
+            total = self.calls[0]
+            if not total:
+                return []
+            out = []
+            for i, t in enumerate(self.tiers):
+                avg = self.ms[i] / self.calls[i] if self.calls[i] else 0.0
+                out.append(
+                    f"{i + 1}. {t['model']}: vagas={self.calls[i]} resolvidas={self.resolved[i]} "
+                    f"avg_ms={avg:.0f}"
+                )
+            escalated = total - self.resolved[0]
+            reasons = ", ".join(f"{k}={v}" for k, v in sorted(self.reasons.items())) or "-"
+            out.append(
+                f"escalada={escalated / total:.0%} ({escalated}/{total}) | motivos: {reasons} | "
+                f"tempo antes de escalar={self.wasted_ms / 1000:.1f}s"
+            )
+            last = len(self.tiers) - 1
+            if self.calls[last]:
+                # estimativa: o que as vagas resolvidas antes teriam custado no maior
+                big_avg = self.ms[last] / self.calls[last]
+                early = sum(self.resolved[:last])
+                saved = early * big_avg - sum(self.ms[:last])
+                out.append(f"tempo economizado (estimado)={saved / 1000:.1f}s")
+            return out
+
+
+def extract_cascade(
+    prompt_template: str,
+    items: List[Dict[str, Any]],
+    stats: Optional[CascadeStats] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Como processor.extract_many (itens {"text","url"[, "fields", "pre"]}),
+    passando pelos estágios de llm_tiers(). Só as vagas que precisam seguem
+    para o próximo modelo (em lote, se LLM_BATCH_SIZE > 1).
+
+    Resultados ganham "_model" (modelo que respondeu) e, se escalaram,
+    "_escalated" com os motivos.
+    """
+    tiers = stats.tiers if stats is not None else llm_tiers()
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    reasons: List[List[str]] = [[] for _ in items]
+    pending = list(range(len(items)))
+
+    for n, tier in enumerate(tiers):
+        if not pending:
+            break
+        last = n == len(tiers) - 1
+        t0 = time.time()
+        try:
+            got = extract_many(prompt_template, [items[i] for i in pending], tier=tier)
+        except requests.exceptions.RequestException as e:
+            if last:
+                raise
+            print(f"  - IA (Ollama): {tier['model']} falhou ({type(e).__name__}: {e}); escalando.")
+            got = [None] * len(pending)
+        per_item_ms = (time.time() - t0) * 1000 / len(pending)
+
+        still = []
+        for i, result in zip(pending, got):
+            reason = escalation_reason(result, items[i]["text"], items[i].get("fields"), items[i].get("pre"))
+            if stats is not None:
+                stats.record(n, per_item_ms, reason)
+            if reason is None or last:
+                if isinstance(result, dict):
+                    result["_model"] = tier["model"]
+                    if reasons[i]:
+                        result["_escalated"] = reasons[i]
+                results[i] = result
+            else:
+                reasons[i].append(reason)
+                still.append(i)
+        pending = still
+    return results
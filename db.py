@@ -1,6 +1,9 @@
+import json
 import sqlite3
 from typing import Optional, Dict, Any, List
 
+from utils import detect_platform
+
 DB_PATH = "cache/jobs.db"
 
 SCHEMA = """
@@ -38,10 +41,170 @@ CREATE TABLE IF NOT EXISTS jobs (
 
 CREATE INDEX IF NOT EXISTS idx_jobs_url_norm ON jobs(url_norm);
 CREATE INDEX IF NOT EXISTS idx_jobs_last_seen ON jobs(last_seen);
+
+-- validadores HTTP para GET condicional (If-None-Match / If-Modified-Since)
+CREATE TABLE IF NOT EXISTS http_validators (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    updated_at TEXT
+);
+
+-- cache de páginas (corpo comprimido fica em cache/pages/, endereçado por sha256)
+CREATE TABLE IF NOT EXISTS page_cache (
+    key TEXT PRIMARY KEY,
+    url_norm TEXT,
+    strategy TEXT,
+    raw_sha TEXT,
+    text_sha TEXT,
+    fetched_at REAL,
+    last_access REAL,
+    expires_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_page_cache_url ON page_cache(url_norm);
+CREATE INDEX IF NOT EXISTS idx_page_cache_last_access ON page_cache(last_access);
+
+CREATE TABLE IF NOT EXISTS page_blobs (
+    sha TEXT PRIMARY KEY,
+    size_bytes INTEGER
+);
+
+-- cache negativo: URLs com falha persistente (gone/dns/blocked/timeout)
+CREATE TABLE IF NOT EXISTS url_failures (
+    url_norm TEXT PRIMARY KEY,
+    klass TEXT,
+    detail TEXT,
+    fails INTEGER,
+    first_seen TEXT,
+    last_seen TEXT,
+    next_probe REAL
+);
+
+-- cache das extrações da IA (chave = texto reduzido + prompt + modelo/opções)
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    result_json TEXT,
+    created_at REAL,
+    last_access REAL,
+    hits INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access);
+
+-- índice de quase-duplicatas (MinHash do texto reduzido, ver near_dup.py);
+-- cluster_id = id da primeira vaga do grupo; uma chave LSH por faixa
+CREATE TABLE IF NOT EXISTS near_dup (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url_norm TEXT UNIQUE,
+    sig BLOB,
+    cluster_id INTEGER,
+    result_json TEXT,
+    created_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_near_dup_cluster ON near_dup(cluster_id);
+
+CREATE TABLE IF NOT EXISTS near_dup_bands (
+    key INTEGER,
+    dup_id INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_near_dup_bands_key ON near_dup_bands(key);
+CREATE INDEX IF NOT EXISTS idx_near_dup_bands_dup ON near_dup_bands(dup_id);
+
+-- métricas de cada chamada à IA (último chunk do servidor + tempo de parede);
+-- lote: uma linha por vaga, mesmo call_id
+CREATE TABLE IF NOT EXISTS llm_metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT,
+    call_id TEXT,
+    created_at TEXT,
+    url_norm TEXT,
+    model TEXT,
+    endpoint TEXT,
+    api TEXT,
+    batch_size INTEGER,
+    fields INTEGER,
+    prompt_tokens INTEGER,
+    prompt_ms REAL,
+    eval_tokens INTEGER,
+    eval_ms REAL,
+    load_ms REAL,
+    total_ms REAL,
+    wall_ms REAL,
+    chunks INTEGER,
+    done_reason TEXT,
+    stop TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_metrics_run ON llm_metrics(run_id);
+CREATE INDEX IF NOT EXISTS idx_llm_metrics_url ON llm_metrics(url_norm);
+
+-- boilerplate por domínio: páginas vistas e em quantas cada linha (hash) apareceu
+CREATE TABLE IF NOT EXISTS boilerplate_pages (
+    domain TEXT PRIMARY KEY,
+    pages INTEGER,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS boilerplate_lines (
+    domain TEXT,
+    line_key INTEGER,
+    n INTEGER,
+    PRIMARY KEY (domain, line_key)
+);
+
+-- linhas hoje tratadas como template (histerese: entra/sai com limiares diferentes)
+CREATE TABLE IF NOT EXISTS boilerplate_active (
+    domain TEXT,
+    line_key INTEGER,
+    PRIMARY KEY (domain, line_key)
+);
+
+-- impressão digital do conteúdo por URL (fingerprint.py): hash por seção e o que mudou na última versão
+CREATE TABLE IF NOT EXISTS content_fingerprints (
+    url_norm TEXT PRIMARY KEY,
+    hash TEXT,
+    sections_json TEXT,
+    changed_json TEXT,
+    changes INTEGER DEFAULT 0,
+    updated_at TEXT
+);
+
+-- agenda de revisita por URL (recrawl.py): fila por next_due
+CREATE TABLE IF NOT EXISTS crawl_schedule (
+    url_norm TEXT PRIMARY KEY,
+    next_due REAL,
+    interval_s REAL,
+    first_seen REAL,
+    last_fetch REAL,
+    last_change REAL,
+    changes INTEGER,
+    stable_runs INTEGER,
+    last_outcome TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_crawl_schedule_due ON crawl_schedule(next_due);
+
+-- estatísticas de coleta por domínio/estratégia (ordem adaptativa jina/direct)
+CREATE TABLE IF NOT EXISTS fetch_stats (
+    domain TEXT,
+    strategy TEXT,
+    n REAL,
+    ok REAL,
+    total_ms REAL,
+    total_chars REAL,
+    updated_at TEXT,
+    PRIMARY KEY (domain, strategy)
+);
 """
 
-def connect(db_path: str = DB_PATH) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
+def connect(db_path: str = DB_PATH, check_same_thread: bool = True) -> sqlite3.Connection:
+    # check_same_thread=False: conexão compartilhada entre threads de coleta
+    # (quem usa assim precisa serializar o acesso com um lock)
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=check_same_thread)
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
     return conn
@@ -50,13 +213,35 @@ def init_db(db_path: str = DB_PATH) -> None:
     conn = connect(db_path)
     try:
         conn.executescript(SCHEMA)
+        migrate_platforms(conn)
         conn.commit()
     finally:
         conn.close()
 
+def migrate_platforms(conn: sqlite3.Connection) -> int:
+    """
+    Vagas gravadas como platform='unknown' cuja URL hoje é reconhecida
+    (ex.: greenhouse/workday) passam para a plataforma certa, senão a
+    próxima coleta criaria outra linha para a mesma vaga (UNIQUE(platform,
+    job_id)). Se a linha nova já existe, ela fica e a antiga sai.
+    """
+    moved = 0
+    rows = conn.execute("SELECT id, url_norm FROM jobs WHERE platform='unknown' AND url_norm IS NOT NULL").fetchall()
+    for rid, url_norm in rows:
+        platform = detect_platform(url_norm)
+        if platform == "unknown":
+            continue
+        cur = conn.execute("UPDATE OR IGNORE jobs SET platform=? WHERE id=?", (platform, rid))
+        if cur.rowcount == 0:
+            conn.execute("DELETE FROM jobs WHERE id=?", (rid,))
+        moved += 1
+    if moved:
+        conn.commit()
+    return moved
+
 def get_job_by_key(conn: sqlite3.Connection, platform: str, job_id: str) -> Optional[Dict[str, Any]]:
     cur = conn.execute(
-        "SELECT platform, job_id, content_hash, last_seen, url_norm FROM jobs WHERE platform=? AND job_id=?",
+        "SELECT platform, job_id, content_hash, last_seen, url_norm, status, created_at FROM jobs WHERE platform=? AND job_id=?",
         (platform, job_id),
     )
     row = cur.fetchone()
@@ -68,6 +253,8 @@ def get_job_by_key(conn: sqlite3.Connection, platform: str, job_id: str) -> Opti
         "content_hash": row[2],
         "last_seen": row[3],
         "url_norm": row[4],
+        "status": row[5],
+        "created_at": row[6],
     }
 
 def upsert_job(conn: sqlite3.Connection, rec: Dict[str, Any]) -> None:
@@ -117,6 +304,32 @@ def upsert_job(conn: sqlite3.Connection, rec: Dict[str, Any]) -> None:
     )
     conn.commit()
 
+def touch_job(
+    conn: sqlite3.Connection,
+    platform: str,
+    job_id: str,
+    last_seen: str,
+    status: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> None:
+    """
+    Conteúdo não mudou: atualiza só last_seen (e status/content_hash, se
+    informados), preservando os campos extraídos pela IA.
+    """
+    conn.execute(
+        "UPDATE jobs SET last_seen=?, status=COALESCE(?, status), content_hash=COALESCE(?, content_hash) "
+        "WHERE platform=? AND job_id=?",
+        (last_seen, status, content_hash, platform, job_id),
+    )
+    conn.commit()
+
+def set_job_status(conn: sqlite3.Connection, platform: str, job_id: str, status: str) -> None:
+    conn.execute(
+        "UPDATE jobs SET status=? WHERE platform=? AND job_id=?",
+        (status, platform, job_id),
+    )
+    conn.commit()
+
 def fetch_all_jobs(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
     cur = conn.execute(
         """
@@ -140,3 +353,237 @@ def fetch_all_jobs(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
             "score_0_100": r[14], "motivo_curto": r[15],
         })
     return out
+
+def get_all_http_validators(conn: sqlite3.Connection) -> Dict[str, Dict[str, Optional[str]]]:
+    cur = conn.execute("SELECT url, etag, last_modified FROM http_validators")
+    return {r[0]: {"etag": r[1], "last_modified": r[2]} for r in cur.fetchall()}
+
+def save_http_validators(
+    conn: sqlite3.Connection,
+    url: str,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    updated_at: str,
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO http_validators (url, etag, last_modified, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            etag=excluded.etag,
+            last_modified=excluded.last_modified,
+            updated_at=excluded.updated_at
+        """,
+        (url, etag, last_modified, updated_at),
+    )
+    conn.commit()
+
+def get_fetch_stats(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    cur = conn.execute("SELECT domain, strategy, n, ok, total_ms, total_chars FROM fetch_stats")
+    return [
+        {"domain": r[0], "strategy": r[1], "n": r[2], "ok": r[3], "total_ms": r[4], "total_chars": r[5]}
+        for r in cur.fetchall()
+    ]
+
+def save_fetch_stats(conn: sqlite3.Connection, rows: List[Dict[str, Any]], updated_at: str) -> None:
+    conn.executemany(
+        """
+        INSERT INTO fetch_stats (domain, strategy, n, ok, total_ms, total_chars, updated_at)
+        VALUES (:domain, :strategy, :n, :ok, :total_ms, :total_chars, :updated_at)
+        ON CONFLICT(domain, strategy) DO UPDATE SET
+            n=excluded.n,
+            ok=excluded.ok,
+            total_ms=excluded.total_ms,
+            total_chars=excluded.total_chars,
+            updated_at=excluded.updated_at
+        """,
+        [{**r, "updated_at": updated_at} for r in rows],
+    )
+    conn.commit()
+
+def get_boilerplate(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {
+        r[0]: {"pages": r[1], "lines": {}, "active": set()} for r in conn.execute("SELECT domain, pages FROM boilerplate_pages")
+    }
+    for domain, key, n in conn.execute("SELECT domain, line_key, n FROM boilerplate_lines"):
+        if domain in out:
+            out[domain]["lines"][key] = n
+    for domain, key in conn.execute("SELECT domain, line_key FROM boilerplate_active"):
+        if domain in out:
+            out[domain]["active"].add(key)
+    return out
+
+def save_boilerplate(conn: sqlite3.Connection, rows: Dict[str, Dict[str, Any]], updated_at: str) -> None:
+    """Regrava os domínios de `rows` inteiros (linhas podadas somem)."""
+    for domain, st in rows.items():
+        conn.execute(
+            """
+            INSERT INTO boilerplate_pages (domain, pages, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(domain) DO UPDATE SET pages=excluded.pages, updated_at=excluded.updated_at
+            """,
+            (domain, st["pages"], updated_at),
+        )
+        conn.execute("DELETE FROM boilerplate_lines WHERE domain=?", (domain,))
+        conn.executemany(
+            "INSERT INTO boilerplate_lines (domain, line_key, n) VALUES (?, ?, ?)",
+            [(domain, k, n) for k, n in st["lines"].items()],
+        )
+        conn.execute("DELETE FROM boilerplate_active WHERE domain=?", (domain,))
+        conn.executemany(
+            "INSERT INTO boilerplate_active (domain, line_key) VALUES (?, ?)",
+            [(domain, k) for k in st.get("active") or ()],
+        )
+    conn.commit()
+
+def get_fingerprints(conn: sqlite3.Connection, url_norms: List[str]) -> Dict[str, Dict[str, Any]]:
+    """{url_norm: {"hash", "sections"}} das URLs que já têm impressão digital."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(url_norms), 500):
+        chunk = url_norms[i:i + 500]
+        rows = conn.execute(
+            f"SELECT url_norm, hash, sections_json FROM content_fingerprints WHERE url_norm IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        for url_norm, h, secs in rows:
+            out[url_norm] = {"hash": h, "sections": json.loads(secs or "{}")}
+    return out
+
+def save_fingerprint(
+    conn: sqlite3.Connection,
+    url_norm: str,
+    fp: Dict[str, Any],
+    changed: Optional[List[str]],
+    updated_at: str,
+) -> None:
+    """Grava a versão atual; `changed` (seções alteradas) só conta como mudança se não vazio."""
+    conn.execute(
+        """
+        INSERT INTO content_fingerprints (url_norm, hash, sections_json, changed_json, changes, updated_at)
+        VALUES (?, ?, ?, ?, 0, ?)
+        ON CONFLICT(url_norm) DO UPDATE SET
+            hash=excluded.hash,
+            sections_json=excluded.sections_json,
+            changed_json=COALESCE(excluded.changed_json, content_fingerprints.changed_json),
+            changes=content_fingerprints.changes + (excluded.changed_json IS NOT NULL),
+            updated_at=excluded.updated_at
+        """,
+        (url_norm, fp["hash"], json.dumps(fp["sections"], ensure_ascii=False),
+         json.dumps(changed, ensure_ascii=False) if changed else None, updated_at),
+    )
+    conn.commit()
+
+_SCHEDULE_COLS = (
+    "next_due", "interval_s", "first_seen", "last_fetch", "last_change", "changes", "stable_runs", "last_outcome",
+)
+
+def get_crawl_schedule(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+    cur = conn.execute(f"SELECT url_norm, {', '.join(_SCHEDULE_COLS)} FROM crawl_schedule")
+    return {r[0]: dict(zip(_SCHEDULE_COLS, r[1:])) for r in cur.fetchall()}
+
+def save_crawl_schedule(conn: sqlite3.Connection, rows: Dict[str, Dict[str, Any]]) -> None:
+    conn.executemany(
+        f"""
+        INSERT INTO crawl_schedule (url_norm, {', '.join(_SCHEDULE_COLS)})
+        VALUES (?, {', '.join('?' * len(_SCHEDULE_COLS))})
+        ON CONFLICT(url_norm) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in _SCHEDULE_COLS)}
+        """,
+        [(u, *(e.get(c) for c in _SCHEDULE_COLS)) for u, e in rows.items()],
+    )
+    conn.commit()
+
+def get_url_failures(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+    cur = conn.execute("SELECT url_norm, klass, detail, fails, first_seen, last_seen, next_probe FROM url_failures")
+    return {
+        r[0]: {
+            "klass": r[1], "detail": r[2], "fails": r[3],
+            "first_seen": r[4], "last_seen": r[5], "next_probe": r[6],
+        }
+        for r in cur.fetchall()
+    }
+
+def record_url_failure(
+    conn: sqlite3.Connection,
+    url_norm: str,
+    klass: str,
+    detail: str,
+    fails: int,
+    next_probe: float,
+    now: str,
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO url_failures (url_norm, klass, detail, fails, first_seen, last_seen, next_probe)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url_norm) DO UPDATE SET
+            klass=excluded.klass,
+            detail=excluded.detail,
+            fails=excluded.fails,
+            last_seen=excluded.last_seen,
+            next_probe=excluded.next_probe
+        """,
+        (url_norm, klass, detail, fails, now, now, next_probe),
+    )
+    conn.commit()
+
+def clear_url_failure(conn: sqlite3.Connection, url_norm: str) -> None:
+    conn.execute("DELETE FROM url_failures WHERE url_norm=?", (url_norm,))
+    conn.commit()
+
+def save_llm_metrics(
+    conn: sqlite3.Connection,
+    run_id: str,
+    url_norm: str,
+    rows: List[Dict[str, Any]],
+    created_at: str,
+) -> None:
+    conn.executemany(
+        """
+        INSERT INTO llm_metrics (
+            run_id, call_id, created_at, url_norm, model, endpoint, api, batch_size, fields,
+            prompt_tokens, prompt_ms, eval_tokens, eval_ms, load_ms, total_ms, wall_ms,
+            chunks, done_reason, stop
+        ) VALUES (
+            :run_id, :call_id, :created_at, :url_norm, :model, :endpoint, :api, :batch_size, :fields,
+            :prompt_tokens, :prompt_ms, :eval_tokens, :eval_ms, :load_ms, :total_ms, :wall_ms,
+            :chunks, :done_reason, :stop
+        )
+        """,
+        [{**r, "run_id": run_id, "url_norm": url_norm, "created_at": created_at} for r in rows],
+    )
+    conn.commit()
+
+def llm_metrics_summary(conn: sqlite3.Connection, run_id: str, load_event_ms: float = 500.0) -> List[Dict[str, Any]]:
+    """Agregado por modelo das chamadas do run (lote conta uma vez, pelo call_id)."""
+    cur = conn.execute(
+        """
+        SELECT model,
+               COUNT(*),
+               SUM(prompt_tokens), SUM(prompt_ms),
+               SUM(eval_tokens), SUM(eval_ms),
+               SUM(CASE WHEN load_ms >= ? THEN 1 ELSE 0 END), SUM(CASE WHEN load_ms >= ? THEN load_ms ELSE 0 END),
+               SUM(wall_ms),
+               SUM(CASE WHEN prompt_tokens IS NULL THEN 1 ELSE 0 END),
+               SUM(chunks),
+               SUM(CASE WHEN stop = 'complete' THEN 1 ELSE 0 END)
+        FROM (
+            SELECT call_id, MAX(model) AS model, MAX(prompt_tokens) AS prompt_tokens, MAX(prompt_ms) AS prompt_ms,
+                   MAX(eval_tokens) AS eval_tokens, MAX(eval_ms) AS eval_ms, MAX(load_ms) AS load_ms,
+                   MAX(wall_ms) AS wall_ms, MAX(chunks) AS chunks, MAX(stop) AS stop
+            FROM llm_metrics WHERE run_id=? GROUP BY call_id
+        )
+        GROUP BY model
+        ORDER BY model
+        """,
+        (load_event_ms, load_event_ms, run_id),
+    )
+    return [
+        {
+            "model": r[0], "calls": r[1],
+            "prompt_tokens": r[2] or 0, "prompt_ms": r[3] or 0.0,
+            "eval_tokens": r[4] or 0, "eval_ms": r[5] or 0.0,
+            "load_events": r[6] or 0, "load_ms": r[7] or 0.0,
+            "wall_ms": r[8] or 0.0, "no_metrics": r[9] or 0,
+            "chunks": r[10] or 0, "complete": r[11] or 0,
+        }
+        for r in cur.fetchall()
+    ]
@@ -0,0 +1,84 @@
+"""
+Extração HTML -> texto (plugável).
+
+- "lxml" (padrão): parse direto no lxml, sem montar árvore do BeautifulSoup
+- "bs4": caminho antigo (BeautifulSoup + lxml), mantido para comparação
+
+Os dois devolvem um nó de texto por linha (strip, sem vazios), sem
+script/style/noscript/comentários: o mesmo formato de
+soup.get_text("\\n", strip=True). Comparação em bench.py (subcomando extract).
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+from typing import Callable, Dict
+
+import lxml.html
+from lxml import etree
+from bs4 import BeautifulSoup
+
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "lxml")
+
+_SKIP_TAGS = ("script", "style", "noscript")
+# separador interno: marca onde havia um elemento removido, para o texto
+# antes e depois dele continuar em linhas separadas (como no bs4)
+_SEP = "\ue000"  # área de uso privado do Unicode
+_PARSER = lxml.html.HTMLParser(encoding="utf-8", remove_blank_text=False)
+
+Extractor = Callable[[str], str]
+EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register_extractor(name: str):
+    def deco(fn: Extractor) -> Extractor:
+        EXTRACTORS[name] = fn
+        return fn
+    return deco
+
+
+@register_extractor("bs4")
+def bs4_extract(html: str) -> str:
+    soup = BeautifulSoup(html, "lxml")
+    # remove scripts/styles
+    for tag in soup(list(_SKIP_TAGS)):
+        tag.decompose()
+    return soup.get_text("\n", strip=True)
+
+
+@register_extractor("lxml")
+def lxml_extract(html: str) -> str:
+    if not html or not html.strip():
+        return ""
+    data = html.encode("utf-8", errors="ignore") if isinstance(html, str) else html
+    try:
+        root = lxml.html.document_fromstring(data, parser=_PARSER)
+    except (etree.ParserError, ValueError):
+        return ""
+
+    removed = (*_SKIP_TAGS, etree.Comment, etree.ProcessingInstruction)
+    for el in root.iter(*removed):
+        if el.tail:
+            el.tail = _SEP + el.tail
+    etree.strip_elements(root, *removed, with_tail=False)
+
+    out = []
+    for chunk in root.itertext():
+        for piece in chunk.split(_SEP) if _SEP in chunk else (chunk,):
+            piece = piece.strip()
+            if piece:
+                out.append(piece)
+    return "\n".join(out)
+
+
+def get_extractor(name: str | None = None) -> Extractor:
+    name = name or HTML_EXTRACTOR
+    try:
+        return EXTRACTORS[name]
+    except KeyError:
+        raise ValueError(f"Extrator desconhecido: {name} (opções: {', '.join(EXTRACTORS)})")
+
+
+def extract_text(html: str) -> str:
+    """HTML -> texto com o extrator configurado (HTML_EXTRACTOR)."""
+    return get_extractor()(html)
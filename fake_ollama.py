@@ -0,0 +1,211 @@
+"""
+Servidor Ollama falso (local, sem modelo) para benchmarks e testes manuais.
+
+    python fake_ollama.py --port 11434 --token-ms 20
+    python fake_ollama.py --fixtures fixtures/run1   # reproduz streams gravados (replay.py)
+
+- POST /api/generate e /api/chat, com e sem streaming (NDJSON como o Ollama)
+- GET /api/tags (health check do llm_provider)
+- resposta: o stream gravado para o mesmo pedido (--fixtures), senão um
+  JSON montado a partir do `format` (schema) do pedido, com valores neutros
+- latência configurável: --prefill-ms por 1000 tokens do prompt antes do
+  primeiro pedaço e --token-ms entre pedaços; o chunk final traz as métricas
+  (prompt_eval_count/duration, eval_count/duration) coerentes com isso
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import replay
+
+_PIECE_CHARS = 4  # ~1 token por pedaço
+
+
+def _neutral(schema: Dict[str, Any]) -> Any:
+    if "enum" in schema:
+        return "desconhecido" if "desconhecido" in schema["enum"] else schema["enum"][0]
+    t = schema.get("type")
+    types = t if isinstance(t, list) else [t]
+    if "null" in types:
+        return None
+    if "array" in types:
+        return []
+    if "object" in types:
+        return {k: _neutral(v) for k, v in (schema.get("properties") or {}).items()}
+    if "integer" in types or "number" in types:
+        return 0
+    if "boolean" in types:
+        return False
+    return ""
+
+
+def synth_response(payload: Dict[str, Any]) -> str:
+    """JSON com valores neutros para o schema do pedido (ou um objeto vazio)."""
+    fmt = payload.get("format")
+    if isinstance(fmt, dict):
+        return json.dumps(_neutral(fmt), ensure_ascii=False)
+    return "{}"
+
+
+def _prompt_chars(payload: Dict[str, Any]) -> int:
+    if "messages" in payload:
+        return sum(len(m.get("content") or "") for m in payload["messages"])
+    return len(payload.get("prompt") or "")
+
+
+def _recorded_pieces(body: bytes) -> Tuple[List[str], Dict[str, Any]]:
+    """Pedaços de texto + chunk final de um stream NDJSON gravado."""
+    pieces, final = [], {}
+    for line in body.decode("utf-8", errors="replace").splitlines():
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            continue
+        piece = obj.get("response") or (obj.get("message") or {}).get("content")
+        if piece:
+            pieces.append(piece)
+        if obj.get("done") is True:
+            final = obj
+    return pieces, final
+
+
+class FakeOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, token_ms: float = 0.0, prefill_ms: float = 0.0, fixtures: Optional[str] = None):
+        super().__init__(addr, _Handler)
+        self.token_ms = token_ms
+        self.prefill_ms = prefill_ms
+        self.fixtures = fixtures
+        self.calls = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+
+    def count(self, replayed: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.replayed += int(replayed)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeOllama
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, obj: Dict[str, Any], status: int = 200) -> None:
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "fake"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json({"error": "not found"}, 404)
+            return
+        payload = json.loads(raw or b"{}")
+        chat = self.path == "/api/chat"
+
+        fx = None
+        if self.server.fixtures:
+            fx = replay.load_fixture(self.server.fixtures, replay.fixture_key("POST", self.path, raw, llm=True))
+        if fx is not None and not fx.get("error") and fx.get("status") == 200:
+            pieces, rec_final = _recorded_pieces(replay.fixture_body(fx))
+        else:
+            text = synth_response(payload) if (payload.get("messages") or payload.get("prompt")) else ""
+            pieces = [text[i:i + _PIECE_CHARS] for i in range(0, len(text), _PIECE_CHARS)]
+            rec_final = {}
+        self.server.count(fx is not None)
+
+        prompt_tokens = rec_final.get("prompt_eval_count") or _prompt_chars(payload) // 4
+        prefill_s = self.server.prefill_ms * prompt_tokens / 1000 / 1000
+        t0 = time.perf_counter()
+        time.sleep(prefill_s)
+        final = {
+            "model": payload.get("model"),
+            "done": True,
+            "done_reason": rec_final.get("done_reason") or "stop",
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prefill_s * 1e9),
+            "eval_count": len(pieces),
+        }
+
+        if payload.get("stream") is False:
+            time.sleep(self.server.token_ms * len(pieces) / 1000)
+            text = "".join(pieces)
+            final["eval_duration"] = int((time.perf_counter() - t0 - prefill_s) * 1e9)
+            final["total_duration"] = int((time.perf_counter() - t0) * 1e9)
+            body = {"message": {"role": "assistant", "content": text}} if chat else {"response": text}
+            self._send_json({**final, **body})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for piece in pieces:
+                time.sleep(self.server.token_ms / 1000)
+                obj = {"message": {"role": "assistant", "content": piece}} if chat else {"response": piece}
+                self._chunk({"model": payload.get("model"), **obj, "done": False})
+            final["eval_duration"] = int((time.perf_counter() - t0 - prefill_s) * 1e9)
+            final["total_duration"] = int((time.perf_counter() - t0) * 1e9)
+            self._chunk({**final, **({"message": {"role": "assistant", "content": ""}} if chat else {"response": ""})})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # cliente fechou a conexão (parada antecipada do parser): como o Ollama, para de gerar
+            self.close_connection = True
+
+    def _chunk(self, obj: Dict[str, Any]) -> None:
+        data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def start(
+    port: int = 0,
+    token_ms: float = 0.0,
+    prefill_ms: float = 0.0,
+    fixtures: Optional[str] = None,
+    host: str = "127.0.0.1",
+) -> FakeOllama:
+    """Sobe em thread daemon; `server.server_port` tem a porta (port=0: livre)."""
+    server = FakeOllama((host, port), token_ms=token_ms, prefill_ms=prefill_ms, fixtures=fixtures)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ollama falso para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-ms", type=float, default=20.0, help="ms entre pedaços (~tokens) da resposta")
+    parser.add_argument("--prefill-ms", type=float, default=0.0, help="ms por 1000 tokens do prompt")
+    parser.add_argument("--fixtures", help="diretório gravado com HTTP_REPLAY_MODE=record")
+    args = parser.parse_args(argv)
+    server = FakeOllama((args.host, args.port), token_ms=args.token_ms, prefill_ms=args.prefill_ms, fixtures=args.fixtures)
+    print(f"fake Ollama em http://{args.host}:{server.server_port} (token_ms={args.token_ms})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Motor de coleta concorrente.
+
+Busca várias URLs ao mesmo tempo (limite global + limite por domínio) e
+entrega cada página assim que termina, sem esperar a lista inteira.
+A lógica de coleta continua em scraper.get_page_text (Jina -> requests,
+retry/backoff do tenacity), aqui só muda a orquestração.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+from scraper import get_page_text
+
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+FETCH_PER_DOMAIN = int(os.getenv("FETCH_PER_DOMAIN", "2"))
+
+
+def _domain(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def _timed_fetch(fetch: Callable[[str], Any], url: str) -> Dict[str, Any]:
+    """
+    `fetch` pode devolver o texto (str) ou um dict com "text" + extras
+    (ex.: "structured" dos adapters), que são repassados no resultado.
+    """
+    t0 = time.time()
+    out: Dict[str, Any] = {"url": url, "text": None, "error": None}
+    try:
+        got = fetch(url)
+        if isinstance(got, dict):
+            out.update(got)
+        else:
+            out["text"] = got
+    except Exception as e:
+        out["error"] = e
+    out["scrape_ms"] = int((time.time() - t0) * 1000)
+    return out
+
+
+def iter_pages(
+    urls: Iterable[str],
+    fetch: Callable[[str], Any] = get_page_text,
+    max_workers: Optional[int] = None,
+    per_domain: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Gera {"url", "text", "error", "scrape_ms"} na ordem em que as coletas terminam.
+
+    - no máximo `max_workers` requisições em voo (global)
+    - no máximo `per_domain` requisições simultâneas no mesmo host
+    - domínios são servidos em round-robin, então um host lento/limitado
+      não segura a fila dos outros
+    - só submete trabalho novo quando o consumidor pede o próximo item
+      (backpressure: memória limitada a `max_workers` páginas)
+
+    Exceções da coleta não interrompem o lote: vêm em "error".
+    """
+    max_workers = max(1, max_workers or FETCH_CONCURRENCY)
+    per_domain = max(1, per_domain or FETCH_PER_DOMAIN)
+
+    queues: "OrderedDict[str, deque]" = OrderedDict()
+    for url in urls:
+        queues.setdefault(_domain(url), deque()).append(url)
+
+    inflight = {d: 0 for d in queues}
+    pending = {}  # future -> domínio
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch") as pool:
+        while queues or pending:
+            # round-robin: uma URL por domínio por volta, até encher os slots
+            progressed = True
+            while progressed and len(pending) < max_workers:
+                progressed = False
+                for d in list(queues):
+                    if len(pending) >= max_workers:
+                        break
+                    if inflight[d] >= per_domain:
+                        continue
+                    url = queues[d].popleft()
+                    if not queues[d]:
+                        del queues[d]
+                    pending[pool.submit(_timed_fetch, fetch, url)] = d
+                    inflight[d] += 1
+                    progressed = True
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                inflight[pending.pop(fut)] -= 1
+                yield fut.result()
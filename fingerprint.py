@@ -0,0 +1,132 @@
+"""
+Impressão digital do conteúdo da vaga (no lugar do sha256 do texto bruto).
+
+O texto do Jina/HTML traz coisas que mudam todo dia sem a vaga mudar:
+"publicada há 3 dias", "123 candidatos", horário da coleta, widget de
+"vagas similares". Com o sha256 do texto, qualquer uma delas vira vaga
+alterada: nova chamada à IA e upsert completo.
+
+Aqui o hash é de uma visão normalizada:
+- texto já limpo e sem template do domínio (boilerplate.py), em minúsculas
+- tempo relativo, contadores (candidatos, visualizações), horário de
+  publicação/atualização e timestamps mascarados
+- blocos de recomendação (VOLATILE_SECTION_HINTS) fora
+- dividido em seções pelos cabeçalhos; cada seção tem o próprio hash e o
+  hash final usa as seções em ordem de nome (reordenar seções não conta)
+
+Com as seções da versão anterior (tabela content_fingerprints), dá para
+dizer o que mudou; se só mudaram seções de FINGERPRINT_IGNORE_SECTIONS
+(ex.: "sobre a empresa"), a vaga não é extraída de novo.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import re
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional
+
+import text_cleaner
+from text_cleaner import iter_clean_lines
+
+FINGERPRINT_ENABLED = os.getenv("FINGERPRINT_ENABLED", "1") == "1"
+FINGERPRINT_IGNORE_SECTIONS = [
+    s.strip().lower() for s in os.getenv("FINGERPRINT_IGNORE_SECTIONS", "sobre a empresa,sobre nós").split(",") if s.strip()
+]
+
+VOLATILE_SECTION_HINTS = [
+    "vagas similares", "vagas relacionadas", "vagas recomendadas", "outras vagas",
+    "você também pode", "voce tambem pode", "quem viu esta vaga",
+    "similar jobs", "related jobs", "recommended jobs", "more jobs", "people also viewed",
+]
+_VOLATILE_RE = text_cleaner._hint_regex(VOLATILE_SECTION_HINTS)
+
+_TOP = "_topo"  # linhas antes do primeiro cabeçalho
+_HEADER_MAX_WORDS = 6
+
+# uma regex só, um grupo por marcador; na mesma posição vale a primeira
+# alternativa (timestamp antes de horário)
+_MASK_RE = re.compile(
+    r"(?P<ts>\b\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}(?::\d{2})?(?:\.\d+)?(?:z|[+-]\d{2}:?\d{2})?)"
+    # horário só junto de publicação/atualização/coleta ("8:00 às 17:00" é o turno)
+    r"|(?P<hora>\b(?:publicad[ao]|postad[ao]|atualizad[ao]|coletad[ao]|posted|updated|published)\b"
+    r"[^\d\n]{0,30}(?:\d{1,2}/\d{1,2}(?:/\d{2,4})?[^\d\n]{0,12})?\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]m)?\b)"
+    r"|(?P<tempo>\b(?:há|ha|faz)\s+(?:mais de\s+|cerca de\s+)?(?:\d+|um|uma|alguns|algumas)\s+"
+    r"(?:segundos?|minutos?|horas?|dias?|semanas?|m[eê]s|meses|anos?)\b"
+    r"|\b(?:\d+\+?|an?|one|a few)\s+(?:seconds?|minutes?|hours?|days?|weeks?|months?|years?)\s+ago\b"
+    r"|\b\d+\s+(?:segundos?|minutos?|horas?|dias?|semanas?|meses)\s+atr[aá]s\b"
+    r"|\b(?:publicad[ao]|postad[ao]|atualizad[ao]|posted|updated)\s+(?:hoje|ontem|today|yesterday|just now)\b)"
+    # "10 pessoas" fica: tamanho do time é conteúdo da vaga
+    r"|(?P<n>\b\d[\d.,]*\+?\s*(?:candidat\w*|inscri\w*|visualiza\w*|cliques|acessos|"
+    r"applicants?|applications?|views?|clicks?)\b)"
+)
+# filtro barato: sem dígito nem palavra de tempo, a linha não tem o que mascarar
+_MASK_HINT_RE = re.compile(r"[0-9]|h[aá] |faz |ago\b|hoje|ontem|today|yesterday|just now")
+_NON_WORD_RE = re.compile(r"[^\w<>]+")
+
+Fingerprint = Dict[str, Any]  # {"hash": str, "sections": {nome: hash16}}
+
+
+def _marker(m: "re.Match[str]") -> str:
+    return f"<{m.lastgroup}>"
+
+
+def mask_volatile(low: str) -> str:
+    """Linha em minúsculas com tempo relativo/contadores/horário de publicação trocados por marcadores."""
+    if _MASK_HINT_RE.search(low):
+        low = _MASK_RE.sub(_marker, low)
+    return low
+
+
+def _section_name(ln: str, low: str, n_words: int, hint: bool) -> Optional[str]:
+    """Nome da seção se a linha é cabeçalho (hint de seção vira o nome canônico)."""
+    if n_words > _HEADER_MAX_WORDS:
+        return None
+    m = text_cleaner._SECTION_RE.search(low) if hint else None
+    if m is not None and (m.start() == 0 or ln.endswith(":")):
+        return m.group(0)
+    if ln.endswith(":") or ln.isupper():
+        return _NON_WORD_RE.sub(" ", low).strip() or None
+    return None
+
+
+def sections(lines: Iterable[str]) -> Dict[str, List[str]]:
+    """{seção: linhas normalizadas}, sem blocos de recomendação."""
+    volatile = _VOLATILE_RE.search
+    out: Dict[str, List[str]] = {}
+    cur: Optional[str] = _TOP
+    for ln, low, n_words, hint in text_cleaner.scan_lines(lines):
+        if n_words <= _HEADER_MAX_WORDS and volatile(low):
+            cur = None  # pula até o próximo cabeçalho
+            continue
+        name = _section_name(ln, low, n_words, hint)
+        if name is not None:
+            cur = name  # o cabeçalho entra na seção ("Local: São Paulo" é conteúdo)
+        elif cur is None:
+            continue
+        norm = mask_volatile(low)
+        if norm:
+            out.setdefault(cur, []).append(norm)
+    return out
+
+
+def _h16(s: str) -> str:
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def fingerprint(text: str) -> Fingerprint:
+    """Hash do conteúdo normalizado + hash por seção."""
+    secs = {name: _h16("\n".join(lines)) for name, lines in sections(iter_clean_lines(text)).items()}
+    joined = "\n".join(f"{name}\t{h}" for name, h in sorted(secs.items()))
+    return {"hash": hashlib.sha256(joined.encode("utf-8")).hexdigest(), "sections": secs}
+
+
+def changed_sections(old: Dict[str, str], new: Dict[str, str]) -> List[str]:
+    """Seções novas, removidas ou com hash diferente (em ordem de nome)."""
+    return sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+
+
+def relevant_change(changed: List[str]) -> bool:
+    """Alguma seção alterada fora de FINGERPRINT_IGNORE_SECTIONS?"""
+    return any(c not in FINGERPRINT_IGNORE_SECTIONS for c in changed)
+
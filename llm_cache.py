@@ -0,0 +1,106 @@
+"""
+Cache das extrações da IA, endereçado por conteúdo.
+
+chave = sha256(texto reduzido + template do prompt + modelo/opções de geração)
+
+- a mesma vaga vista por outra URL (parâmetro de tracking, link de outro
+  board) ou com mudança só fora do texto reduzido não gera nova chamada
+- mudar prompts/prompt_extracao.txt, OLLAMA_MODEL ou as opções de geração
+  muda a chave: as entradas antigas só deixam de ser usadas e saem pelo LRU
+- índice e resultado (JSON) ficam em cache/jobs.db (tabela llm_cache),
+  limitado a LLM_CACHE_MAX_ENTRIES com despejo LRU
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from db import DB_PATH, connect
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+
+
+def extraction_key(text: str, prompt_template: str, signature: Dict[str, Any]) -> str:
+    h = hashlib.sha256()
+    for part in (text, prompt_template, json.dumps(signature, sort_keys=True, ensure_ascii=False)):
+        h.update(part.encode("utf-8", errors="ignore"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    Uso (thread-safe, compartilhado pelos workers da IA):
+        lc = LLMCache()
+        key = extraction_key(texto_reduzido, prompt_template, llm_signature())
+        result = lc.get(key)          # dict | None
+        lc.put(key, result, model)
+    """
+    def __init__(self, db_path: str = DB_PATH, max_entries: Optional[int] = None):
+        self.max_entries = int(max_entries if max_entries is not None else LLM_CACHE_MAX_ENTRIES)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect(db_path, check_same_thread=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT result_json FROM llm_cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE llm_cache SET last_access=?, hits=hits+1 WHERE key=?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict[str, Any], model: str = "") -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO llm_cache (key, model, result_json, created_at, last_access, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(key) DO UPDATE SET
+                    result_json=excluded.result_json,
+                    last_access=excluded.last_access
+                """,
+                (key, model, json.dumps(result, ensure_ascii=False), now, now),
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Mantém só as LLM_CACHE_MAX_ENTRIES entradas usadas mais recentemente."""
+        with self._lock:
+            cur = self._conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": n,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
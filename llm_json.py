@@ -0,0 +1,327 @@
+"""
+JSON da IA: schema derivado do prompt + parser incremental do streaming.
+
+- schema_from_prompt: lê o bloco "FORMATO DO JSON" de prompts/prompt_extracao.txt
+  ("cargo": string|null, "tipo_trabalho": "remoto"|"hibrido"|..., [string],
+  integer) e monta o JSON schema que vai no `format` do Ollama (structured
+  outputs). Mudou o prompt, mudou o schema.
+- JsonStreamParser: recebe os pedaços conforme chegam e acompanha a estrutura
+  (strings, escapes, pilha de {/[). Com isso:
+    * sabe quando o objeto de topo fechou -> a leitura para ali, sem esperar
+      o "done" nem gastar num_predict
+    * valida cada campo de topo assim que ele termina
+    * aborta lista descontrolada (itens demais ou o mesmo item repetido)
+    * sempre consegue devolver um objeto: corta no último valor completo e
+      fecha as chaves/colchetes abertos
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import re
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+LLM_MAX_LIST_ITEMS = int(os.getenv("LLM_MAX_LIST_ITEMS", "25"))
+LLM_MAX_REPEATS = int(os.getenv("LLM_MAX_REPEATS", "3"))
+
+_FORMAT_BLOCK_RE = re.compile(r"FORMATO DO JSON[^\n]*\n(\{.*?\n\})", re.DOTALL)
+_FORMAT_LINE_RE = re.compile(r'^\s*"(\w+)"\s*:\s*(.+?)\s*,?\s*$', re.MULTILINE)
+_TYPES = {"string": "string", "integer": "integer", "number": "number", "boolean": "boolean", "null": "null"}
+
+
+def _spec_to_schema(spec: str) -> Dict[str, Any]:
+    """`string|null`, `"a"|"b"`, `[string]`, `integer` -> JSON schema."""
+    spec = spec.strip()
+    if spec.startswith("[") and spec.endswith("]"):
+        return {"type": "array", "items": _spec_to_schema(spec[1:-1])}
+    types: List[str] = []
+    enum: List[Any] = []
+    for part in (p.strip() for p in spec.split("|")):
+        if len(part) >= 2 and part[0] == part[-1] == '"':
+            enum.append(part[1:-1])
+        elif part in _TYPES:
+            types.append(_TYPES[part])
+    if enum:
+        if "null" in types:
+            enum.append(None)
+            return {"type": ["string", "null"], "enum": enum}
+        return {"type": "string", "enum": enum}
+    if not types:
+        return {}
+    return {"type": types[0] if len(types) == 1 else types}
+
+
+def schema_from_prompt(prompt_template: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """JSON schema do bloco "FORMATO DO JSON" (só `fields`, se vier). None se não achar o bloco."""
+    m = _FORMAT_BLOCK_RE.search(prompt_template)
+    if not m:
+        return None
+    props = {}
+    for key, spec in _FORMAT_LINE_RE.findall(m.group(1)):
+        if fields and key not in fields:
+            continue
+        props[key] = _spec_to_schema(spec)
+    if not props:
+        return None
+    return {"type": "object", "properties": props, "required": list(props)}
+
+
+def batch_schema(item_schema: Dict[str, Any], ids: List[str]) -> Dict[str, Any]:
+    """Lote: {"<id>": item_schema, ...}."""
+    return {"type": "object", "properties": {i: item_schema for i in ids}, "required": list(ids)}
+
+
+def _type_ok(value: Any, t: str) -> bool:
+    if t == "null":
+        return value is None
+    if t == "string":
+        return isinstance(value, str)
+    if t == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if t == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if t == "boolean":
+        return isinstance(value, bool)
+    if t == "array":
+        return isinstance(value, list)
+    if t == "object":
+        return isinstance(value, dict)
+    return True
+
+
+def check_value(value: Any, schema: Dict[str, Any]) -> bool:
+    if not schema:
+        return True
+    if "enum" in schema and value not in schema["enum"]:
+        return False
+    t = schema.get("type")
+    if t is None:
+        return True
+    types = t if isinstance(t, list) else [t]
+    if not any(_type_ok(value, x) for x in types):
+        return False
+    if isinstance(value, list) and "items" in schema:
+        return all(check_value(v, schema["items"]) for v in value)
+    return True
+
+
+def coerce_to_schema(obj: Dict[str, Any], schema: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    Conserta no lugar os campos fora do schema (enum inválido -> "desconhecido"
+    ou null; inteiro em string -> int; tipo errado -> null/[]).
+    Devolve os nomes dos campos corrigidos.
+    """
+    if not schema:
+        return []
+    fixed = []
+    for key, sub in (schema.get("properties") or {}).items():
+        if key not in obj or check_value(obj[key], sub):
+            continue
+        v = obj[key]
+        t = sub.get("type")
+        types = t if isinstance(t, list) else [t]
+        if "enum" in sub:
+            obj[key] = "desconhecido" if "desconhecido" in sub["enum"] else None
+        elif "integer" in types and isinstance(v, (str, float)):
+            try:
+                obj[key] = int(float(str(v).strip()))
+            except ValueError:
+                obj[key] = 0
+        elif "array" in types:
+            obj[key] = [x for x in v if isinstance(x, str)] if isinstance(v, list) else []
+        elif "null" in types:
+            obj[key] = None
+        fixed.append(key)
+    return fixed
+
+
+class RunawayList(Exception):
+    pass
+
+
+class JsonStreamParser:
+    """
+    Uso:
+        p = JsonStreamParser(schema)
+        for chunk in stream:
+            p.feed(chunk)
+            if p.complete or p.aborted:
+                break   # fecha a conexão: o Ollama para de gerar
+        obj = p.result()  # dict | None (não veio nem o "{")
+    """
+    def __init__(
+        self,
+        schema: Optional[Dict[str, Any]] = None,
+        max_list_items: Optional[int] = None,
+        max_repeats: Optional[int] = None,
+        on_field: Optional[Callable[[str, Any, bool], None]] = None,
+    ):
+        self.schema = schema or {}
+        self.max_list_items = max_list_items or LLM_MAX_LIST_ITEMS
+        self.max_repeats = max_repeats or LLM_MAX_REPEATS
+        self.on_field = on_field
+
+        self.text = ""
+        self.started = False
+        self.complete = False
+        self.aborted: Optional[str] = None
+        self.fields: Dict[str, Any] = {}
+        self.invalid: List[str] = []
+
+        self._end = 0                     # fim do objeto de topo (se complete)
+        self._stack: List[Dict[str, Any]] = []
+        self._in_str = False
+        self._esc = False
+        self._scalar_start: Optional[int] = None
+        self._key_start: Optional[int] = None
+        self._safe: Tuple[int, str] = (0, "")  # (posição, fechamentos) do último corte válido
+
+    # ---------- estrutura ----------
+    def _closers(self) -> str:
+        return "".join("}" if c["kind"] == "{" else "]" for c in reversed(self._stack))
+
+    def _mark_safe(self, pos: int) -> None:
+        self._safe = (pos, self._closers())
+
+    def _value_start(self, pos: int) -> None:
+        if self._stack:
+            self._stack[-1]["item_start"] = pos
+
+    def _value_end(self, end: int) -> None:
+        if not self._stack:
+            return
+        top = self._stack[-1]
+        start = top.get("item_start")
+        top["item_start"] = None
+        if start is None:
+            return
+        if top["kind"] == "[":
+            top["count"] += 1
+            item = self.text[start:end]
+            top["repeats"] = top["repeats"] + 1 if item == top.get("last") else 1
+            top["last"] = item
+            # aborta antes de marcar o corte: o item que estourou fica de fora
+            if top["count"] > self.max_list_items:
+                raise RunawayList(f"lista com mais de {self.max_list_items} itens")
+            if top["repeats"] >= self.max_repeats:
+                raise RunawayList(f"item repetido {top['repeats']}x")
+            self._mark_safe(end)
+        else:
+            top["expect"] = "comma"
+            self._mark_safe(end)
+            if len(self._stack) == 1 and top.get("key") is not None:
+                self._field_done(top["key"], self.text[start:end])
+
+    def _field_done(self, key: str, raw: str) -> None:
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        sub = (self.schema.get("properties") or {}).get(key, {})
+        ok = check_value(value, sub)
+        self.fields[key] = value
+        if not ok:
+            self.invalid.append(key)
+        if self.on_field:
+            self.on_field(key, value, ok)
+
+    def _end_scalar(self, pos: int) -> None:
+        if self._scalar_start is not None:
+            self._scalar_start = None
+            self._value_end(pos)
+
+    # ---------- API ----------
+    def feed(self, chunk: str) -> None:
+        if self.complete or self.aborted:
+            return
+        base = len(self.text)
+        self.text += chunk
+        try:
+            for off, ch in enumerate(chunk):
+                self._step(base + off, ch)
+                if self.complete:
+                    break
+        except RunawayList as e:
+            self.aborted = str(e)
+
+    def _step(self, i: int, ch: str) -> None:
+        if not self.started:
+            if ch == "{":
+                self.started = True
+                self._stack.append({"kind": "{", "expect": "key", "key": None, "item_start": None})
+                self._mark_safe(i + 1)
+            return
+
+        if self._in_str:
+            if self._esc:
+                self._esc = False
+            elif ch == "\\":
+                self._esc = True
+            elif ch == '"':
+                self._in_str = False
+                top = self._stack[-1]
+                if self._key_start is not None:
+                    try:
+                        top["key"] = json.loads(self.text[self._key_start:i + 1])
+                    except ValueError:
+                        top["key"] = self.text[self._key_start + 1:i]
+                    self._key_start = None
+                    top["expect"] = "colon"
+                else:
+                    self._value_end(i + 1)
+            return
+
+        top = self._stack[-1]
+        if ch in " \t\r\n":
+            self._end_scalar(i)
+        elif ch == '"':
+            self._end_scalar(i)
+            self._in_str = True
+            if top["kind"] == "{" and top["expect"] == "key":
+                self._key_start = i
+            else:
+                self._value_start(i)
+        elif ch in "{[":
+            self._value_start(i)
+            node = {"kind": ch, "item_start": None}
+            if ch == "{":
+                node.update(expect="key", key=None)
+            else:
+                node.update(count=0, repeats=0, last=None)
+            self._stack.append(node)
+            self._mark_safe(i + 1)
+        elif ch in "}]":
+            self._end_scalar(i)
+            self._stack.pop()
+            if not self._stack:
+                self.complete = True
+                self._end = i + 1
+                return
+            self._value_end(i + 1)
+        elif ch == ",":
+            self._end_scalar(i)
+            if top["kind"] == "{":
+                top["expect"] = "key"
+        elif ch == ":":
+            self._end_scalar(i)
+            top["expect"] = "value"
+        elif self._scalar_start is None:
+            # número / true / false / null
+            self._scalar_start = i
+            self._value_start(i)
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Objeto completo; ou, se cortado/abortado, o prefixo válido fechado."""
+        if not self.started:
+            return None
+        if self.complete:
+            candidate = self.text[self.text.index("{"):self._end]
+        else:
+            pos, closers = self._safe
+            candidate = self.text[self.text.index("{"):pos].rstrip().rstrip(",") + closers
+        try:
+            obj = json.loads(candidate)
+        except ValueError:
+            return dict(self.fields) or None
+        return obj if isinstance(obj, dict) else None
@@ -0,0 +1,345 @@
+"""
+Servidores de IA: um ou mais hosts, Ollama ou compatível com OpenAI
+(llama.cpp server, vLLM), atrás de um pool com balanceamento e failover.
+
+    LLM_PROVIDER=ollama                       # padrão dos endpoints
+    LLM_ENDPOINTS=http://box1:11434,http://box2:11434,openai=http://box3:8000
+
+- processor continua montando o pedido no formato do Ollama (/api/chat ou
+  /api/generate); o provider traduz o pedido e o streaming da resposta
+  (NDJSON do Ollama, SSE do /v1/chat/completions)
+- cada pedido vai para o endpoint com menos pedidos em andamento
+  (least outstanding); empate -> o que recebeu menos pedidos
+- erro de conexão ou HTTP 5xx antes do streaming começar: o endpoint fica
+  fora por LLM_ENDPOINT_COOLDOWN_S e o pedido vai para o próximo (cada
+  endpoint no máximo uma vez por pedido)
+- health check (GET /api/tags ou /v1/models) a cada LLM_HEALTH_INTERVAL_S,
+  em thread própria, traz de volta quem voltou e tira quem caiu
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+import replay
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "ollama")
+LLM_ENDPOINTS = [
+    e.strip().rstrip("/")
+    for e in os.getenv("LLM_ENDPOINTS", os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")).split(",")
+    if e.strip()
+]
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+LLM_HEALTH_INTERVAL_S = float(os.getenv("LLM_HEALTH_INTERVAL_S", "30"))
+LLM_ENDPOINT_COOLDOWN_S = float(os.getenv("LLM_ENDPOINT_COOLDOWN_S", "30"))
+
+# (pedaço de texto | None, objeto final com métricas | None)
+Event = Tuple[Optional[str], Optional[Dict[str, Any]]]
+
+
+# sessão única: conexões reaproveitadas entre chamadas (keep-alive com o servidor)
+_http = requests.Session()
+replay.install(_http, llm=True)
+
+
+class EndpointDown(requests.exceptions.ConnectionError):
+    """HTTP 5xx antes do streaming: conta como host fora do ar (failover)."""
+
+
+def _safe_json_loads(s: str):
+    try:
+        return json.loads(s)
+    except Exception:
+        return None
+
+
+class OllamaProvider:
+    name = "ollama"
+    health_path = "/api/tags"
+
+    def headers(self) -> Dict[str, str]:
+        return {}
+
+    def translate(self, base_url: str, path: str, payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        return base_url + path, payload
+
+    def iter_events(self, r: requests.Response) -> Iterator[Event]:
+        for line in r.iter_lines(decode_unicode=True):
+            if not line:
+                yield None, None
+                continue
+            obj = _safe_json_loads(line)
+            if not obj:
+                continue
+            piece = obj.get("response") or (obj.get("message") or {}).get("content")
+            yield piece, (obj if obj.get("done") is True else None)
+
+
+class OpenAIProvider:
+    """POST /v1/chat/completions (stream SSE); métricas mapeadas para os nomes do Ollama."""
+    name = "openai"
+    health_path = "/v1/models"
+
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {LLM_API_KEY}"} if LLM_API_KEY else {}
+
+    def translate(self, base_url: str, path: str, payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        if "messages" in payload:
+            messages = payload["messages"]
+        else:
+            messages = [{"role": "user", "content": payload.get("prompt") or "ok"}]
+        options = payload.get("options") or {}
+        body: Dict[str, Any] = {
+            "model": payload.get("model"),
+            "messages": messages,
+            "stream": bool(payload.get("stream")),
+            "max_tokens": options.get("num_predict") or 1,
+        }
+        if "temperature" in options:
+            body["temperature"] = options["temperature"]
+        if options.get("stop"):
+            body["stop"] = options["stop"]
+        fmt = payload.get("format")
+        if isinstance(fmt, dict):
+            body["response_format"] = {"type": "json_schema", "json_schema": {"name": "vaga", "schema": fmt}}
+        elif fmt == "json":
+            body["response_format"] = {"type": "json_object"}
+        if body["stream"]:
+            body["stream_options"] = {"include_usage": True}
+        return base_url + "/v1/chat/completions", body
+
+    def iter_events(self, r: requests.Response) -> Iterator[Event]:
+        usage: Dict[str, Any] = {}
+        timings: Dict[str, Any] = {}
+        finish = None
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                yield None, None
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            obj = _safe_json_loads(data)
+            if not obj:
+                continue
+            usage = obj.get("usage") or usage
+            timings = obj.get("timings") or timings  # llama.cpp server
+            piece = None
+            for ch in obj.get("choices") or []:
+                piece = (ch.get("delta") or {}).get("content") or piece
+                finish = ch.get("finish_reason") or finish
+            if piece:
+                yield piece, None
+        final: Dict[str, Any] = {
+            "done": True,
+            "done_reason": finish,
+            "prompt_eval_count": usage.get("prompt_tokens"),
+            "eval_count": usage.get("completion_tokens"),
+        }
+        if timings:
+            final["prompt_eval_duration"] = int((timings.get("prompt_ms") or 0) * 1e6)
+            final["eval_duration"] = int((timings.get("predicted_ms") or 0) * 1e6)
+        yield None, final
+
+
+PROVIDERS = {"ollama": OllamaProvider, "openai": OpenAIProvider}
+
+
+class Endpoint:
+    def __init__(self, spec: str, default_provider: str = LLM_PROVIDER):
+        # "http://host:port" ou "openai=http://host:port"
+        kind, _, url = spec.partition("=") if "=" in spec.split("://", 1)[0] else (default_provider, "", spec)
+        if kind not in PROVIDERS:
+            raise ValueError(f"LLM provider desconhecido: {kind} (use {', '.join(PROVIDERS)})")
+        self.base_url = url.rstrip("/")
+        self.provider = PROVIDERS[kind]()
+        self.outstanding = 0
+        self.n = 0
+        self.fails = 0
+        self.total_ms = 0.0
+        self.down_until = 0.0
+        self.last_error = ""
+
+    def available(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def label(self) -> str:
+        return f"{self.provider.name}:{self.base_url}"
+
+
+class EndpointPool:
+    """
+    Uso (thread-safe):
+        pool = get_pool()
+        with pool.stream("/api/chat", payload, timeout=(10, 900)) as (label, events):
+            for piece, final in events:
+                ...
+    """
+    def __init__(self, specs: Optional[List[str]] = None, provider: str = LLM_PROVIDER):
+        self.endpoints = [Endpoint(s, provider) for s in (specs or LLM_ENDPOINTS)]
+        if not self.endpoints:
+            raise ValueError("LLM_ENDPOINTS vazio")
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+
+    # ---------- escolha ----------
+    def _acquire(self, tried: List[Endpoint]) -> Optional[Endpoint]:
+        now = time.time()
+        with self._lock:
+            cands = [e for e in self.endpoints if e not in tried]
+            if not cands:
+                return None
+            up = [e for e in cands if e.available(now)]
+            if up:
+                ep = min(up, key=lambda e: (e.outstanding, e.n))
+            else:
+                # todos fora: tenta o que volta primeiro (melhor que falhar sem tentar)
+                ep = min(cands, key=lambda e: e.down_until)
+            ep.outstanding += 1
+            return ep
+
+    def _release(self, ep: Endpoint, ms: float, ok: bool, down: bool = False, error: str = "") -> None:
+        with self._lock:
+            ep.outstanding -= 1
+            ep.n += 1
+            ep.total_ms += ms
+            if not ok:
+                ep.fails += 1
+                ep.last_error = error
+            if down:
+                ep.down_until = time.time() + LLM_ENDPOINT_COOLDOWN_S
+            elif ok:
+                ep.down_until = 0.0
+
+    def _mark(self, ep: Endpoint, up: bool, error: str = "") -> None:
+        with self._lock:
+            if up:
+                ep.down_until = 0.0
+            else:
+                ep.down_until = time.time() + LLM_ENDPOINT_COOLDOWN_S
+                ep.last_error = error
+
+    # ---------- pedidos ----------
+    def _open(self, path: str, payload: Dict[str, Any], timeout: Any, stream: bool):
+        """(endpoint, resposta já com status OK), com failover entre endpoints."""
+        tried: List[Endpoint] = []
+        last_error: Optional[Exception] = None
+        while True:
+            ep = self._acquire(tried)
+            if ep is None:
+                raise last_error or requests.exceptions.ConnectionError("nenhum endpoint de IA")
+            tried.append(ep)
+            url, body = ep.provider.translate(ep.base_url, path, payload)
+            t0 = time.time()
+            try:
+                r = _http.post(url, json=body, stream=stream, timeout=timeout, headers=ep.provider.headers())
+                if r.status_code >= 500:
+                    r.close()
+                    raise EndpointDown(f"HTTP {r.status_code} em {ep.label()}")
+                r.raise_for_status()
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                self._release(ep, (time.time() - t0) * 1000, ok=False, down=True, error=f"{type(e).__name__}: {e}")
+                if len(self.endpoints) > 1:
+                    print(f"  - IA: {ep.label()} fora ({type(e).__name__}); tentando outro endpoint.")
+                last_error = e
+                continue
+            except requests.exceptions.RequestException as e:
+                self._release(ep, (time.time() - t0) * 1000, ok=False, error=f"{type(e).__name__}: {e}")
+                raise
+            return ep, r, t0
+
+    @contextmanager
+    def stream(self, path: str, payload: Dict[str, Any], timeout: Any) -> Iterator[Tuple[str, Iterator[Event]]]:
+        """(rótulo do endpoint escolhido, eventos do streaming)."""
+        ep, r, t0 = self._open(path, payload, timeout, stream=True)
+        ok, error = False, ""
+        try:
+            with r:
+                yield ep.label(), ep.provider.iter_events(r)
+            ok = True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._release(ep, (time.time() - t0) * 1000, ok, error=error)
+
+    def post_each(self, path: str, payload: Dict[str, Any], timeout: Any) -> List[Tuple[str, Optional[str]]]:
+        """Mesmo pedido (sem streaming) em todos os endpoints: [(label, erro|None)]. Ex.: warm-up."""
+        out = []
+        for ep in self.endpoints:
+            url, body = ep.provider.translate(ep.base_url, path, {**payload, "stream": False})
+            try:
+                r = _http.post(url, json=body, timeout=timeout, headers=ep.provider.headers())
+                r.raise_for_status()
+                self._mark(ep, True)
+                out.append((ep.label(), None))
+            except requests.exceptions.RequestException as e:
+                self._mark(ep, False, f"{type(e).__name__}: {e}")
+                out.append((ep.label(), f"{type(e).__name__}: {e}"))
+        return out
+
+    # ---------- health check ----------
+    def check_health(self, timeout: float = 5.0) -> Dict[str, bool]:
+        out = {}
+        for ep in self.endpoints:
+            try:
+                r = _http.get(ep.base_url + ep.provider.health_path, timeout=timeout, headers=ep.provider.headers())
+                up = r.status_code < 500
+                err = "" if up else f"HTTP {r.status_code}"
+            except requests.exceptions.RequestException as e:
+                up, err = False, f"{type(e).__name__}: {e}"
+            self._mark(ep, up, err)
+            out[ep.label()] = up
+        return out
+
+    def start_health_checks(self, interval: Optional[float] = None) -> None:
+        """Thread daemon; só faz sentido com mais de um endpoint."""
+        interval = LLM_HEALTH_INTERVAL_S if interval is None else interval
+        if len(self.endpoints) < 2 or interval <= 0 or self._health_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.check_health()
+
+        self._health_thread = threading.Thread(target=loop, name="llm-health", daemon=True)
+        self._health_thread.start()
+
+    def summary_lines(self) -> List[str]:
+        now = time.time()
+        with self._lock:
+            out = []
+            for e in self.endpoints:
+                avg = e.total_ms / e.n if e.n else 0.0
+                state = "ok" if e.available(now) else "fora"
+                out.append(
+                    f"{e.label()} | {state} | pedidos={e.n} falhas={e.fails} avg_ms={avg:.0f}"
+                    + (f" | último erro: {e.last_error[:120]}" if e.fails and e.last_error else "")
+                )
+            return out
+
+
+_pool: Optional[EndpointPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> EndpointPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EndpointPool()
+        return _pool
+
+
+def set_pool(pool: Optional[EndpointPool]) -> None:
+    global _pool
+    with _pool_lock:
+        _pool = pool
@@ -2,35 +2,143 @@ import time
 from logger import setup_logger
 import os
 import json
+import argparse
+import random
+import threading
 # import pandas as pd
 
 from utils import (
     ensure_dirs, load_json, load_cache, save_cache,
-    sha256_text, basic_validate_result, now_iso,
-    normalize_url, detect_platform, extract_job_id
+    sha256_text, basic_validate_result, now_iso, iso_to_ts,
+    normalize_url, detect_platform, extract_job_id, parse_duration
 )
-from scraper import get_page_text
-from processor import load_prompt, call_llm_extract_json
-from text_cleaner import extract_relevant_sections, detect_status_from_text
+from fetch_engine import iter_pages, FETCH_CONCURRENCY, FETCH_PER_DOMAIN
+from pipeline import Stage, run_stages, PIPELINE_QUEUE_SIZE, PIPELINE_CLEAN_WORKERS, LLM_WORKERS
+from scraper import (
+    get_page_text, NotModified, PageRemoved, set_http_validators, pop_http_validators, set_page_cache,
+    strategy_stats, pop_fetch_metrics, get_cached_adapter_body, get_cached_page_text,
+)
+from page_cache import PageCache
+from adapters import get_adapter, merge_structured, ADAPTERS_SKIP_LLM
+import negative_cache
+from pre_extract import (
+    pre_extract, confident_fields, merge_pre, AgreementStats,
+    PRE_EXTRACT_ENABLED, PRE_EXTRACT_AUDIT_RATE,
+)
+from processor import (
+    load_prompt, extract_many, llm_signature, is_failed_result, warm_up, prompt_fields, llm_tiers,
+    pop_llm_metrics,
+    OLLAMA_API, OLLAMA_KEEP_ALIVE, OLLAMA_WARMUP, LLM_BATCH_SIZE, LLM_BATCH_WAIT_S,
+)
+from llm_cache import LLMCache, extraction_key, LLM_CACHE_ENABLED
+from near_dup import NearDupIndex, signature, NEAR_DUP_ENABLED
+from boilerplate import BoilerplateModel, BOILERPLATE_ENABLED
+from fingerprint import fingerprint, changed_sections, relevant_change, FINGERPRINT_ENABLED
+from recrawl import schedule_entry, select_due, RECRAWL_ENABLED, RECRAWL_FETCH_BUDGET
+from strategy_stats import stats_domain
+from cascade import CascadeStats, extract_cascade, cascade_enabled
+from llm_provider import get_pool
+import replay
+from text_cleaner import reduce_text, detect_status_from_text
 
 from utils import normalize_llm_result, extract_company_slug
 
 
-from db import init_db, connect, get_job_by_key, upsert_job
+from db import (
+    init_db, connect, get_job_by_key, upsert_job, touch_job,
+    get_all_http_validators, save_http_validators,
+    get_fetch_stats, save_fetch_stats, get_boilerplate, save_boilerplate,
+    get_fingerprints, save_fingerprint, get_crawl_schedule, save_crawl_schedule,
+    get_url_failures, record_url_failure, clear_url_failure, set_job_status,
+    save_llm_metrics, llm_metrics_summary,
+)
 
 
 def _json_dump(x) -> str:
     return json.dumps(x, ensure_ascii=False)
 
-def main():
+def _lookup_existing(conn, platform: str, job_id: str):
+    if platform != "unknown" and job_id:
+        return get_job_by_key(conn, platform, job_id)
+    return None
+
+def _schedule_prev(schedule, url_norm: str, existing):
+    """
+    Linha anterior da agenda. URL que ainda não tem agenda mas já está no
+    banco parte da data da vaga, senão contaria como vista agora (fica
+    RECRAWL_FRESH_DAYS no intervalo mínimo).
+    """
+    prev = schedule.get(url_norm)
+    if prev is not None or not existing:
+        return prev
+    created = iso_to_ts(existing.get("created_at"))
+    # única versão conhecida é a da criação (last_seen também anda sem mudança)
+    return {"first_seen": created, "last_change": created} if created else None
+
+def _record_failure(conn, failures, url_norm: str, platform: str, job_id: str, klass: str, detail: str):
+    """Grava/atualiza a URL no cache negativo; gone/dns marcam a vaga como removida."""
+    prev = failures.get(url_norm) or {}
+    fails = int(prev.get("fails") or 0) + 1 if prev.get("klass") == klass else 1
+    next_probe = negative_cache.next_probe_at(klass, fails)
+    record_url_failure(conn, url_norm, klass, detail[:500], fails, next_probe, now_iso())
+    failures[url_norm] = {"klass": klass, "fails": fails, "next_probe": next_probe}
+    if klass in negative_cache.REMOVED_CLASSES:
+        # mesma chave do upsert (plataforma desconhecida também é gravada)
+        set_job_status(conn, platform, job_id or url_norm, "removida")
+    return fails
+
+def _commit_http_validators(conn, url_norm: str) -> None:
+    for request_url, v in pop_http_validators(url_norm).items():
+        save_http_validators(conn, request_url, v.get("etag"), v.get("last_modified"), now_iso())
+
+def _commit_fingerprint(conn, known_fps, url_norm: str, page, changed=None) -> None:
+    """Grava a impressão digital da página se ela é nova para a URL."""
+    fp = page.get("fingerprint")
+    if fp is None or (known_fps.get(url_norm) or {}).get("hash") == fp["hash"]:
+        return
+    save_fingerprint(conn, url_norm, fp, changed, now_iso())
+    known_fps[url_norm] = fp
+
+def _log_llm_metrics(logger, conn, run_id: str) -> None:
+    """Resumo do run: tokens/s de prefill e decode, divisão do tempo e carregamentos de modelo."""
+    for m in llm_metrics_summary(conn, run_id):
+        prefill_tps = m["prompt_tokens"] / (m["prompt_ms"] / 1000) if m["prompt_ms"] else 0.0
+        decode_tps = m["eval_tokens"] / (m["eval_ms"] / 1000) if m["eval_ms"] else 0.0
+        busy = m["prompt_ms"] + m["eval_ms"]
+        with_metrics = m["calls"] - m["no_metrics"]
+        logger.info(
+            f"LLM_METRICS | {m['model']} | chamadas={m['calls']} | wall_médio_ms={m['wall_ms'] / m['calls']:.0f} | "
+            f"prompt_tok_médio={m['prompt_tokens'] / with_metrics if with_metrics else 0:.0f} "
+            f"({prefill_tps:.0f} tok/s) | "
+            f"saída_tok_média={m['eval_tokens'] / with_metrics if with_metrics else 0:.0f} "
+            f"({decode_tps:.1f} tok/s) | "
+            f"prefill/decode={m['prompt_ms'] / busy if busy else 0:.0%}/{m['eval_ms'] / busy if busy else 0:.0%}"
+        )
+        logger.info(
+            f"LLM_METRICS | {m['model']} | carregamentos do modelo={m['load_events']} ({m['load_ms'] / 1000:.1f}s) | "
+            f"JSON fechado={m['complete']} | sem métricas do servidor={m['no_metrics']}"
+        )
+
+
+def main(offline: bool = False, max_age: float | None = None, revisit_all: bool = False):
+    """
+    offline=True: usa só páginas do cache em disco (sem rede).
+    max_age (segundos): reaproveita páginas do cache mais novas que isso.
+    revisit_all=True: ignora a agenda de revisita (coleta todas as URLs).
+
+    Devolve um resumo do run (tempo total, coleta, estágios, persistência),
+    usado por `bench.py e2e`.
+    """
     logger = setup_logger()
     run_start = time.time()
+    run_stats = {"pages": 0, "skipped": 0, "not_due": 0, "deferred": 0, "errors": 0, "fetch_ms": 0, "persist_ms": 0.0, "stages": []}
 
     ensure_dirs()
     init_db()
 
     config = load_json("config.json")
     urls = config.get("urls_vagas", [])
+    keywords = config.get("termos_busca", [])
     if not urls:
         print("Nenhuma URL encontrada em config.json -> urls_vagas")
         return
@@ -43,105 +151,431 @@ def main():
     if not os.path.exists(prompt_path):
         raise RuntimeError(f"Prompt não encontrado: {prompt_path}")
     prompt_template = load_prompt(prompt_path)
+    # HTTP_REPLAY_MODE=record: guarda config/prompt junto das respostas gravadas
+    replay.snapshot_inputs(["config.json", prompt_path])
+    all_fields = prompt_fields(prompt_template)
+    agreement = AgreementStats()
+    cascade_stats = CascadeStats() if cascade_enabled() else None
 
-    provider = os.getenv("LLM_PROVIDER", "ollama")
     model = os.getenv("OLLAMA_MODEL", "qwen2.5:7b")
-    base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    llm_pool = get_pool()
+    run_id = now_iso()
 
     logger.info("=" * 70)
     logger.info(f"[{now_iso()}] Iniciando pipeline com {len(urls)} URLs")
-    logger.info(f"LLM_PROVIDER: {provider}")
     logger.info(f"OLLAMA_MODEL: {model}")
-    logger.info(f"OLLAMA_BASE_URL: {base_url}")
+    logger.info(f"LLM_ENDPOINTS: {', '.join(e.label() for e in llm_pool.endpoints)}")
+    logger.info(f"OLLAMA_API: {OLLAMA_API} | keep_alive={OLLAMA_KEEP_ALIVE}")
+    if cascade_stats is not None:
+        logger.info("LLM_CASCADE: " + " -> ".join(
+            f"{t['model']} (num_predict={t['num_predict']}, timeout={t['timeout']}s)" for t in cascade_stats.tiers
+        ))
+    logger.info(f"FETCH_CONCURRENCY: {FETCH_CONCURRENCY} | FETCH_PER_DOMAIN: {FETCH_PER_DOMAIN}")
+    logger.info(f"PAGE_CACHE: offline={offline} | max_age={max_age}")
     logger.info("=" * 70)
 
+    # health check periódico (só com mais de um endpoint)
+    llm_pool.start_health_checks()
+
+    # carrega o modelo (e o prefixo do prompt) enquanto a coleta começa
+    if OLLAMA_WARMUP:
+        def _warm():
+            # cascata: todos os estágios ficam carregados (keep_alive)
+            for t in llm_tiers():
+                ms = warm_up(prompt_template, model=t["model"])
+                if ms is not None:
+                    logger.info(f"LLM warm-up OK | {t['model']} | ms={ms}")
+        threading.Thread(target=_warm, name="llm-warmup", daemon=True).start()
+
+    page_cache = PageCache()
+    set_page_cache(page_cache)
+    llm_cache = LLMCache() if LLM_CACHE_ENABLED else None
+    near_index = NearDupIndex() if NEAR_DUP_ENABLED else None
+    boilerplate = BoilerplateModel() if BOILERPLATE_ENABLED else None
+
     conn = connect()
+    stages = []
     try:
-        for i, url in enumerate(urls, start=1):
-            logger.info(f"\n[{i}/{len(urls)}] URL: {url}")
-
+        set_http_validators(get_all_http_validators(conn))
+        strategy_stats.load(get_fetch_stats(conn))
+        if boilerplate is not None:
+            boilerplate.load(get_boilerplate(conn))
+        # hash já salvo por URL (os estágios em thread não leem o SQLite)
+        known_hashes = {}
+        for u in urls:
+            un = normalize_url(u)
+            existing = _lookup_existing(conn, detect_platform(un), extract_job_id(un))
+            if existing and existing.get("content_hash"):
+                known_hashes[un] = existing["content_hash"]
+        # versão anterior por seção (o que mudou, e se muda algo para a IA)
+        known_fps = get_fingerprints(conn, [normalize_url(u) for u in urls]) if FINGERPRINT_ENABLED else {}
+        # GET condicional só para URLs que já têm versão salva (senão um 304
+        # não teria para onde "pular")
+        revalidate = {un for un in map(normalize_url, urls) if un in known_hashes or un in cache}
+
+        # Cache negativo: URLs mortas/bloqueadas ficam fora até o TTL vencer;
+        # vencido, passam por um teste barato antes do pipeline completo
+        failures = get_url_failures(conn)
+        now_ts = time.time()
+        to_probe = {}
+        urls_fetch = []
+        for u in urls:
+            un = normalize_url(u)
+            f = failures.get(un)
+            if f and not offline and f["next_probe"] > now_ts:
+                hours = (f["next_probe"] - now_ts) / 3600
+                logger.info(
+                    f"Cache negativo | pulando {u} | {f['klass']} x{f['fails']} | "
+                    f"novo teste em {hours:.1f}h"
+                )
+                if f["klass"] in negative_cache.REMOVED_CLASSES:
+                    set_job_status(conn, detect_platform(un), extract_job_id(un) or un, "removida")
+                continue
+            if f and not offline:
+                to_probe[un] = f["klass"]
+            urls_fetch.append(u)
+
+        # Agenda de revisita: só as URLs vencidas, as mais atrasadas primeiro,
+        # até RECRAWL_FETCH_BUDGET (offline relê o cache, não conta como coleta)
+        use_schedule = RECRAWL_ENABLED and not offline
+        schedule = get_crawl_schedule(conn) if use_schedule else {}
+        schedule_updates = {}
+        if use_schedule and not revisit_all:
+            by_norm = {normalize_url(u): u for u in urls_fetch}
+            chosen, sel = select_due(list(by_norm), schedule)
+            urls_fetch = [by_norm[un] for un in chosen]
+            run_stats["not_due"] = sel["total"] - sel["due"]
+            run_stats["deferred"] = sel["deferred"]
+            wait = f"{(sel['next_due'] - time.time()) / 3600:.1f}h" if sel["next_due"] else "-"
+            logger.info(
+                f"RECRAWL | vencidas={sel['due']}/{sel['total']} (novas={sel['new']}) | "
+                f"orçamento={RECRAWL_FETCH_BUDGET or 'sem limite'} | coletando={sel['chosen']} | "
+                f"adiadas={sel['deferred']} | próxima em {wait}"
+            )
+
+        def fetch(u: str):
+            if normalize_url(u) in to_probe:
+                negative_cache.probe(u, to_probe[normalize_url(u)])
+            # ATS com dados estruturados (Gupy/Greenhouse/Workday): adapter primeiro
+            un = normalize_url(u)
+            adapter = get_adapter(detect_platform(un))
+            body = None
+            if adapter is not None and (offline or max_age is not None):
+                # corpo do ATS salvo no cache em disco (offline: qualquer idade)
+                body = get_cached_adapter_body(un, max_age=None if offline else max_age)
+            if adapter is not None and (body is not None or not offline):
+                try:
+                    structured = adapter(un, body=body, conditional=body is None and un in revalidate)
+                except (PageRemoved, NotModified):
+                    raise
+                except Exception as e:
+                    logger.warning(f"Adapter falhou ({type(e).__name__}: {e}); usando scraping.")
+                    structured = None
+                if structured:
+                    return {"text": structured["text"], "structured": structured["fields"], "from_cache": body is not None}
+            if max_age is not None and not offline:
+                # cópia recente do cache em disco: não é coleta, a agenda não muda
+                text = get_cached_page_text(u, max_age=max_age)
+                if text is not None:
+                    return {"text": text, "from_cache": True}
+            return get_page_text(
+                u,
+                conditional=not offline and un in revalidate,
+                offline=offline,
+            )
+
+        # Estágio 2 (limpeza/redução + decisão de pular a IA). Roda em thread
+        # própria, então não toca no SQLite: usa os hashes lidos antes do run.
+        def prepare(page):
+            url_norm = normalize_url(page["url"])
+            page_text = page["text"]
+            page["status_pre"] = detect_status_from_text(page_text)
+            page["pre"] = pre_extract(page_text) if PRE_EXTRACT_ENABLED else {}
+            # template do site (menu/cookies/rodapé) fora do prompt e do hash
+            content = page_text
+            if boilerplate is not None and not page.get("structured"):
+                domain = stats_domain(url_norm)
+                content, page["boilerplate_lines"] = boilerplate.strip(domain, page_text)
+                if url_norm not in known_hashes and url_norm not in cache:
+                    boilerplate.learn(domain, page_text)  # cada URL ensina uma vez
+            page["text_reduced"] = reduce_text(content, keywords)
+            if FINGERPRINT_ENABLED:
+                # hash sem tempo relativo/contadores/recomendações, por seção
+                fp = page["fingerprint"] = fingerprint(content)
+                page["text_hash"] = fp["hash"]
+            else:
+                page["text_hash"] = sha256_text(content)
+            if known_hashes.get(url_norm) == page["text_hash"]:
+                page["skip"] = "db"
+            elif FINGERPRINT_ENABLED and url_norm not in known_fps and known_hashes.get(url_norm) in (
+                sha256_text(content), sha256_text(page_text),
+            ):
+                # salvo antes da impressão digital (com ou sem template), mesmo texto: só troca o hash
+                page["skip"] = "db"
+            elif url_norm in cache and cache[url_norm].get("hash") == page["text_hash"]:
+                page["skip"] = "cache"
+            elif url_norm in known_fps:
+                page["changed_sections"] = changed_sections(known_fps[url_norm]["sections"], fp["sections"])
+                if not relevant_change(page["changed_sections"]):
+                    page["skip"] = "sections"
+            if not page.get("skip") and page.get("structured") and ADAPTERS_SKIP_LLM:
+                page["skip"] = "adapter"
+            if near_index is not None and not page.get("skip"):
+                page["near_sig"] = signature(page["text_reduced"])
+            return page
+
+        # Estágio 3 (IA): OLLAMA_NUM_PARALLEL workers; antes, o cache de extrações.
+        # Com LLM_BATCH_SIZE > 1 recebe lotes e junta vagas curtas numa chamada.
+        # Campos já resolvidos (regras com confiança alta / ATS) saem do pedido.
+        def fields_to_ask(page):
+            known = set(confident_fields(page["pre"]))
+            known |= {k for k, v in (page.get("structured") or {}).items() if v not in (None, "")}
+            # amostra com prompt completo, para medir a concordância regra x IA
+            if known and random.random() < PRE_EXTRACT_AUDIT_RATE:
+                page["pre_audit"] = True
+                return None
+            missing = [f for f in all_fields if f not in known]
+            return None if len(missing) == len(all_fields) else missing
+
+        def extract_batch(pages):
+            todo = []
+            for page in pages:
+                if page.get("skip"):
+                    continue
+                page["llm_fields"] = fields_to_ask(page)
+                if page["llm_fields"] == []:
+                    page["result"] = {}
+                    page["llm_rules_only"] = True
+                    continue
+                page["llm_key"] = None
+                if llm_cache is not None:
+                    page["llm_key"] = extraction_key(
+                        page["text_reduced"], prompt_template, llm_signature(page["llm_fields"])
+                    )
+                    cached = llm_cache.get(page["llm_key"])
+                    if cached is not None:
+                        page["result"] = cached
+                        page["llm_cached"] = True
+                        continue
+                # mesma vaga repostada (outro id/board): herda os campos do vizinho
+                if near_index is not None:
+                    hit = near_index.find(
+                        page.get("near_sig"), exclude_url=normalize_url(page["url"]), text=page["text"]
+                    )
+                    if hit is not None:
+                        page["result"] = hit["result"]
+                        page["near_dup"] = hit
+                        continue
+                todo.append(page)
+            if not todo:
+                return
+            t1 = time.time()
+            items = [
+                {"text": p["text_reduced"], "url": normalize_url(p["url"]), "fields": p["llm_fields"], "pre": p["pre"]}
+                for p in todo
+            ]
+            if cascade_stats is not None:
+                results = extract_cascade(prompt_template, items, cascade_stats)
+            else:
+                results = extract_many(prompt_template, items)
+            llm_ms = int((time.time() - t1) * 1000)
+            for page, result in zip(todo, results):
+                page["llm_ms"] = llm_ms
+                if isinstance(result, dict):
+                    # tamanho do lote é desta chamada, não da extração (fora do cache e do raw_json)
+                    page["llm_batch"] = result.pop("_batch", None)
+                if page["llm_key"] is not None and isinstance(result, dict) and not is_failed_result(result):
+                    llm_cache.put(page["llm_key"], result, result.get("_model") or model)
+                page["result"] = result
+
+        def extract(page):
+            extract_batch([page])
+            return page
+
+        stages = [
+            Stage("clean", prepare, workers=PIPELINE_CLEAN_WORKERS),
+            Stage("llm", extract_batch, workers=LLM_WORKERS, batch_size=LLM_BATCH_SIZE, batch_wait=LLM_BATCH_WAIT_S)
+            if LLM_BATCH_SIZE > 1 else
+            Stage("llm", extract, workers=LLM_WORKERS),
+        ]
+        logger.info(
+            f"PIPELINE | queue={PIPELINE_QUEUE_SIZE} | clean_workers={PIPELINE_CLEAN_WORKERS} | "
+            f"llm_workers={LLM_WORKERS} | llm_batch={LLM_BATCH_SIZE}"
+        )
+
+        # Coleta concorrente -> estágios -> persistência (aqui, thread principal).
+        # Páginas chegam na ordem em que terminam.
+        for i, page in enumerate(run_stages(iter_pages(urls_fetch, fetch=fetch), stages), start=1):
+            url = page["url"]
+            logger.info(f"\n[{i}/{len(urls_fetch)}] URL: {url}")
+            t_page = time.perf_counter()
+            run_stats["pages"] += 1
+            run_stats["fetch_ms"] += page.get("scrape_ms") or 0
+
+            fetch_failed = False
+            existing = None
+            outcome = None  # changed | same | removed | error (agenda de revisita)
             try:
                 url_norm = normalize_url(url)
                 platform = detect_platform(url_norm)
                 job_id = extract_job_id(url_norm)
+                existing = _lookup_existing(conn, platform, job_id)
+
+                # métricas das chamadas à IA desta vaga (tokens/tempos do servidor)
+                llm_rows = pop_llm_metrics(url_norm)
+                if llm_rows:
+                    save_llm_metrics(conn, run_id, url_norm, llm_rows, now_iso())
+
+                if isinstance(page["error"], NotModified):
+                    logger.info(f"HTTP 304 | sem mudanças desde a última coleta | scrape_ms={page['scrape_ms']}")
+                    run_stats["skipped"] += 1
+                    outcome = "same"
+                    # respondeu (304): sai do cache negativo como qualquer coleta OK
+                    if url_norm in failures:
+                        clear_url_failure(conn, url_norm)
+                        failures.pop(url_norm, None)
+                    if existing and existing.get("content_hash"):
+                        logger.info("  - Já existe no DB (304). Pulando IA.")
+                        touch_job(conn, platform, job_id, now_iso())
+                    else:
+                        logger.info("  - Cache local (304). Pulando IA.")
+                    continue
 
-                # Scrape
-                t0 = time.time()
-                page_text = get_page_text(url_norm)
-                scrape_ms = int((time.time() - t0) * 1000)
-                logger.info(f"Scrape OK | chars={len(page_text)} | scrape_ms={scrape_ms}")
-                # print(f"  - Texto coletado: {len(page_text)} chars")
-
-                status_pre = detect_status_from_text(page_text)
-                page_text_reduced = extract_relevant_sections(page_text, max_chars=9000)
-                # print(f"  - Texto reduzido p/ IA: {len(page_text_reduced)} chars | status_pre={status_pre}")
-                # print(
-                #     f"  - Texto: bruto={len(page_text)} | reduzido={len(page_text_reduced)} | "
-                #     f"delta={len(page_text_reduced)-len(page_text)} | status_pre={status_pre}"
-                # )
+                if page["text"] is None:
+                    fetch_failed = True
+                    raise page["error"]
+                page_text = page["text"]
+                scrape_ms = page["scrape_ms"]
+                fm = pop_fetch_metrics(url_norm)
+
+                if fm.get("blocked"):
+                    _record_failure(conn, failures, url_norm, platform, job_id, "blocked", f"HTTP {fm['blocked']}")
+                elif url_norm in failures:
+                    clear_url_failure(conn, url_norm)
+                    failures.pop(url_norm, None)
                 logger.info(
-                    f"Text reduce | bruto={len(page_text)} | reduzido={len(page_text_reduced)} | "
-                    f"delta={len(page_text_reduced)-len(page_text)} | status_pre={status_pre}"
+                    f"Scrape OK | chars={len(page_text)} | scrape_ms={scrape_ms} | "
+                    f"bytes={fm.get('bytes', 0)} | wire_bytes={fm.get('wire_bytes', 0)} | "
+                    f"truncado={bool(fm.get('truncated'))}"
                 )
 
+                # falha na limpeza ou na IA (não é problema da URL)
+                if page["error"] is not None:
+                    raise page["error"]
 
+                status_pre = page["status_pre"]
+                page_text_reduced = page["text_reduced"]
+                logger.info(
+                    f"Text reduce | bruto={len(page_text)} | reduzido={len(page_text_reduced)} | "
+                    f"delta={len(page_text_reduced)-len(page_text)} | status_pre={status_pre}"
+                    + (f" | template={page['boilerplate_lines']} linhas" if page.get("boilerplate_lines") else "")
+                )
 
-                text_hash = sha256_text(page_text)
+                text_hash = page["text_hash"]
 
                 # 1) dedupe/skip via DB (principal)
-                existing = None
-                if platform != "unknown" and job_id:
-                    existing = get_job_by_key(conn, platform, job_id)
-
-                if existing and existing.get("content_hash") == text_hash:
+                if page.get("skip") == "db":
                     logger.info("  - Já existe no DB com mesmo hash. Pulando IA.")
-                    # ainda atualiza "last_seen" via upsert mínimo
-                    rec = {
-                        "platform": platform,
-                        "job_id": job_id,
-                        "url": url,
-                        "url_norm": url_norm,
-                        "content_hash": text_hash,
-                        "last_seen": now_iso(),
-                        "created_at": now_iso(),  # ignorado no update
-                        "status": status_pre,
-                        "empresa": None, "cargo": None, "localidade": None,
-                        "tipo_trabalho": "desconhecido", "senioridade": "desconhecido",
-                        "salario": None, "link_candidatura": None, "data_publicacao": None,
-                        "score_0_100": 0, "motivo_curto": "Sem mudanças (hash igual).",
-                        "requisitos_json": _json_dump([]),
-                        "tecnologias_json": _json_dump([]),
-                        "raw_json": _json_dump({}),
-                    }
-                    upsert_job(conn, rec)
+                    # só atualiza last_seen/status (mantém campos extraídos)
+                    touch_job(conn, platform, job_id, now_iso(), status_pre, content_hash=text_hash)
+                    _commit_http_validators(conn, url_norm)
+                    _commit_fingerprint(conn, known_fps, url_norm, page)
+                    run_stats["skipped"] += 1
+                    outcome = "removed" if status_pre == "removida" else "same"
                     continue
 
                 # 2) cache auxiliar (URL norm + hash)
                 cache_key = url_norm
-                if cache_key in cache and cache[cache_key].get("hash") == text_hash:
+                if page.get("skip") == "cache":
                     logger.info("  - Cache local por hash igual. Pulando IA.")
+                    _commit_http_validators(conn, url_norm)
+                    _commit_fingerprint(conn, known_fps, url_norm, page)
+                    run_stats["skipped"] += 1
+                    outcome = "removed" if status_pre == "removida" else "same"
                     continue
 
-                # IA
-                t1 = time.time()
-                result = call_llm_extract_json(
-                    prompt_template=prompt_template,
-                    page_text=page_text_reduced,
-                    url=url_norm,
-                )
-                llm_ms = int((time.time() - t1) * 1000)
-                logger.info(f"LLM OK | llm_ms={llm_ms}")
+                # 3) só mudaram seções que não afetam os campos (ex.: "sobre a empresa")
+                changed = page.get("changed_sections")
+                if page.get("skip") == "sections":
+                    logger.info(
+                        f"  - Mudou só {', '.join(changed) or 'ruído (datas/contadores)'}. Pulando IA."
+                    )
+                    touch_job(conn, platform, job_id, now_iso(), status_pre, content_hash=text_hash)
+                    known_hashes[url_norm] = text_hash
+                    if cache_key in cache:
+                        cache[cache_key]["hash"] = text_hash
+                        save_cache(cache_path, cache)
+                    _commit_http_validators(conn, url_norm)
+                    _commit_fingerprint(conn, known_fps, url_norm, page, changed)
+                    run_stats["skipped"] += 1
+                    outcome = "removed" if status_pre == "removida" else "same"
+                    continue
+                if changed:
+                    logger.info(f"  - Conteúdo alterado | seções={', '.join(changed)}")
+
+                # IA (com adapter, só a descrição vai para o modelo)
+                structured = page.get("structured")
+                near_hit = page.get("near_dup")
+                indexable = False  # resultado da IA (direto, cache ou herdado) entra no índice de quase-duplicatas
+                if page.get("skip") == "adapter":
+                    logger.info(f"  - Adapter {platform}: campos estruturados, pulando IA.")
+                    result = {"motivo_curto": "Sem IA (dados estruturados do ATS)."}
+                elif page.get("llm_rules_only"):
+                    result = {}
+                    logger.info("  - Regras + ATS cobriram todos os campos. Pulando IA.")
+                elif page.get("llm_cached"):
+                    result = dict(page["result"])
+                    indexable = True
+                    logger.info("  - Cache de extração (mesmo texto/prompt/modelo). Pulando IA.")
+                elif near_hit:
+                    result = dict(page["result"])
+                    result["_near_dup"] = {
+                        "of": near_hit["url_norm"], "similarity": near_hit["similarity"], "cluster": near_hit["cluster_id"]
+                    }
+                    indexable = True
+                    logger.info(
+                        f"  - Quase-duplicata de {near_hit['url_norm']} (similaridade={near_hit['similarity']:.2f}, "
+                        f"cluster={near_hit['cluster_id']}). Pulando IA."
+                    )
+                else:
+                    result = page.get("result")
+                    batch_n = page.get("llm_batch")
+                    asked = page.get("llm_fields")
+                    tier_model = result.get("_model") if isinstance(result, dict) else None
+                    escalated = result.get("_escalated") if isinstance(result, dict) else None
+                    logger.info(
+                        f"LLM OK | llm_ms={page.get('llm_ms')}"
+                        + (f" | modelo={tier_model}" if tier_model else "")
+                        + (f" | escalou={','.join(escalated)}" if escalated else "")
+                        + (f" | lote={batch_n}" if batch_n else "")
+                        + (f" | campos={len(asked)}/{len(all_fields)}" if asked else "")
+                        + (" | auditoria" if page.get("pre_audit") else "")
+                    )
+                    if isinstance(result, dict) and not is_failed_result(result):
+                        agreement.record(page["pre"], result)
+                        indexable = True
 
                 if not isinstance(result, dict):
                     result = {}
 
-                # Normalização do resultado
+                # Normalização do resultado (regras, depois ATS, por cima da IA)
+                pre = page.get("pre") or {}
+                if pre:
+                    result = merge_pre(result, pre)
+                    result["_pre"] = {k: {"value": v["value"], "conf": v["conf"]} for k, v in pre.items()}
                 result = normalize_llm_result(result)
+                if structured:
+                    result.setdefault("cargo", None)
+                    result.setdefault("localidade", None)
+                    result = merge_structured(result, structured)
+                    result["_adapter"] = platform
                 result.setdefault("status", status_pre)
                 result["url"] = url_norm
                 result.setdefault("data_coleta", now_iso())
                 
                 result["_company_slug"] = extract_company_slug(url_norm)
+                if changed:
+                    result["_changed_sections"] = changed
 
                 # Validação mínima
                 if not basic_validate_result(result):
@@ -182,6 +616,12 @@ def main():
                     rec["job_id"] = url_norm
 
                 upsert_job(conn, rec)
+                _commit_http_validators(conn, url_norm)
+                if near_index is not None and indexable:
+                    near_index.add(url_norm, page.get("near_sig"), result, (near_hit or {}).get("cluster_id"))
+                known_hashes[url_norm] = text_hash
+                _commit_fingerprint(conn, known_fps, url_norm, page, changed)
+                outcome = "removed" if result.get("status") == "removida" else "changed"
 
                 # Atualiza cache auxiliar
                 cache[cache_key] = {"hash": text_hash, "last_run": now_iso(), "url_original": url}
@@ -191,15 +631,77 @@ def main():
                 logger.info(f"Run finalizado | total_ms={total_ms}")
 
             except Exception as e:
-                logger.exception(f"  - ERRO ao processar URL: {type(e).__name__}: {e}")
+                # só falhas da coleta vão para o cache negativo (timeout da IA não é culpa da URL)
+                klass = negative_cache.classify_failure(e) if fetch_failed else None
+                if klass:
+                    fails = _record_failure(conn, failures, url_norm, platform, job_id, klass, str(e))
+                    logger.warning(f"  - Falha persistente ({klass} x{fails}): {type(e).__name__}: {e}")
+                else:
+                    logger.exception(f"  - ERRO ao processar URL: {type(e).__name__}: {e}")
+                run_stats["errors"] += 1
+                outcome = "error"
+            finally:
+                # página servida do cache (--max-age) não foi coletada: "same" ali dobraria o intervalo à toa
+                if use_schedule and outcome is not None and not page.get("from_cache"):
+                    schedule_updates[url_norm] = schedule[url_norm] = schedule_entry(
+                        _schedule_prev(schedule, url_norm, existing), outcome
+                    )
+                run_stats["persist_ms"] += (time.perf_counter() - t_page) * 1000
 
     finally:
+        for stage in stages:
+            logger.info(f"PIPELINE stats | {stage.summary()}")
+            run_stats["stages"].append(
+                {"name": stage.name, "workers": stage.workers, "n": stage.count, "busy_s": stage.busy_s}
+            )
+        for line in agreement.summary_lines():
+            logger.info(f"PRE_EXTRACT regra x IA | {line}")
+        if cascade_stats is not None:
+            for line in cascade_stats.summary_lines():
+                logger.info(f"LLM_CASCADE | {line}")
+        for line in llm_pool.summary_lines():
+            logger.info(f"LLM_ENDPOINT | {line}")
+        _log_llm_metrics(logger, conn, run_id)
+        save_fetch_stats(conn, strategy_stats.rows(), now_iso())
+        if schedule_updates:
+            save_crawl_schedule(conn, schedule_updates)
+            by_outcome = {}
+            for e in schedule_updates.values():
+                by_outcome[e["last_outcome"]] = by_outcome.get(e["last_outcome"], 0) + 1
+            logger.info("RECRAWL | " + " | ".join(f"{k}={v}" for k, v in sorted(by_outcome.items())))
+        if boilerplate is not None:
+            save_boilerplate(conn, boilerplate.rows(), now_iso())
+            for line in boilerplate.summary_lines():
+                logger.info(f"BOILERPLATE | {line}")
+        logger.info("Coleta por domínio/estratégia:")
+        for line in strategy_stats.summary_lines():
+            logger.info(f"  {line}")
         conn.close()
+        page_cache.evict()
+        logger.info(f"PAGE_CACHE stats | {page_cache.stats()}")
+        page_cache.close()
+        set_page_cache(None)
+        if llm_cache is not None:
+            llm_cache.evict()
+            logger.info(f"LLM_CACHE stats | {llm_cache.stats()}")
+            llm_cache.close()
+        if near_index is not None:
+            logger.info(f"NEAR_DUP stats | {near_index.stats()}")
+            near_index.close()
 
     # Export (CSV + XLSX) direto do DB
     import export_db
     export_db.main()
 
+    run_stats["wall_s"] = time.time() - run_start
+    return run_stats
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Pipeline de coleta + extração de vagas")
+    parser.add_argument("--offline", action="store_true", help="usa só o cache de páginas (sem rede)")
+    parser.add_argument("--max-age", type=parse_duration, default=None,
+                        help="reaproveita páginas do cache mais novas que isso (ex.: 90, 30m, 6h, 2d)")
+    parser.add_argument("--all", action="store_true", help="ignora a agenda de revisita e coleta todas as URLs")
+    args = parser.parse_args()
+    main(offline=args.offline, max_age=args.max_age, revisit_all=args.all)
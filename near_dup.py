@@ -0,0 +1,262 @@
+"""
+Quase-duplicatas: a mesma vaga repostada com outro id, subdomínio ou board.
+
+O sha256 do texto só pega cópias idênticas. Aqui cada vaga ganha uma
+assinatura MinHash (64 mínimos dos trigramas de palavras do texto reduzido);
+a fração de mínimos iguais entre duas assinaturas estima a similaridade de
+Jaccard dos textos.
+
+- assinatura em uma passada: cada trigrama vira um hash de 64 bits, os 6 bits
+  de cima escolhem a posição (0..63) e fica o menor valor por posição
+  (one-permutation hashing; posição vazia copia a próxima preenchida)
+- índice LSH em cache/jobs.db: 8 faixas de 8 mínimos, cada faixa vira uma
+  chave (tabela near_dup_bands, indexada). Vagas com Jaccard >= ~0.85 batem
+  em ao menos uma faixa com probabilidade > 90%; textos diferentes quase
+  nunca. A busca são 8 lookups por índice + comparação só dos candidatos
+  (sub-milissegundo com centenas de milhares de vagas)
+- vaga nova com similaridade >= NEAR_DUP_MIN_SIMILARITY com uma já extraída
+  herda os campos dela (sem IA) e entra no mesmo cluster (cluster_id)
+- trava contra template repetido (mesmo texto, outra empresa/cargo): os
+  campos de NEAR_DUP_CHECK_FIELDS do vizinho precisam aparecer no texto novo
+- textos curtos (< NEAR_DUP_MIN_WORDS palavras) ficam de fora: pouca
+  informação, muito falso positivo
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import re
+import json
+import time
+import array
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from db import DB_PATH, connect
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "1") == "1"
+NEAR_DUP_MIN_SIMILARITY = float(os.getenv("NEAR_DUP_MIN_SIMILARITY", "0.85"))
+NEAR_DUP_MIN_WORDS = int(os.getenv("NEAR_DUP_MIN_WORDS", "60"))
+NEAR_DUP_CHECK_FIELDS = [f.strip() for f in os.getenv("NEAR_DUP_CHECK_FIELDS", "cargo,empresa").split(",") if f.strip()]
+
+_WORD_RE = re.compile(r"\w+")
+_PERMS = 64
+_BANDS = 8
+_ROWS = _PERMS // _BANDS
+_MAX_CANDIDATES = 256  # faixa muito cheia = texto genérico; não vale comparar tudo
+
+# campos da própria URL/coleta: não passam para a duplicata (link e data
+# de publicação são de cada board; vêm das regras ou do ATS da página nova)
+_NOT_INHERITED = {
+    "url", "data_coleta", "status", "link_candidatura", "data_publicacao",
+    "_company_slug", "_pre", "_adapter", "_batch", "_near_dup", "_changed_sections",
+}
+
+Signature = List[int]
+
+
+def _h64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def signature(text: str, min_words: Optional[int] = None) -> Optional[Signature]:
+    """64 mínimos (32 bits) dos trigramas de palavras; None se o texto for curto."""
+    min_words = NEAR_DUP_MIN_WORDS if min_words is None else min_words
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < max(3, min_words):
+        return None
+    mins = [None] * _PERMS
+    for i in range(len(words) - 2):
+        h = _h64(f"{words[i]} {words[i + 1]} {words[i + 2]}")
+        b, v = h >> 58, h & 0xFFFFFFFF
+        if mins[b] is None or v < mins[b]:
+            mins[b] = v
+    # posição vazia: copia a próxima preenchida (circular), deslocada pela distância
+    out = list(mins)
+    for b in range(_PERMS):
+        if out[b] is None:
+            for step in range(1, _PERMS):
+                v = mins[(b + step) % _PERMS]
+                if v is not None:
+                    out[b] = (v + step * 0x9E3779B1) & 0xFFFFFFFF
+                    break
+    return out
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Jaccard estimado (fração de mínimos iguais)."""
+    return sum(1 for x, y in zip(a, b) if x == y) / _PERMS
+
+
+def band_keys(sig: Signature) -> List[int]:
+    """Uma chave (inteiro de 64 bits com sinal, como o SQLite guarda) por faixa."""
+    keys = []
+    for i in range(_BANDS):
+        h = hashlib.blake2b(digest_size=8)
+        h.update(bytes([i]))
+        h.update(array.array("I", sig[i * _ROWS:(i + 1) * _ROWS]).tobytes())
+        keys.append(int.from_bytes(h.digest(), "big", signed=True))
+    return keys
+
+
+def _pack(sig: Signature) -> bytes:
+    return array.array("I", sig).tobytes()
+
+
+def _unpack(blob: bytes) -> Signature:
+    return array.array("I", blob).tolist()
+
+
+def inheritable(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos extraídos que valem para qualquer cópia da vaga."""
+    return {k: v for k, v in result.items() if k not in _NOT_INHERITED}
+
+
+def _words(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def consistent(result: Dict[str, Any], text: str, fields: Optional[List[str]] = None) -> bool:
+    """Os campos-chave do vizinho (cargo, empresa) aparecem no texto da vaga nova?"""
+    low = None
+    for k in NEAR_DUP_CHECK_FIELDS if fields is None else fields:
+        v = result.get(k)
+        if not isinstance(v, str) or v.strip() in ("", "desconhecido"):
+            continue
+        low = _words(text) if low is None else low
+        if _words(v) not in low:
+            return False
+    return True
+
+
+class NearDupIndex:
+    """
+    Uso (thread-safe: busca nos workers da IA, inclusão na thread principal):
+        idx = NearDupIndex()
+        sig = signature(texto_reduzido)
+        hit = idx.find(sig, exclude_url=url_norm, text=texto)   # dict | None
+        idx.add(url_norm, sig, result, cluster_id=hit and hit["cluster_id"])
+    """
+    def __init__(self, db_path: str = DB_PATH, min_similarity: Optional[float] = None):
+        self.min_similarity = NEAR_DUP_MIN_SIMILARITY if min_similarity is None else float(min_similarity)
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0  # vizinhos descartados por consistent()
+        self.lookup_s = 0.0
+        self._lock = threading.Lock()
+        self._conn = connect(db_path, check_same_thread=False)
+
+    def find(
+        self,
+        sig: Optional[Signature],
+        exclude_url: Optional[str] = None,
+        text: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Vizinho mais parecido com similaridade >= min_similarity:
+        {"id","url_norm","cluster_id","similarity","result"}.
+        Com `text`, pula vizinhos cujos campos-chave não aparecem nele (consistent).
+        """
+        if sig is None:
+            return None
+        t0 = time.perf_counter()
+        keys = band_keys(sig)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT d.id, d.url_norm, d.sig, d.cluster_id FROM near_dup d
+                WHERE d.id IN (
+                    SELECT dup_id FROM near_dup_bands WHERE key IN ({",".join("?" * len(keys))})
+                    LIMIT {_MAX_CANDIDATES}
+                )
+                """,
+                keys,
+            ).fetchall()
+            near = []
+            for rid, url_norm, blob, cluster_id in rows:
+                if url_norm == exclude_url:
+                    continue
+                sim = similarity(sig, _unpack(blob))
+                if sim >= self.min_similarity:
+                    near.append((-sim, rid, url_norm, cluster_id))
+            hit = None
+            for neg_sim, rid, url_norm, cluster_id in sorted(near):
+                row = self._conn.execute("SELECT result_json FROM near_dup WHERE id=?", (rid,)).fetchone()
+                result = inheritable(json.loads(row[0]))  # linhas gravadas antes de _NOT_INHERITED mudar
+                if text is not None and not consistent(result, text):
+                    self.rejected += 1
+                    continue
+                hit = {
+                    "id": rid,
+                    "url_norm": url_norm,
+                    "cluster_id": cluster_id,
+                    "similarity": round(-neg_sim, 3),
+                    "result": result,
+                }
+                break
+            self.lookup_s += time.perf_counter() - t0
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return hit
+
+    def add(
+        self,
+        url_norm: str,
+        sig: Optional[Signature],
+        result: Dict[str, Any],
+        cluster_id: Optional[int] = None,
+    ) -> None:
+        """Inclui/atualiza a vaga; sem cluster_id, ela abre um cluster novo (o próprio id)."""
+        if sig is None:
+            return
+        with self._lock:
+            rid, cid = self._conn.execute(
+                """
+                INSERT INTO near_dup (url_norm, sig, cluster_id, result_json, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url_norm) DO UPDATE SET
+                    sig=excluded.sig,
+                    cluster_id=COALESCE(excluded.cluster_id, near_dup.cluster_id),
+                    result_json=excluded.result_json
+                RETURNING id, cluster_id
+                """,
+                (url_norm, _pack(sig), cluster_id, json.dumps(inheritable(result), ensure_ascii=False), time.time()),
+            ).fetchone()
+            if cid is None:
+                self._conn.execute("UPDATE near_dup SET cluster_id=? WHERE id=?", (rid, rid))
+            self._conn.execute("DELETE FROM near_dup_bands WHERE dup_id=?", (rid,))
+            self._conn.executemany(
+                "INSERT INTO near_dup_bands (key, dup_id) VALUES (?, ?)",
+                [(k, rid) for k in band_keys(sig)],
+            )
+            self._conn.commit()
+
+    def cluster_of(self, url_norm: str) -> List[str]:
+        """URLs do mesmo cluster (a própria inclusa); [] se a URL não está no índice."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url_norm FROM near_dup WHERE cluster_id=(SELECT cluster_id FROM near_dup WHERE url_norm=?) "
+                "ORDER BY id",
+                (url_norm,),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n, clusters = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT cluster_id) FROM near_dup").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": n,
+            "clusters": clusters,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "avg_lookup_ms": round(self.lookup_s * 1000 / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,89 @@
+"""
+Cache negativo de URLs com falha persistente.
+
+Classes de falha (cada uma com TTL próprio):
+- gone:    404/410 (vaga removida)
+- dns:     host não resolve (ex.: domínio digitado errado)
+- blocked: 401/403 em todas as estratégias
+- timeout: timeout de conexão/leitura
+
+Enquanto o TTL não vence, a URL nem entra na coleta. Vencido o TTL, ela é
+testada com uma única requisição barata (DNS ou HEAD, sem retry); só volta
+ao pipeline completo se o teste passar. O TTL cresce a cada falha repetida.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import socket
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+
+from scraper import PageRemoved, Blocked, is_dns_error, probe_status
+
+NEG_TTL_HOURS = {
+    "gone": float(os.getenv("NEG_TTL_GONE_HOURS", "720")),
+    "dns": float(os.getenv("NEG_TTL_DNS_HOURS", "168")),
+    "blocked": float(os.getenv("NEG_TTL_BLOCKED_HOURS", "24")),
+    "timeout": float(os.getenv("NEG_TTL_TIMEOUT_HOURS", "6")),
+}
+# falhas repetidas multiplicam o TTL (1x, 2x, 4x...) até este teto
+NEG_MAX_BACKOFF = int(os.getenv("NEG_MAX_BACKOFF", "8"))
+
+# classes que significam "a vaga não existe mais" -> jobs.status = removida
+REMOVED_CLASSES = ("gone", "dns")
+
+
+class StillFailing(RuntimeError):
+    """Teste barato de uma URL do cache negativo falhou de novo."""
+    def __init__(self, klass: str, detail: str):
+        super().__init__(f"{klass}: {detail}")
+        self.klass = klass
+        self.detail = detail
+
+
+def classify_failure(exc: BaseException) -> Optional[str]:
+    """Classe de falha persistente, ou None se o erro não deve ir para o cache."""
+    if isinstance(exc, StillFailing):
+        return exc.klass
+    if isinstance(exc, PageRemoved):
+        return "gone"
+    if isinstance(exc, Blocked):
+        return "blocked"
+    if is_dns_error(exc):
+        return "dns"
+    if isinstance(exc, requests.exceptions.Timeout):
+        return "timeout"
+    return None
+
+
+def next_probe_at(klass: str, fails: int, now: Optional[float] = None) -> float:
+    now = time.time() if now is None else now
+    factor = min(2 ** max(fails - 1, 0), NEG_MAX_BACKOFF)
+    return now + NEG_TTL_HOURS.get(klass, 6.0) * 3600 * factor
+
+
+def probe(url: str, klass: str) -> None:
+    """Uma checagem barata; levanta StillFailing se a URL continua com problema."""
+    host = urlparse(url).hostname or ""
+    try:
+        socket.getaddrinfo(host, None)
+    except socket.gaierror as e:
+        raise StillFailing("dns", f"host não resolve ({e})")
+    if klass == "dns":
+        # voltou a resolver: o pipeline completo decide o resto
+        return
+
+    try:
+        status = probe_status(url)
+    except requests.exceptions.Timeout:
+        raise StillFailing("timeout", "timeout no teste")
+    except requests.exceptions.RequestException as e:
+        raise StillFailing(klass, f"{type(e).__name__}: {e}")
+    if status in (404, 410):
+        raise StillFailing("gone", f"HTTP {status}")
+    if status in (401, 403) and klass == "blocked":
+        raise StillFailing("blocked", f"HTTP {status}")
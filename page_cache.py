@@ -0,0 +1,208 @@
+"""
+Cache em disco das páginas coletadas (HTML bruto + texto extraído).
+
+- corpo comprimido com zlib em cache/pages/<sha[:2]>/<sha>.zz
+  (endereçado por conteúdo: páginas iguais ocupam espaço uma vez)
+- índice em cache/jobs.db (tabelas page_cache / page_blobs)
+- chave = URL normalizada + estratégia de coleta ("jina", "direct" ou
+  "adapter": corpo JSON/HTML lido pelos adapters de ATS)
+- TTL por entrada + limite total em bytes com despejo LRU
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import time
+import zlib
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from db import DB_PATH, connect
+from utils import normalize_url
+
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "cache/pages")
+PAGE_CACHE_MAX_MB = float(os.getenv("PAGE_CACHE_MAX_MB", "500"))
+PAGE_CACHE_TTL_HOURS = float(os.getenv("PAGE_CACHE_TTL_HOURS", "168"))
+
+def _sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(url: str, strategy: str) -> str:
+    return _sha256_bytes(f"{normalize_url(url)}|{strategy}".encode("utf-8"))
+
+
+class PageCache:
+    """
+    Uso (thread-safe, compartilhado pelas threads de coleta):
+        pc = PageCache()
+        pc.put(url, "direct", raw=html, text=texto)
+        hit = pc.get(url, max_age=3600)  # {"strategy","raw","text","fetched_at"} | None
+    """
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        root: str = PAGE_CACHE_DIR,
+        max_bytes: Optional[int] = None,
+        ttl_s: Optional[float] = None,
+    ):
+        self.root = root
+        self.max_bytes = int(max_bytes if max_bytes is not None else PAGE_CACHE_MAX_MB * 1024 * 1024)
+        self.ttl_s = float(ttl_s if ttl_s is not None else PAGE_CACHE_TTL_HOURS * 3600)
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = connect(db_path, check_same_thread=False)
+        row = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM page_blobs").fetchone()
+        self._total = int(row[0])
+
+    # ---------- blobs ----------
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], sha + ".zz")
+
+    def _write_blob(self, text: str) -> str:
+        data = text.encode("utf-8", errors="ignore")
+        sha = _sha256_bytes(data)
+        if self._conn.execute("SELECT 1 FROM page_blobs WHERE sha=?", (sha,)).fetchone():
+            return sha
+        path = self._blob_path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        comp = zlib.compress(data, 6)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(comp)
+        os.replace(tmp, path)
+        self._conn.execute("INSERT INTO page_blobs (sha, size_bytes) VALUES (?, ?)", (sha, len(comp)))
+        self._total += len(comp)
+        return sha
+
+    def _read_blob(self, sha: str) -> Optional[str]:
+        try:
+            with open(self._blob_path(sha), "rb") as f:
+                return zlib.decompress(f.read()).decode("utf-8")
+        except (OSError, zlib.error):
+            return None
+
+    def _drop_orphan_blobs(self, shas) -> None:
+        for sha in set(shas):
+            used = self._conn.execute(
+                "SELECT 1 FROM page_cache WHERE raw_sha=? OR text_sha=? LIMIT 1", (sha, sha)
+            ).fetchone()
+            if used:
+                continue
+            row = self._conn.execute("SELECT size_bytes FROM page_blobs WHERE sha=?", (sha,)).fetchone()
+            self._conn.execute("DELETE FROM page_blobs WHERE sha=?", (sha,))
+            if row:
+                self._total -= int(row[0])
+            try:
+                os.remove(self._blob_path(sha))
+            except OSError:
+                pass
+
+    # ---------- API ----------
+    def put(self, url: str, strategy: str, raw: str, text: str, ttl_s: Optional[float] = None) -> None:
+        now = time.time()
+        ttl = self.ttl_s if ttl_s is None else float(ttl_s)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT raw_sha, text_sha FROM page_cache WHERE key=?", (cache_key(url, strategy),)
+            ).fetchone()
+            raw_sha = self._write_blob(raw)
+            text_sha = raw_sha if text == raw else self._write_blob(text)
+            self._conn.execute(
+                """
+                INSERT INTO page_cache (key, url_norm, strategy, raw_sha, text_sha, fetched_at, last_access, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    raw_sha=excluded.raw_sha,
+                    text_sha=excluded.text_sha,
+                    fetched_at=excluded.fetched_at,
+                    last_access=excluded.last_access,
+                    expires_at=excluded.expires_at
+                """,
+                (cache_key(url, strategy), normalize_url(url), strategy, raw_sha, text_sha, now, now, now + ttl),
+            )
+            if old:
+                self._drop_orphan_blobs(old)
+            self._conn.commit()
+            if self._total > self.max_bytes:
+                self._evict_locked()
+
+    def get(
+        self,
+        url: str,
+        max_age: Optional[float] = None,
+        strategies: Optional[Iterable[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Entrada mais recente da URL (qualquer estratégia, ou só as de `strategies`).
+        max_age=None ignora TTL/idade (modo offline); senão exige fetched_at >= agora - max_age.
+        """
+        now = time.time()
+        allowed = None if strategies is None else set(strategies)
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT key, strategy, raw_sha, text_sha, fetched_at FROM page_cache
+                WHERE url_norm=? ORDER BY fetched_at DESC
+                """,
+                (normalize_url(url),),
+            ).fetchall()
+            for key, strategy, raw_sha, text_sha, fetched_at in rows:
+                if allowed is not None and strategy not in allowed:
+                    continue
+                if max_age is not None and fetched_at < now - max_age:
+                    continue
+                raw = self._read_blob(raw_sha)
+                text = raw if text_sha == raw_sha else self._read_blob(text_sha)
+                if raw is None or text is None:
+                    continue
+                self._conn.execute("UPDATE page_cache SET last_access=? WHERE key=?", (now, key))
+                self._conn.commit()
+                return {"strategy": strategy, "raw": raw, "text": text, "fetched_at": fetched_at}
+        return None
+
+    def iter_entries(self, strategy: Optional[str] = None):
+        """Itera {"url_norm","strategy","raw","text","fetched_at"} (corpus p/ benchmarks)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url_norm, strategy, raw_sha, text_sha, fetched_at FROM page_cache ORDER BY url_norm"
+            ).fetchall()
+        for url_norm, strat, raw_sha, text_sha, fetched_at in rows:
+            if strategy and strat != strategy:
+                continue
+            raw = self._read_blob(raw_sha)
+            text = raw if text_sha == raw_sha else self._read_blob(text_sha)
+            if raw is None or text is None:
+                continue
+            yield {"url_norm": url_norm, "strategy": strat, "raw": raw, "text": text, "fetched_at": fetched_at}
+
+    def _evict_locked(self) -> int:
+        now = time.time()
+        removed = 0
+        rows = self._conn.execute(
+            "SELECT key, raw_sha, text_sha, expires_at FROM page_cache ORDER BY last_access ASC"
+        ).fetchall()
+        for key, raw_sha, text_sha, expires_at in rows:
+            # expirados saem sempre; os demais só enquanto estourar o limite (LRU)
+            if expires_at >= now and self._total <= self.max_bytes:
+                continue
+            self._conn.execute("DELETE FROM page_cache WHERE key=?", (key,))
+            self._drop_orphan_blobs((raw_sha, text_sha))
+            removed += 1
+        self._conn.commit()
+        return removed
+
+    def evict(self) -> int:
+        """Remove expirados e, se preciso, os menos usados até caber em max_bytes."""
+        with self._lock:
+            return self._evict_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self._conn.execute("SELECT COUNT(*) FROM page_cache").fetchone()[0]
+        return {"entries": n, "bytes": self._total, "max_bytes": self.max_bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
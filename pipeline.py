@@ -0,0 +1,213 @@
+"""
+Execução em estágios ligados por filas limitadas.
+
+    coleta (fetch_engine.iter_pages) -> limpeza/redução -> IA -> persistência
+
+Cada estágio tem seu próprio número de workers (threads) e conversa com o
+próximo por uma queue.Queue(maxsize=PIPELINE_QUEUE_SIZE). Fila cheia bloqueia
+quem produz (backpressure), então a memória fica limitada a
+filas * PIPELINE_QUEUE_SIZE + itens em processamento, e a coleta continua
+enquanto a IA trabalha (e vice-versa).
+
+A persistência fica com quem consome run_stages (thread principal), então o
+SQLite continua com um único escritor.
+
+O estágio da IA deve ter o mesmo paralelismo dos servidores
+(OLLAMA_NUM_PARALLEL por endpoint em LLM_ENDPOINTS): mais workers que isso só
+enfileiram no Ollama.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from llm_provider import LLM_ENDPOINTS
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+PIPELINE_CLEAN_WORKERS = int(os.getenv("PIPELINE_CLEAN_WORKERS", "1"))
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", str(OLLAMA_NUM_PARALLEL * len(LLM_ENDPOINTS))))
+
+_DONE = object()
+_POLL_S = 0.2
+
+Item = Dict[str, Any]
+
+
+class Stage:
+    """
+    Um estágio: `fn(item)` altera/devolve o item (dict).
+
+    Itens que já vêm com "error" passam direto (não chamam `fn`); exceção em
+    `fn` vai para item["error"] e o item segue até o consumidor, como em
+    fetch_engine.iter_pages.
+
+    Com batch_size > 1, `fn` recebe uma lista de até batch_size itens (o
+    worker espera no máximo batch_wait segundos para completar o lote) e
+    altera os itens no lugar; exceção marca o lote inteiro.
+    """
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        batch_size: int = 1,
+        batch_wait: float = 0.0,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = max(0.0, float(batch_wait))
+        self.count = 0
+        self.busy_s = 0.0
+        self._lock = threading.Lock()
+
+    def _record(self, seconds: float, n: int = 1) -> None:
+        with self._lock:
+            self.count += n
+            self.busy_s += seconds
+
+    def summary(self) -> str:
+        avg_ms = self.busy_s / self.count * 1000 if self.count else 0.0
+        return f"{self.name}: workers={self.workers} n={self.count} busy={self.busy_s:.1f}s avg_ms={avg_ms:.0f}"
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_S)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL_S)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def run_stages(
+    source: Iterable[Item],
+    stages: Sequence[Stage],
+    queue_size: Optional[int] = None,
+) -> Iterator[Item]:
+    """
+    Passa os itens de `source` pelos estágios e gera o resultado final assim
+    que cada item fica pronto (ordem de conclusão, não de entrada).
+
+    `source` é consumido numa thread própria; se for um gerador preguiçoso
+    (iter_pages), a fila cheia também segura a coleta.
+    """
+    queue_size = max(1, queue_size or PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    qs: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    source_errors: List[BaseException] = []
+
+    def feed():
+        try:
+            for item in source:
+                if not _put(qs[0], item, stop):
+                    return
+        except Exception as e:
+            source_errors.append(e)
+        _put(qs[0], _DONE, stop)
+
+    def finish(inq: queue.Queue, outq: queue.Queue, remaining: List[int], lock: threading.Lock):
+        # devolve o sinal para os outros workers; o último avisa o próximo estágio
+        _put(inq, _DONE, stop)
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            _put(outq, _DONE, stop)
+
+    def collect(stage: Stage, first: Item, inq: queue.Queue, outq: queue.Queue) -> Tuple[List[Item], bool]:
+        """Completa o lote a partir de `first`. Devolve (lote, acabou_a_entrada)."""
+        batch = [first]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(batch) < stage.batch_size and not stop.is_set():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                item = inq.get(timeout=min(left, _POLL_S))
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return batch, True
+            if item.get("error") is not None:
+                _put(outq, item, stop)
+                continue
+            batch.append(item)
+        return batch, False
+
+    def work(stage: Stage, inq: queue.Queue, outq: queue.Queue, remaining: List[int], lock: threading.Lock):
+        while True:
+            item = _get(inq, stop)
+            if item is _DONE:
+                finish(inq, outq, remaining, lock)
+                return
+            if item.get("error") is not None:
+                if not _put(outq, item, stop):
+                    return
+                continue
+
+            ended = False
+            if stage.batch_size > 1:
+                batch, ended = collect(stage, item, inq, outq)
+            else:
+                batch = [item]
+            t0 = time.perf_counter()
+            try:
+                if stage.batch_size > 1:
+                    stage.fn(batch)
+                else:
+                    out = stage.fn(item)
+                    if out is not None:
+                        batch = [out]
+            except Exception as e:
+                for it in batch:
+                    it["error"] = e
+                    it["error_stage"] = stage.name
+            stage._record(time.perf_counter() - t0, len(batch))
+            for it in batch:
+                if not _put(outq, it, stop):
+                    return
+            if ended:
+                finish(inq, outq, remaining, lock)
+                return
+
+    threads = [threading.Thread(target=feed, name="pipeline-source", daemon=True)]
+    for i, stage in enumerate(stages):
+        remaining, lock = [stage.workers], threading.Lock()
+        for w in range(stage.workers):
+            threads.append(threading.Thread(
+                target=work,
+                args=(stage, qs[i], qs[i + 1], remaining, lock),
+                name=f"pipeline-{stage.name}-{w}",
+                daemon=True,
+            ))
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            item = qs[-1].get()
+            if item is _DONE:
+                break
+            yield item
+        if source_errors:
+            raise source_errors[0]
+    finally:
+        # consumidor saiu (fim, erro ou break): libera quem estiver bloqueado
+        stop.set()
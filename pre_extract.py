@@ -0,0 +1,278 @@
+"""
+Pré-extração por regras/regex (sem IA).
+
+Campos que costumam vir escritos literalmente no texto da vaga:
+tipo_trabalho, senioridade, salario, link_candidatura, data_publicacao.
+
+Cada regra devolve {"value", "conf" (0..1), "evidence"}. Campos com
+conf >= PRE_EXTRACT_MIN_CONF saem do pedido à IA (ela só responde o que
+falta); abaixo disso, o valor da regra só entra se a IA não trouxer nada.
+
+AgreementStats compara regra x IA por campo (PRE_EXTRACT_AUDIT_RATE manda
+uma amostra das vagas com o prompt completo para isso) e vai para o log do
+run, para calibrar as regras.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+PRE_EXTRACT_ENABLED = os.getenv("PRE_EXTRACT_ENABLED", "1") == "1"
+PRE_EXTRACT_MIN_CONF = float(os.getenv("PRE_EXTRACT_MIN_CONF", "0.85"))
+PRE_EXTRACT_AUDIT_RATE = float(os.getenv("PRE_EXTRACT_AUDIT_RATE", "0.1"))
+
+Field = Dict[str, Any]
+
+# linhas do topo (título/cabeçalho) pesam mais para senioridade
+_HEAD_LINES = 8
+
+
+def _fold(text: str) -> str:
+    """minúsculas e sem acento (híbrido -> hibrido)."""
+    t = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in t if not unicodedata.combining(c))
+
+
+def _field(value: Any, conf: float, evidence: str) -> Field:
+    return {"value": value, "conf": round(conf, 2), "evidence": evidence.strip()[:160]}
+
+
+# ---------- tipo_trabalho ----------
+_WORK_TERMS = {
+    "remoto": r"\b(?:100% )?remot[oa]\b|\bremote\b|\bhome[ -]?office\b|\banywhere\b|\bteletrabalho\b",
+    "hibrido": r"\bhibrid[oa]\b|\bhybrid\b",
+    "presencial": r"\bpresencial\b|\bon[- ]?site\b|\bin[- ]office\b",
+}
+_WORK_RES = {k: re.compile(v) for k, v in _WORK_TERMS.items()}
+_WORK_LABEL_RE = re.compile(
+    r"\b(?:modelo|tipo|regime|formato|modalidade|local) de (?:trabalho|contratacao|atuacao)\b|\bworkplace\b|\bwork model\b"
+)
+
+
+def _tipo_trabalho(lines: List[str]) -> Optional[Field]:
+    labelled: Dict[str, str] = {}
+    seen: Dict[str, str] = {}
+    for ln in lines:
+        f = _fold(ln)
+        for kind, rx in _WORK_RES.items():
+            if rx.search(f):
+                seen.setdefault(kind, ln)
+                if _WORK_LABEL_RE.search(f):
+                    labelled.setdefault(kind, ln)
+    if len(labelled) == 1:
+        kind = next(iter(labelled))
+        return _field(kind, 0.95, labelled[kind])
+    if len(seen) == 1:
+        kind = next(iter(seen))
+        return _field(kind, 0.75, seen[kind])
+    if seen:
+        # mais de um modelo citado ("não é remoto", "híbrido após 3 meses"...)
+        kind = "hibrido" if "hibrido" in seen else next(iter(seen))
+        return _field(kind, 0.4, seen[kind])
+    return None
+
+
+# ---------- senioridade ----------
+_LEVEL_TERMS = {
+    "estagio": r"\bestagi(?:o|ario|aria)\b|\bintern(?:ship)?\b",
+    "junior": r"\bjunior\b|\bjr\b\.?",
+    "pleno": r"\bpleno\b|\bmid[- ]level\b",
+    "senior": r"\bsenior\b|\bsr\b\.?",
+}
+_LEVEL_RES = {k: re.compile(v) for k, v in _LEVEL_TERMS.items()}
+_LEVEL_LABEL_RE = re.compile(r"\b(?:senioridade|nivel|nível|level|seniority)\b\s*[:\-]")
+
+
+def _senioridade(lines: List[str]) -> Optional[Field]:
+    for ln in lines:
+        f = _fold(ln)
+        if _LEVEL_LABEL_RE.search(f):
+            kinds = [k for k, rx in _LEVEL_RES.items() if rx.search(f)]
+            if len(kinds) == 1:
+                return _field(kinds[0], 0.95, ln)
+
+    head = [k for ln in lines[:_HEAD_LINES] for k, rx in _LEVEL_RES.items() if rx.search(_fold(ln))]
+    if head and len(set(head)) == 1:
+        return _field(head[0], 0.9, next(ln for ln in lines[:_HEAD_LINES] if _LEVEL_RES[head[0]].search(_fold(ln))))
+
+    body: Dict[str, str] = {}
+    for ln in lines[_HEAD_LINES:]:
+        f = _fold(ln)
+        for k, rx in _LEVEL_RES.items():
+            if rx.search(f):
+                body.setdefault(k, ln)
+    if len(body) == 1:
+        k = next(iter(body))
+        return _field(k, 0.5, body[k])
+    return None
+
+
+# ---------- salario ----------
+_MONEY = r"R\$\s?\d{1,3}(?:\.\d{3})*(?:,\d{2})?(?:\s?(?:mil|k))?"
+_SALARY_RE = re.compile(rf"{_MONEY}(?:\s*(?:a|até|ate|-|–|~)\s*(?:{_MONEY}|\d{{1,3}}(?:\.\d{{3}})*(?:,\d{{2}})?))?", re.IGNORECASE)
+_SALARY_LABEL_RE = re.compile(r"\b(?:salario|remuneracao|faixa salarial|salary|compensation|bolsa)\b")
+
+
+def _salario(lines: List[str]) -> Optional[Field]:
+    loose = None
+    for i, ln in enumerate(lines):
+        m = _SALARY_RE.search(ln)
+        if not m:
+            continue
+        # rótulo na mesma linha ou na anterior ("Salário:\nR$ 5.000")
+        ctx = _fold(ln) + " " + (_fold(lines[i - 1]) if i else "")
+        if _SALARY_LABEL_RE.search(ctx):
+            return _field(m.group(0).strip(), 0.9, ln)
+        if loose is None:
+            loose = _field(m.group(0).strip(), 0.6, ln)
+    return loose
+
+
+# ---------- link_candidatura ----------
+_MD_LINK_RE = re.compile(r"\[([^\]]{1,80})\]\((https?://[^)\s]+)\)")
+_URL_RE = re.compile(r"https?://[^\s)\]>\"']+")
+_APPLY_RE = re.compile(r"candidat|inscrev|inscricao|apply|aplicar")
+
+
+def _link_candidatura(lines: List[str]) -> Optional[Field]:
+    loose = None
+    for ln in lines:
+        f = _fold(ln)
+        for label, url in _MD_LINK_RE.findall(ln):
+            if _APPLY_RE.search(_fold(label)):
+                return _field(url, 0.9, ln)
+        if loose is None and _APPLY_RE.search(f):
+            m = _URL_RE.search(ln)
+            if m:
+                loose = _field(m.group(0).rstrip(".,;"), 0.7, ln)
+    return loose
+
+
+# ---------- data_publicacao ----------
+_MONTHS = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+_DATE_LABEL_RE = re.compile(r"\b(?:publicad[oa]|postad[oa]|data de publicacao|published|posted)\b")
+_DATE_NUM_RE = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+_DATE_ISO_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_DATE_TXT_RE = re.compile(r"\b(\d{1,2}) de (" + "|".join(_MONTHS) + r") de (\d{4})\b")
+
+
+def _iso_date(f: str) -> Optional[str]:
+    m = _DATE_ISO_RE.search(f)
+    if m:
+        y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    else:
+        m = _DATE_NUM_RE.search(f)
+        if m:
+            d, mo, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        else:
+            m = _DATE_TXT_RE.search(f)
+            if not m:
+                return None
+            d, mo, y = int(m.group(1)), _MONTHS[m.group(2)], int(m.group(3))
+    if not (1 <= mo <= 12 and 1 <= d <= 31):
+        return None
+    return f"{y:04d}-{mo:02d}-{d:02d}"
+
+
+def _data_publicacao(lines: List[str]) -> Optional[Field]:
+    for i, ln in enumerate(lines):
+        f = _fold(ln)
+        if not _DATE_LABEL_RE.search(f):
+            continue
+        # data na mesma linha do rótulo ou logo abaixo
+        for cand in (f, _fold(lines[i + 1]) if i + 1 < len(lines) else ""):
+            iso = _iso_date(cand)
+            if iso:
+                return _field(iso, 0.9, ln)
+    return None
+
+
+RULES = {
+    "tipo_trabalho": _tipo_trabalho,
+    "senioridade": _senioridade,
+    "salario": _salario,
+    "link_candidatura": _link_candidatura,
+    "data_publicacao": _data_publicacao,
+}
+
+
+def pre_extract(text: str) -> Dict[str, Field]:
+    """{campo: {"value","conf","evidence"}} só para os campos encontrados."""
+    lines = [ln.strip() for ln in (text or "").split("\n") if ln.strip()]
+    out = {}
+    for name, rule in RULES.items():
+        got = rule(lines)
+        if got is not None and got["value"] not in (None, ""):
+            out[name] = got
+    return out
+
+
+def confident_fields(pre: Dict[str, Field], min_conf: Optional[float] = None) -> Dict[str, Any]:
+    """{campo: valor} com confiança suficiente para dispensar a IA."""
+    min_conf = PRE_EXTRACT_MIN_CONF if min_conf is None else min_conf
+    return {k: v["value"] for k, v in pre.items() if v["conf"] >= min_conf}
+
+
+def merge_pre(result: Dict[str, Any], pre: Dict[str, Field], min_conf: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Confiança alta: a regra vale. Confiança baixa: só preenche o que a IA
+    deixou vazio/desconhecido.
+    """
+    min_conf = PRE_EXTRACT_MIN_CONF if min_conf is None else min_conf
+    for k, f in pre.items():
+        if f["conf"] >= min_conf or result.get(k) in (None, "", "desconhecido"):
+            result[k] = f["value"]
+    return result
+
+
+# ---------- concordância regra x IA ----------
+def norm_for_compare(field: str, value: Any) -> str:
+    """Valor do campo na forma usada para dizer se regra e IA concordam."""
+    if value is None:
+        return ""
+    v = _fold(str(value)).strip()
+    if field in ("salario", "data_publicacao"):
+        return re.sub(r"\D", "", v)
+    if field == "link_candidatura":
+        return v.rstrip("/")
+    return v
+
+
+class AgreementStats:
+    """Contadores por campo (thread-safe): regra x IA quando as duas responderam."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, int]] = {}
+
+    def record(self, pre: Dict[str, Field], llm: Dict[str, Any], min_conf: Optional[float] = None) -> None:
+        min_conf = PRE_EXTRACT_MIN_CONF if min_conf is None else min_conf
+        with self._lock:
+            for k, f in pre.items():
+                if k not in llm:
+                    continue
+                d = self._data.setdefault(k, {"n": 0, "agree": 0, "n_high": 0, "agree_high": 0})
+                same = norm_for_compare(k, f["value"]) == norm_for_compare(k, llm.get(k))
+                d["n"] += 1
+                d["agree"] += same
+                if f["conf"] >= min_conf:
+                    d["n_high"] += 1
+                    d["agree_high"] += same
+
+    def summary_lines(self) -> List[str]:
+        with self._lock:
+            out = []
+            for k in sorted(self._data):
+                d = self._data[k]
+                hi = f"{d['agree_high'] / d['n_high']:.0%}" if d["n_high"] else "-"
+                out.append(
+                    f"{k}: concordância={d['agree'] / d['n']:.0%} n={d['n']} | "
+                    f"conf alta={hi} n={d['n_high']}"
+                )
+            return out
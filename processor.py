@@ -2,18 +2,119 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
+import re
 import time
 import json
-from typing import Dict, Any
+import uuid
+import threading
+from typing import Dict, Any, List, Optional, Tuple
 
 import requests
 from string import Template
 
+from llm_json import JsonStreamParser, schema_from_prompt, batch_schema, coerce_to_schema
+from text_cleaner import estimate_tokens
+from llm_provider import get_pool
+
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:7b")
 OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "900"))
 OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "450"))
 OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.2"))
+# chat: prefixo fixo do prompt vai como "system" (prefill reaproveitado entre vagas)
+# generate: prompt único, como antes
+OLLAMA_API = os.getenv("OLLAMA_API", "chat")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "1") == "1"
+# schema JSON (derivado do prompt) no `format` do Ollama; 0 = format "json" livre
+OLLAMA_SCHEMA = os.getenv("OLLAMA_SCHEMA", "1") == "1"
+
+# lote: várias vagas curtas por chamada (0 = desligado)
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "0"))
+LLM_BATCH_MAX_TOKENS = int(os.getenv("LLM_BATCH_MAX_TOKENS", "4096"))
+LLM_BATCH_MAX_ITEM_CHARS = int(os.getenv("LLM_BATCH_MAX_ITEM_CHARS", "3000"))
+LLM_BATCH_WAIT_S = float(os.getenv("LLM_BATCH_WAIT_S", "2"))
+
+# cascata: modelos do menor para o maior (vazio = só OLLAMA_MODEL). num_predict
+# e timeout por estágio, na mesma ordem; posição vazia usa o padrão global.
+LLM_CASCADE_MODELS = [m.strip() for m in os.getenv("LLM_CASCADE_MODELS", "").split(",") if m.strip()]
+LLM_CASCADE_NUM_PREDICT = [x.strip() for x in os.getenv("LLM_CASCADE_NUM_PREDICT", "").split(",")]
+LLM_CASCADE_TIMEOUT = [x.strip() for x in os.getenv("LLM_CASCADE_TIMEOUT", "").split(",")]
+
+Tier = Dict[str, Any]
+
+
+def _nth_int(values: List[str], i: int, default: int) -> int:
+    return int(values[i]) if i < len(values) and values[i] else default
+
+
+def llm_tiers() -> List[Tier]:
+    """Estágios da cascata ({"model","num_predict","timeout"}); um só sem LLM_CASCADE_MODELS."""
+    models = LLM_CASCADE_MODELS or [OLLAMA_MODEL]
+    return [
+        {
+            "model": m,
+            "num_predict": _nth_int(LLM_CASCADE_NUM_PREDICT, i, OLLAMA_NUM_PREDICT),
+            "timeout": _nth_int(LLM_CASCADE_TIMEOUT, i, OLLAMA_TIMEOUT),
+        }
+        for i, m in enumerate(models)
+    ]
+
+
+def default_tier() -> Tier:
+    return {"model": OLLAMA_MODEL, "num_predict": OLLAMA_NUM_PREDICT, "timeout": OLLAMA_TIMEOUT}
+
+
+# métricas por chamada (tokens/tempos do último chunk do servidor), por URL;
+# main consome com pop_llm_metrics e grava na tabela llm_metrics
+_llm_metrics: Dict[str, List[Dict[str, Any]]] = {}
+_llm_metrics_lock = threading.Lock()
+
+# depois do "}" o servidor costuma mandar o chunk done logo em seguida; até
+# esse número de pedaços só de espaço ainda esperamos por ele (métricas)
+_DONE_GRACE_PIECES = 4
+
+
+def pop_llm_metrics(url: str) -> List[Dict[str, Any]]:
+    with _llm_metrics_lock:
+        return _llm_metrics.pop(url, [])
+
+
+def _ns_to_ms(v: Any) -> Optional[float]:
+    return round(v / 1e6, 1) if isinstance(v, (int, float)) else None
+
+
+def _record_llm_metrics(
+    urls: List[str],
+    final: Dict[str, Any],
+    model: str,
+    api: str,
+    wall_ms: float,
+    chunks: int,
+    stop: Optional[str],
+    fields: Optional[List[str]] = None,
+) -> None:
+    m = {
+        "call_id": uuid.uuid4().hex,
+        "model": model,
+        "endpoint": final.get("_endpoint"),
+        "api": api,
+        "batch_size": len(urls),
+        "fields": len(fields) if fields else None,
+        "prompt_tokens": final.get("prompt_eval_count"),
+        "prompt_ms": _ns_to_ms(final.get("prompt_eval_duration")),
+        "eval_tokens": final.get("eval_count"),
+        "eval_ms": _ns_to_ms(final.get("eval_duration")),
+        "load_ms": _ns_to_ms(final.get("load_duration")),
+        "total_ms": _ns_to_ms(final.get("total_duration")),
+        "wall_ms": round(wall_ms, 1),
+        "chunks": chunks,
+        "done_reason": final.get("done_reason"),
+        "stop": stop,
+    }
+    with _llm_metrics_lock:
+        for u in urls:
+            _llm_metrics.setdefault(u, []).append(m)
 
 
 def load_prompt(prompt_path: str) -> str:
@@ -65,36 +166,138 @@ def _safe_json_loads(s: str):
     except Exception:
         return None
 
-def call_llm_extract_json(prompt_template: str, page_text: str, url: str) -> dict:
-    prompt = Template(prompt_template).safe_substitute(texto=page_text, url=url)
+def _generation_options(num_predict: Optional[int] = None) -> Dict[str, Any]:
+    opts: Dict[str, Any] = {
+        "temperature": OLLAMA_TEMPERATURE,
+        "num_predict": num_predict or OLLAMA_NUM_PREDICT,
+    }
+    if not OLLAMA_SCHEMA:
+        # stop ajuda MUITO a cortar quando o modelo começa a "explicar"
+        # (com schema, o JsonStreamParser já encerra ao fechar o objeto)
+        opts["stop"] = ["\n\n", "```"]
+    return opts
 
-    endpoint = f"{OLLAMA_BASE_URL}/api/generate"
-    timeout = (10, OLLAMA_TIMEOUT)
 
-    payload = {
+def _format_for(prompt_template: str, fields: Optional[List[str]] = None) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """(valor do `format` do Ollama, schema ou None)."""
+    schema = schema_from_prompt(prompt_template, fields) if OLLAMA_SCHEMA else None
+    return (schema or "json"), schema
+
+
+def llm_signature(fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Tudo (além do prompt e do texto) que muda a resposta do modelo; entra na chave do llm_cache."""
+    sig = {
         "model": OLLAMA_MODEL,
-        "prompt": prompt,
-        "stream": True,
-        "format": "json",
-        "options": {
-            "temperature": OLLAMA_TEMPERATURE,
-            "num_predict": OLLAMA_NUM_PREDICT,
-            # stop ajuda MUITO a cortar quando o modelo começa a "explicar"
-            "stop": ["\n\n", "```"],
-        },
+        "endpoint": OLLAMA_API,
+        "format": "schema" if OLLAMA_SCHEMA else "json",
+        "options": _generation_options(),
     }
+    if len(LLM_CASCADE_MODELS) > 1:
+        # o resultado pode vir de qualquer estágio da cascata
+        sig["cascade"] = [[t["model"], t["num_predict"]] for t in llm_tiers()]
+    if fields:
+        sig["fields"] = sorted(fields)
+    return sig
 
-    chunks = []
-    last_beat = time.time()
-    start = time.time()
-    got_any = False
 
-    print("  - IA (Ollama): iniciando geração...")
+def is_failed_result(result: Dict[str, Any]) -> bool:
+    """Fallback (sem chunks / não-JSON: _raw_llm) ou JSON cortado/abortado (_partial)."""
+    return "_raw_llm" in result or "_partial" in result
+
+
+_PLACEHOLDER_RE = re.compile(r"\$\{?(?:url|texto)\b")
+
 
-    with requests.post(endpoint, json=payload, stream=True, timeout=timeout) as r:
-        r.raise_for_status()
+def split_prompt(prompt_template: str) -> Tuple[str, str]:
+    """
+    (prefixo fixo, parte variável) do template.
+
+    O corte fica no início do parágrafo do primeiro ${url}/${texto}: tudo antes
+    (instruções, perfil, formato do JSON) é igual em toda chamada e vai como
+    mensagem "system", então o Ollama reaproveita o prefill desse trecho.
+    """
+    m = _PLACEHOLDER_RE.search(prompt_template)
+    if not m:
+        return prompt_template.rstrip(), ""
+    cut = prompt_template.rfind("\n\n", 0, m.start())
+    cut = m.start() if cut == -1 else cut + 2
+    return prompt_template[:cut].rstrip(), prompt_template[cut:]
+
+
+def prompt_fields(prompt_template: str) -> List[str]:
+    """Chaves do bloco "FORMATO DO JSON" do prompt, na ordem."""
+    return list(((schema_from_prompt(prompt_template) or {}).get("properties") or {}))
+
+
+def _fields_note(fields: Optional[List[str]]) -> str:
+    """Pede só parte das chaves (as outras já vieram da pré-extração/ATS)."""
+    if not fields:
+        return ""
+    return (
+        "\nRESPONDA APENAS COM ESTAS CHAVES DO FORMATO (as demais já foram extraídas): "
+        + ", ".join(fields)
+    )
+
+
+def build_request(
+    prompt_template: str,
+    page_text: str,
+    url: str,
+    api: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    tier: Optional[Tier] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    (rota, payload) para /api/chat (prefixo em "system") ou /api/generate (prompt único).
+    O host sai do pool de endpoints (llm_provider), que traduz para o servidor de destino.
+    `fields`: pede só essas chaves; o prefixo fixo não muda, o aviso vai no fim.
+    `tier`: modelo/num_predict de um estágio da cascata (padrão: OLLAMA_MODEL).
+    """
+    api = api or OLLAMA_API
+    tier = tier or default_tier()
+    payload: Dict[str, Any] = {
+        "model": tier["model"],
+        "stream": True,
+        "format": _format_for(prompt_template, fields)[0],
+        "options": _generation_options(tier["num_predict"]),
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+    }
+    if api == "chat":
+        prefix, rest = split_prompt(prompt_template)
+        payload["messages"] = [
+            {"role": "system", "content": Template(prefix).safe_substitute()},
+            {"role": "user", "content": Template(rest).safe_substitute(texto=page_text, url=url) + _fields_note(fields)},
+        ]
+        return "/api/chat", payload
+    payload["prompt"] = Template(prompt_template).safe_substitute(texto=page_text, url=url) + _fields_note(fields)
+    return "/api/generate", payload
+
+
+def _stream_llm(
+    endpoint: str,
+    payload: Dict[str, Any],
+    parser: Optional[JsonStreamParser] = None,
+    timeout: Optional[int] = None,
+) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Lê o streaming da IA (`endpoint` = rota /api/chat ou /api/generate; o
+    host vem do pool em llm_provider, com failover).
+    Devolve (pedaços de texto, último objeto com done=true: métricas do
+    servidor). O objeto final sempre traz "_endpoint" (host que respondeu).
+
+    Com `parser`, para de ler assim que o objeto JSON fecha (ou a lista
+    dispara): sair do `with` fecha a conexão e o servidor interrompe a geração.
+    Se o chunk done não vier logo depois do "}", o objeto final fica sem métricas.
+    """
+    timeout = (10, timeout or OLLAMA_TIMEOUT)
+    chunks: List[str] = []
+    final: Dict[str, Any] = {}
+    last_beat = time.time()
+    start = time.time()
+    grace = -1  # >= 0: objeto já fechou, esperando o done
 
-        for line in r.iter_lines(decode_unicode=True):
+    with get_pool().stream(endpoint, payload, timeout) as (label, events):
+        for piece, done in events:
             now = time.time()
 
             # heartbeat a cada 3s, mesmo se ainda não chegou nada
@@ -103,19 +306,74 @@ def call_llm_extract_json(prompt_template: str, page_text: str, url: str) -> dic
                 print(f"  - IA (Ollama): rodando... {elapsed}s | chars_recebidos={sum(len(c) for c in chunks)}")
                 last_beat = now
 
-            if not line:
-                continue
+            if piece and grace >= 0:
+                grace += 1
+                if piece.strip() or grace > _DONE_GRACE_PIECES:
+                    break
+            elif piece:
+                chunks.append(piece)
+                if parser is not None:
+                    parser.feed(piece)
+                    if parser.aborted:
+                        break
+                    if parser.complete:
+                        grace = 0
+
+            if done is not None:
+                final = done
+                break
 
-            obj = _safe_json_loads(line)
-            if not obj:
-                continue
+    final = dict(final)
+    final["_endpoint"] = label
+    return chunks, final
 
-            if obj.get("response"):
-                got_any = True
-                chunks.append(obj["response"])
 
-            if obj.get("done") is True:
-                break
+def warm_up(prompt_template: Optional[str] = None, api: Optional[str] = None, model: Optional[str] = None) -> Optional[int]:
+    """
+    Carrega o modelo (keep_alive) em todos os endpoints e, no modo chat, já faz
+    o prefill do prefixo fixo do prompt. Devolve o tempo em ms, ou None se
+    nenhum endpoint respondeu.
+    """
+    api = api or OLLAMA_API
+    t0 = time.time()
+    payload: Dict[str, Any] = {"model": model or OLLAMA_MODEL, "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE}
+    if api == "chat" and prompt_template:
+        prefix, _ = split_prompt(prompt_template)
+        payload["messages"] = [{"role": "system", "content": Template(prefix).safe_substitute()}]
+        payload["options"] = {**_generation_options(), "num_predict": 1}
+        endpoint = "/api/chat"
+    else:
+        # /api/generate sem prompt só carrega o modelo na memória
+        endpoint = "/api/generate"
+    results = get_pool().post_each(endpoint, payload, timeout=(10, OLLAMA_TIMEOUT))
+    for label, err in results:
+        if err:
+            print(f"  - IA ({label}): warm-up falhou ({err})")
+    if all(err for _, err in results):
+        return None
+    return int((time.time() - t0) * 1000)
+
+
+def call_llm_extract_json(
+    prompt_template: str,
+    page_text: str,
+    url: str,
+    fields: Optional[List[str]] = None,
+    tier: Optional[Tier] = None,
+) -> dict:
+    tier = tier or default_tier()
+    endpoint, payload = build_request(prompt_template, page_text, url, fields=fields, tier=tier)
+    parser = JsonStreamParser(_format_for(prompt_template, fields)[1])
+
+    print(f"  - IA (Ollama): iniciando geração ({tier['model']})...")
+
+    t0 = time.time()
+    chunks, final = _stream_llm(endpoint, payload, parser, timeout=tier["timeout"])
+    _record_llm_metrics(
+        [url], final, tier["model"], endpoint, (time.time() - t0) * 1000, len(chunks),
+        "aborted" if parser.aborted else ("complete" if parser.complete else None), fields,
+    )
+    got_any = bool(chunks)
 
     raw = "".join(chunks).strip()
 
@@ -138,18 +396,18 @@ def call_llm_extract_json(prompt_template: str, page_text: str, url: str) -> dic
             "url": url,
         }
 
-    parsed = _safe_json_loads(raw)
-    if isinstance(parsed, dict):
+    parsed = parser.result()
+    if parsed is not None:
+        if parser.aborted:
+            print(f"  - IA (Ollama): geração abortada ({parser.aborted}); usando o JSON até ali.")
+            parsed["_partial"] = parser.aborted
+        elif not parser.complete:
+            parsed["_partial"] = "JSON incompleto (num_predict/stop)"
+        fixed = coerce_to_schema(parsed, parser.schema)
+        if fixed:
+            parsed["_schema_fixes"] = fixed
         return parsed
 
-    # fallback: extrair json entre { ... }
-    s = raw.find("{")
-    e = raw.rfind("}")
-    if s != -1 and e != -1 and e > s:
-        parsed2 = _safe_json_loads(raw[s:e+1])
-        if isinstance(parsed2, dict):
-            return parsed2
-
     return {
         "cargo": None,
         "empresa": None,
@@ -168,6 +426,163 @@ def call_llm_extract_json(prompt_template: str, page_text: str, url: str) -> dic
     }
 
 
+# ---------- lote: várias vagas curtas numa chamada ----------
+_BATCH_INSTRUCTIONS = """
+MODO LOTE:
+O texto traz várias vagas, cada uma começando com "### VAGA <id>".
+Responda com UM objeto JSON cujas chaves são os ids das vagas e cujos valores
+seguem o FORMATO DO JSON acima (um objeto por vaga, sem omitir nenhuma vaga).
+"""
+
+
+def approx_tokens(text: str) -> int:
+    """Estimativa rápida de tokens (mesma da redução por orçamento)."""
+    return estimate_tokens(text) + 1
+
+
+def plan_batches(texts: List[str], max_tokens: Optional[int] = None, max_items: Optional[int] = None) -> List[List[int]]:
+    """
+    Agrupa índices de `texts` (na ordem) em lotes que cabem em `max_tokens` e
+    `max_items`. Textos maiores que LLM_BATCH_MAX_ITEM_CHARS ficam sozinhos.
+    """
+    max_tokens = max_tokens or LLM_BATCH_MAX_TOKENS
+    max_items = max(1, max_items or LLM_BATCH_SIZE)
+    groups: List[List[int]] = []
+    cur: List[int] = []
+    cur_tokens = 0
+    for i, t in enumerate(texts):
+        tok = approx_tokens(t)
+        if len(t) > LLM_BATCH_MAX_ITEM_CHARS:
+            groups.append([i])
+            continue
+        if cur and (cur_tokens + tok > max_tokens or len(cur) >= max_items):
+            groups.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(i)
+        cur_tokens += tok
+    if cur:
+        groups.append(cur)
+    return groups
+
+
+def build_batch_request(
+    prompt_template: str,
+    items: List[Dict[str, str]],
+    api: Optional[str] = None,
+    tier: Optional[Tier] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Como build_request, com várias vagas ({"id","text","url"}) na parte variável.
+    `fields`: as mesmas chaves para todas as vagas do lote (extract_many só
+    junta vagas com o mesmo pedido).
+    """
+    api = api or OLLAMA_API
+    tier = tier or default_tier()
+    prefix, rest = split_prompt(prompt_template)
+    system = Template(prefix).safe_substitute() + "\n" + _BATCH_INSTRUCTIONS
+    body = "\n\n".join(
+        f"### VAGA {it['id']}\n" + Template(rest).safe_substitute(texto=it["text"], url=it["url"])
+        for it in items
+    ) + _fields_note(fields)
+    options = _generation_options()
+    options["num_predict"] = tier["num_predict"] * len(items)
+    if "stop" in options:
+        # no lote a resposta é maior; "\n\n" cortaria entre uma vaga e outra
+        options["stop"] = ["```"]
+    _, item_schema = _format_for(prompt_template, fields)
+    payload: Dict[str, Any] = {
+        "model": tier["model"],
+        "stream": True,
+        "format": batch_schema(item_schema, [str(it["id"]) for it in items]) if item_schema else "json",
+        "options": options,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+    }
+    if api == "chat":
+        payload["messages"] = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": body},
+        ]
+        return "/api/chat", payload
+    payload["prompt"] = system + "\n" + body
+    return "/api/generate", payload
+
+
+def call_llm_extract_batch(
+    prompt_template: str,
+    items: List[Dict[str, str]],
+    tier: Optional[Tier] = None,
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Uma chamada para várias vagas. Devolve {id: resultado} só com os itens que
+    vieram como objeto JSON; os que faltarem ficam por conta de quem chamou.
+    """
+    tier = tier or default_tier()
+    endpoint, payload = build_batch_request(prompt_template, items, tier=tier, fields=fields)
+    _, item_schema = _format_for(prompt_template, fields)
+    parser = JsonStreamParser(payload["format"] if isinstance(payload["format"], dict) else None)
+    print(f"  - IA (Ollama): iniciando geração em lote ({len(items)} vagas, {tier['model']})...")
+    t0 = time.time()
+    chunks, final = _stream_llm(endpoint, payload, parser, timeout=tier["timeout"])
+    _record_llm_metrics(
+        [it["url"] for it in items], final, tier["model"], endpoint, (time.time() - t0) * 1000, len(chunks),
+        "aborted" if parser.aborted else ("complete" if parser.complete else None),
+    )
+    # só vagas cujo objeto fechou inteiro; a cortada vai para a chamada individual
+    parsed = parser.result() if parser.complete else parser.fields
+    out = {}
+    for it in items:
+        r = (parsed or {}).get(str(it["id"]))
+        if isinstance(r, dict) and r:
+            coerce_to_schema(r, item_schema)
+            out[str(it["id"])] = r
+    return out
+
+
+def extract_many(
+    prompt_template: str,
+    items: List[Dict[str, str]],
+    tier: Optional[Tier] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Resultados alinhados com `items` ({"text","url"[, "fields"]}).
+
+    Vagas curtas vão em lotes (plan_batches), só com vagas que pedem as
+    mesmas chaves; item que não voltar parseável do lote, ou lote que falhar
+    inteiro, cai para call_llm_extract_json.
+    Resultados de lote ganham "_batch" com o tamanho do lote.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    by_fields: Dict[Tuple[str, ...], List[int]] = {}
+    for i, it in enumerate(items):
+        by_fields.setdefault(tuple(sorted(it.get("fields") or ())), []).append(i)
+    groups = [
+        [idx[j] for j in group]
+        for idx in by_fields.values()
+        for group in plan_batches([items[i]["text"] for i in idx])
+    ]
+    for group in groups:
+        if len(group) > 1:
+            fields = items[group[0]].get("fields")
+            batch = [{"id": str(n), "text": items[i]["text"], "url": items[i]["url"]} for n, i in enumerate(group, 1)]
+            try:
+                got = call_llm_extract_batch(prompt_template, batch, tier=tier, fields=fields)
+            except requests.exceptions.RequestException as e:
+                print(f"  - IA (Ollama): lote falhou ({type(e).__name__}: {e}); chamando uma a uma.")
+                got = {}
+            for it, i in zip(batch, group):
+                if it["id"] in got:
+                    results[i] = got[it["id"]]
+                    results[i]["_batch"] = len(group)
+        for i in group:
+            if results[i] is None:
+                results[i] = call_llm_extract_json(
+                    prompt_template, items[i]["text"], items[i]["url"], fields=items[i].get("fields"), tier=tier
+                )
+    return results
+
+
 # def call_llm_extract_json(prompt_template: str, page_text: str, url: str) -> dict:
 #     """
 #     Chama Ollama de forma robusta:
@@ -0,0 +1,160 @@
+"""
+Rate limit por domínio (token bucket) com limite global opcional.
+
+- thread-safe: a reserva do token é feita sob lock e a espera acontece fora
+  dele, só na thread que pediu; coletas de outros domínios seguem normalmente
+- variante asyncio (AsyncRateLimiter) com a mesma lógica, esperando via
+  asyncio.sleep
+- adaptação a sinais do servidor: 429/503 (e Retry-After) deixam o domínio
+  mais lento; respostas OK devolvem a velocidade aos poucos
+- limite próprio por domínio (`limits`), ex.: r.jina.ai, que atende as
+  páginas de todos os sites e não segue o ritmo de um site só
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+RATE_MIN_INTERVAL = float(os.getenv("RATE_MIN_INTERVAL", "1.2"))
+RATE_BURST = float(os.getenv("RATE_BURST", "1"))
+RATE_JITTER = float(os.getenv("RATE_JITTER", "0.4"))
+RATE_GLOBAL_RPS = float(os.getenv("RATE_GLOBAL_RPS", "0"))  # 0 = sem limite global
+RATE_MAX_SLOWDOWN = float(os.getenv("RATE_MAX_SLOWDOWN", "32"))
+RATE_MAX_RETRY_AFTER = float(os.getenv("RATE_MAX_RETRY_AFTER", "120"))
+# a cada resposta OK o fator de lentidão cai para fator * RATE_RECOVERY (mín. 1)
+RATE_RECOVERY = float(os.getenv("RATE_RECOVERY", "0.8"))
+
+THROTTLE_STATUS = (429, 503)
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Retry-After em segundos ("120" ou data HTTP). None se ausente/inválido."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, dt.timestamp() - (now if now is not None else time.time()))
+
+
+class _Bucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "slowdown", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.slowdown = 1.0
+        self.blocked_until = 0.0
+
+    def reserve(self, now: float) -> float:
+        """Consome 1 token (pode ficar negativo) e devolve quanto esperar."""
+        rate = self.rate / self.slowdown
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        self.tokens -= 1.0
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / rate
+        return max(wait, self.blocked_until - now)
+
+
+class RateLimiter:
+    """
+    Uso:
+        rl = RateLimiter()
+        rl.acquire(url)                                   # antes da requisição
+        rl.feedback(url, r.status_code, r.headers.get("Retry-After"))  # depois
+
+    limits: {domínio: (req/s, burst)} no lugar de min_interval/burst.
+    """
+    def __init__(
+        self,
+        min_interval: float = RATE_MIN_INTERVAL,
+        burst: float = RATE_BURST,
+        jitter: float = RATE_JITTER,
+        global_rps: float = RATE_GLOBAL_RPS,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self.rate = 1.0 / max(float(min_interval), 1e-6)
+        self.burst = max(1.0, float(burst))
+        self.limits = {d.lower(): (max(float(r), 1e-6), max(1.0, float(b))) for d, (r, b) in (limits or {}).items()}
+        self.jitter = float(jitter)
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, _Bucket] = {}
+        self._global = _Bucket(global_rps, max(1.0, global_rps), time.monotonic()) if global_rps > 0 else None
+
+    @staticmethod
+    def _domain(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def _bucket(self, domain: str, now: float) -> _Bucket:
+        b = self._buckets.get(domain)
+        if b is None:
+            rate, burst = self.limits.get(domain, (self.rate, self.burst))
+            b = self._buckets[domain] = _Bucket(rate, burst, now)
+        return b
+
+    def _reserve(self, url: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            delay = self._bucket(self._domain(url), now).reserve(now)
+            if self._global is not None:
+                delay = max(delay, self._global.reserve(now))
+        if delay > 0 and self.jitter > 0:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+    def acquire(self, url: str) -> float:
+        """Bloqueia só a thread atual até poder requisitar `url`. Devolve a espera (s)."""
+        delay = self._reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    # alias (nome usado pelo limiter anterior)
+    wait = acquire
+
+    def feedback(self, url: str, status_code: int, retry_after: Optional[str] = None) -> None:
+        """Ajusta o ritmo do domínio conforme a resposta."""
+        now = time.monotonic()
+        with self._lock:
+            b = self._bucket(self._domain(url), now)
+            if status_code in THROTTLE_STATUS:
+                b.slowdown = min(RATE_MAX_SLOWDOWN, b.slowdown * 2)
+                pause = parse_retry_after(retry_after)
+                if pause is None:
+                    pause = b.slowdown / b.rate
+                b.blocked_until = max(b.blocked_until, now + min(pause, RATE_MAX_RETRY_AFTER))
+                b.tokens = min(b.tokens, 0.0)
+            elif status_code < 400:
+                b.slowdown = max(1.0, b.slowdown * RATE_RECOVERY)
+
+    def slowdown(self, url: str) -> float:
+        with self._lock:
+            b = self._buckets.get(self._domain(url))
+            return b.slowdown if b else 1.0
+
+
+class AsyncRateLimiter(RateLimiter):
+    """Mesma política, para código asyncio (a espera não bloqueia o event loop)."""
+
+    async def acquire(self, url: str) -> float:
+        delay = self._reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    wait = acquire
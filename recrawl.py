@@ -0,0 +1,104 @@
+"""
+Agenda de revisita: cada URL volta a ser coletada quando vence o próprio
+intervalo, não em todo run.
+
+- URL nova: coletada já (prioridade máxima)
+- conteúdo mudou (extraída de novo): intervalo volta ao mínimo
+- igual (304, mesmo hash/impressão digital): intervalo x RECRAWL_BACKOFF,
+  até RECRAWL_MAX_HOURS; vaga vista pela primeira vez há menos de
+  RECRAWL_FRESH_DAYS fica no mínimo (vaga nova ainda muda muito)
+- removida: RECRAWL_MAX_HOURS (só confirma de vez em quando)
+- erro: tenta de novo no intervalo mínimo (falha persistente é do cache
+  negativo, negative_cache.py)
+
+Cada run coleta só as URLs vencidas, da mais atrasada (em múltiplos do
+próprio intervalo) para a menos, até RECRAWL_FETCH_BUDGET (0 = sem limite);
+as que sobram continuam vencidas e sobem na fila do próximo run.
+Agenda em cache/jobs.db (tabela crawl_schedule).
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import time
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+RECRAWL_ENABLED = os.getenv("RECRAWL_ENABLED", "1") == "1"
+RECRAWL_MIN_HOURS = float(os.getenv("RECRAWL_MIN_HOURS", "12"))
+RECRAWL_MAX_HOURS = float(os.getenv("RECRAWL_MAX_HOURS", "336"))
+RECRAWL_BACKOFF = float(os.getenv("RECRAWL_BACKOFF", "2"))
+RECRAWL_FRESH_DAYS = float(os.getenv("RECRAWL_FRESH_DAYS", "3"))
+RECRAWL_FETCH_BUDGET = int(os.getenv("RECRAWL_FETCH_BUDGET", "0"))
+# espalha os vencimentos (URLs coletadas juntas não vencem todas no mesmo run)
+RECRAWL_JITTER = 0.1
+
+OUTCOMES = ("changed", "same", "removed", "error")
+
+
+def next_interval(prev_s: Optional[float], outcome: str, first_seen: float, now: float) -> float:
+    """Próximo intervalo (segundos) dado o resultado da coleta."""
+    lo, hi = RECRAWL_MIN_HOURS * 3600, max(RECRAWL_MIN_HOURS, RECRAWL_MAX_HOURS) * 3600
+    if outcome == "removed":
+        return hi
+    if outcome != "same" or now - first_seen < RECRAWL_FRESH_DAYS * 86400:
+        return lo
+    return min(hi, max(lo, (prev_s or lo) * RECRAWL_BACKOFF))
+
+
+def schedule_entry(
+    prev: Optional[Dict[str, Any]],
+    outcome: str,
+    now: Optional[float] = None,
+    rng: Optional[random.Random] = None,
+) -> Dict[str, Any]:
+    """Nova linha da agenda depois de coletar a URL (prev = linha anterior ou None)."""
+    now = time.time() if now is None else now
+    prev = prev or {}
+    first_seen = prev.get("first_seen") or now
+    interval = next_interval(prev.get("interval_s"), outcome, first_seen, now)
+    jitter = (rng or random).uniform(1 - RECRAWL_JITTER, 1 + RECRAWL_JITTER)
+    return {
+        "next_due": now + interval * jitter,
+        "interval_s": interval,
+        "first_seen": first_seen,
+        "last_fetch": now,
+        "last_change": now if outcome == "changed" else prev.get("last_change"),
+        "changes": int(prev.get("changes") or 0) + (outcome == "changed"),
+        "stable_runs": int(prev.get("stable_runs") or 0) + 1 if outcome == "same" else 0,
+        "last_outcome": outcome,
+    }
+
+
+def select_due(
+    url_norms: List[str],
+    schedule: Dict[str, Dict[str, Any]],
+    budget: Optional[int] = None,
+    now: Optional[float] = None,
+) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    (URLs a coletar neste run, resumo). Ordem: novas, depois as mais
+    atrasadas em relação ao próprio intervalo; corta em `budget` (0 = todas).
+    """
+    now = time.time() if now is None else now
+    budget = RECRAWL_FETCH_BUDGET if budget is None else budget
+    due = []
+    next_due = None
+    for u in url_norms:
+        s = schedule.get(u)
+        if s is None:
+            due.append((float("inf"), u))
+        elif s["next_due"] <= now:
+            due.append(((now - s["next_due"]) / max(1.0, s["interval_s"] or 0), u))
+        elif next_due is None or s["next_due"] < next_due:
+            next_due = s["next_due"]
+    due.sort(key=lambda t: t[0], reverse=True)
+    chosen = [u for _, u in (due[:budget] if budget > 0 else due)]
+    return chosen, {
+        "total": len(url_norms),
+        "new": sum(1 for u in url_norms if u not in schedule),
+        "due": len(due),
+        "chosen": len(chosen),
+        "deferred": len(due) - len(chosen),
+        "next_due": next_due,
+    }
@@ -0,0 +1,180 @@
+"""
+Gravação/reprodução de respostas HTTP para rodar o pipeline sem rede.
+
+    HTTP_REPLAY_MODE=record HTTP_REPLAY_DIR=fixtures/run1 python main.py
+    python bench.py e2e --fixtures fixtures/run1        # reproduz (sem rede)
+
+- record: cada resposta dos sites/r.jina.ai/ATS (sessões do scraper) e cada
+  streaming da IA (sessão do llm_provider) vai para HTTP_REPLAY_DIR, um
+  .json por pedido; erros de rede (DNS, timeout, conexão) também
+- replay: as sessões do scraper respondem só com o que foi gravado (pedido
+  sem gravação = ConnectionError); a IA fica com fake_ollama.py, que lê os
+  mesmos arquivos
+
+Chave = método + URL (+ corpo). Para a IA o host fica de fora (o servidor
+falso sobe em outra porta), só rota + corpo do pedido.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import io
+import os
+import json
+import base64
+import shutil
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+
+HTTP_REPLAY_MODE = os.getenv("HTTP_REPLAY_MODE", "")  # "" | record | replay
+HTTP_REPLAY_DIR = os.getenv("HTTP_REPLAY_DIR", "fixtures/default")
+HTTP_REPLAY_MAX_BYTES = int(os.getenv("HTTP_REPLAY_MAX_BYTES", str(4_000_000)))
+
+_ERRORS = {
+    "ConnectionError": requests.exceptions.ConnectionError,
+    "ConnectTimeout": requests.exceptions.ConnectTimeout,
+    "ReadTimeout": requests.exceptions.ReadTimeout,
+    "Timeout": requests.exceptions.Timeout,
+    "SSLError": requests.exceptions.SSLError,
+    "TooManyRedirects": requests.exceptions.TooManyRedirects,
+}
+# cabeçalhos que não valem mais para o corpo gravado (já descomprimido, inteiro)
+_DROP_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection", "keep-alive"}
+
+
+def fixture_key(method: str, url: str, body: Optional[bytes] = None, llm: bool = False) -> str:
+    target = urlparse(url).path if llm else url
+    h = hashlib.sha256(f"{method.upper()} {target}".encode("utf-8"))
+    h.update(b"\0")
+    h.update(body or b"")
+    return h.hexdigest()[:40]
+
+
+def _path(directory: str, key: str) -> str:
+    return os.path.join(directory, key[:2], key + ".json")
+
+
+def load_fixture(directory: str, key: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_path(directory, key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def fixture_body(fx: Dict[str, Any]) -> bytes:
+    return base64.b64decode(fx.get("body_b64") or "")
+
+
+def _save_fixture(directory: str, key: str, fx: Dict[str, Any]) -> None:
+    path = _path(directory, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(fx, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _body_bytes(request: requests.PreparedRequest) -> bytes:
+    b = request.body
+    if b is None:
+        return b""
+    return b if isinstance(b, bytes) else str(b).encode("utf-8")
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Adapter do requests: grava (record) ou responde do disco (replay).
+    `llm=True`: chave sem o host (pedidos à IA).
+    """
+    def __init__(self, mode: str, directory: str, llm: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.directory = directory
+        self.llm = llm
+
+    def _key(self, request: requests.PreparedRequest) -> str:
+        return fixture_key(request.method or "GET", request.url or "", _body_bytes(request), self.llm)
+
+    def _response(self, request: requests.PreparedRequest, fx: Dict[str, Any]) -> requests.Response:
+        body = fixture_body(fx)
+        headers = {k: v for k, v in (fx.get("headers") or {}).items() if k.lower() not in _DROP_HEADERS}
+        headers["Content-Length"] = str(len(body))
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=headers,
+            status=fx["status"],
+            reason=fx.get("reason"),
+            preload_content=False,
+            decode_content=False,
+        )
+        resp = self.build_response(request, raw)
+        if fx.get("url"):
+            resp.url = fx["url"]
+        return resp
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = self._key(request)
+        if self.mode == "replay":
+            fx = load_fixture(self.directory, key)
+            if fx is None:
+                raise requests.exceptions.ConnectionError(f"replay: sem gravação para {request.method} {request.url}")
+            if fx.get("error"):
+                raise _ERRORS.get(fx["error"], requests.exceptions.ConnectionError)(fx.get("detail") or fx["error"])
+            return self._response(request, fx)
+
+        # record: lê a resposta inteira (até HTTP_REPLAY_MAX_BYTES) e grava
+        base = {"method": request.method, "request_url": request.url}
+        try:
+            resp = super().send(request, stream=True, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        except requests.exceptions.RequestException as e:
+            _save_fixture(self.directory, key, {**base, "error": type(e).__name__, "detail": str(e)})
+            raise
+        try:
+            parts, total = [], 0
+            for chunk in resp.iter_content(chunk_size=65536):
+                parts.append(chunk)
+                total += len(chunk)
+                if total >= HTTP_REPLAY_MAX_BYTES:
+                    break
+        finally:
+            resp.close()
+        fx = {
+            **base,
+            "url": resp.url,
+            "status": resp.status_code,
+            "reason": resp.reason,
+            "headers": dict(resp.headers),
+            "body_b64": base64.b64encode(b"".join(parts)).decode("ascii"),
+        }
+        _save_fixture(self.directory, key, fx)
+        return self._response(request, fx)
+
+
+def install(session: requests.Session, llm: bool = False, **adapter_kwargs) -> None:
+    """Monta o adapter na sessão conforme HTTP_REPLAY_MODE (nada se vazio).
+    A IA só é gravada aqui; na reprodução quem responde é o fake_ollama."""
+    if HTTP_REPLAY_MODE not in ("record", "replay"):
+        return
+    if llm and HTTP_REPLAY_MODE != "record":
+        return
+    adapter = ReplayAdapter(HTTP_REPLAY_MODE, HTTP_REPLAY_DIR, llm=llm, **adapter_kwargs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def snapshot_inputs(paths: Iterable[str]) -> None:
+    """record: copia config/prompt do run para HTTP_REPLAY_DIR/inputs (a reprodução usa os mesmos)."""
+    if HTTP_REPLAY_MODE != "record":
+        return
+    dest = os.path.join(HTTP_REPLAY_DIR, "inputs")
+    for p in paths:
+        if os.path.exists(p):
+            target = os.path.join(dest, p)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(p, target)
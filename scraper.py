@@ -1,8 +1,22 @@
+import os
+import re
+import json
+import time
+import codecs
+import socket
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
 import requests
-from bs4 import BeautifulSoup
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
+from requests.adapters import HTTPAdapter
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception
 
-from utils import pick_user_agent, DomainRateLimiter, normalize_url
+from utils import pick_user_agent, normalize_url
+from rate_limiter import RateLimiter, THROTTLE_STATUS
+from strategy_stats import StrategyStats, stats_domain
+from extractors import extract_text
+import replay
 
 DEFAULT_HEADERS = {
     "User-Agent": (
@@ -12,86 +26,495 @@ DEFAULT_HEADERS = {
     )
 }
 
-# rate limiter global (por processo)
-_rate = DomainRateLimiter(min_interval=1.2, jitter=0.4)
+# r.jina.ai busca as páginas de todos os sites: com o bucket de um site
+# (RATE_MIN_INTERVAL) as coletas concorrentes via Jina sairiam uma a uma
+JINA_HOST = "r.jina.ai"
+JINA_RPS = float(os.getenv("JINA_RPS", "2"))
+JINA_BURST = float(os.getenv("JINA_BURST", "4"))
+JINA_API_KEY = os.getenv("JINA_API_KEY", "")
+
+# rate limiter global (por processo): token bucket por domínio, ver rate_limiter.py
+_rate = RateLimiter(limits={JINA_HOST: (JINA_RPS, JINA_BURST)})
+
+
+class Throttled(requests.exceptions.HTTPError):
+    """429/503: o limiter já desacelerou o domínio; o retry espera o Retry-After."""
+
 
 TRANSIENT = (
     requests.exceptions.Timeout,
     requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,  # conexão caiu no meio do corpo
+    Throttled,
 )
 
-@retry(
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "4"))
+# corpo baixado em streaming; acima disso a leitura para (text_cleaner corta
+# o texto em ~9k chars de qualquer forma)
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2_000_000)))
+_CHUNK_SIZE = 16384
+
+
+class NotModified(Exception):
+    """Servidor respondeu 304: conteúdo igual ao da última coleta."""
+
+
+class PageRemoved(RuntimeError):
+    """404/410: vaga saiu do ar (resposta definitiva, não adianta outra estratégia)."""
+
+
+class Blocked(RuntimeError):
+    """401/403: possível bloqueio. `text` guarda o aviso + início do corpo."""
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Blocked ({status_code})")
+        self.status_code = status_code
+        self.text = text
+
+
+class NotText(RuntimeError):
+    """Content-Type não textual (PDF, imagem, bundle binário...): download abortado."""
+
+
+# estatísticas por domínio/estratégia (carregadas/salvas pelo main)
+strategy_stats = StrategyStats()
+
+
+# sessões keep-alive por host (reaproveita TCP+TLS entre requisições)
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+# validadores HTTP (ETag / Last-Modified)
+# _validators: carregados do DB no início do run (request_url -> {...})
+# _pending: vistos neste run, aguardando o pipeline confirmar (url -> {request_url -> {...}})
+_validators: Dict[str, Dict[str, Optional[str]]] = {}
+_pending: Dict[str, Dict[str, Dict[str, Optional[str]]]] = {}
+_validators_lock = threading.Lock()
+
+# cache de páginas em disco (page_cache.PageCache), opcional
+_page_cache = None
+
+
+def set_page_cache(cache) -> None:
+    global _page_cache
+    _page_cache = cache
+
+
+def _cache_put(url: str, strategy: str, raw: str, text: str) -> None:
+    if _page_cache is None:
+        return
+    try:
+        _page_cache.put(url, strategy, raw=raw, text=text)
+    except Exception:
+        # cache é best-effort: nunca derruba a coleta
+        pass
+
+
+# bytes baixados por página neste run (url -> {"bytes", "wire_bytes", "truncated", "requests"})
+_fetch_metrics: Dict[str, Dict[str, int]] = {}
+_metrics_lock = threading.Lock()
+
+_TEXTUAL_TYPES = ("application/xhtml+xml", "application/xml", "application/json", "application/ld+json")
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([a-zA-Z0-9_\-]+)""", re.IGNORECASE)
+
+
+def pop_fetch_metrics(url: str) -> Dict[str, int]:
+    with _metrics_lock:
+        return _fetch_metrics.pop(normalize_url(url), {})
+
+
+def _record_bytes(page_url: str, nbytes: int, wire_bytes: int, truncated: bool) -> None:
+    with _metrics_lock:
+        m = _fetch_metrics.setdefault(normalize_url(page_url), {})
+        m["bytes"] = m.get("bytes", 0) + nbytes
+        m["wire_bytes"] = m.get("wire_bytes", 0) + wire_bytes
+        m["truncated"] = m.get("truncated", 0) + int(truncated)
+        m["requests"] = m.get("requests", 0) + 1
+
+
+def _is_textual(content_type: str) -> bool:
+    ctype = content_type.split(";")[0].strip().lower()
+    if not ctype:
+        return True
+    return (
+        ctype.startswith("text/")
+        or ctype in _TEXTUAL_TYPES
+        or ctype.endswith("+xml")
+        or ctype.endswith("+json")
+    )
+
+
+def _guess_encoding(resp: requests.Response, first_chunk: bytes) -> str:
+    # charset explícito no header > <meta charset> no início do HTML > utf-8
+    if "charset=" in resp.headers.get("Content-Type", "").lower() and resp.encoding:
+        enc = resp.encoding
+    else:
+        m = _META_CHARSET_RE.search(first_chunk[:4096])
+        enc = m.group(1).decode("ascii") if m else "utf-8"
+    try:
+        codecs.lookup(enc)
+        return enc
+    except LookupError:
+        return "utf-8"
+
+
+def _read_body(resp: requests.Response, page_url: str, max_bytes: int | None = None) -> str:
+    """
+    Lê o corpo de uma resposta em streaming (stream=True), decodificando aos
+    poucos e parando em `max_bytes` (padrão FETCH_MAX_BYTES). Aborta sem
+    baixar o corpo se o Content-Type não for texto. Sempre fecha a resposta.
+    """
+    max_bytes = FETCH_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        ctype = resp.headers.get("Content-Type", "")
+        if not _is_textual(ctype):
+            _record_bytes(page_url, 0, 0, False)
+            raise NotText(f"Conteúdo não-texto ({ctype.split(';')[0]})")
+
+        decoder = None
+        parts = []
+        total = 0
+        truncated = False
+        for chunk in resp.iter_content(chunk_size=_CHUNK_SIZE):
+            if not chunk:
+                continue
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(_guess_encoding(resp, chunk))(errors="replace")
+            if total + len(chunk) > max_bytes:
+                chunk = chunk[: max_bytes - total]
+                truncated = True
+            total += len(chunk)
+            parts.append(decoder.decode(chunk))
+            if truncated:
+                break
+        if decoder is not None:
+            parts.append(decoder.decode(b"", final=True))
+
+        wire = getattr(resp.raw, "tell", lambda: total)() if resp.raw is not None else total
+        _record_bytes(page_url, total, wire, truncated)
+        return "".join(parts)
+    finally:
+        resp.close()
+
+
+def _session_for(url: str) -> requests.Session:
+    host = urlparse(url).netloc.lower()
+    with _sessions_lock:
+        s = _sessions.get(host)
+        if s is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            # HTTP_REPLAY_MODE=record|replay: grava/responde do disco (replay.py)
+            replay.install(s, pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE)
+            _sessions[host] = s
+        return s
+
+
+def set_http_validators(validators: Dict[str, Dict[str, Optional[str]]]) -> None:
+    """Carrega validadores persistidos (ver db.get_all_http_validators)."""
+    with _validators_lock:
+        _validators.clear()
+        _validators.update(validators)
+
+
+def pop_http_validators(url: str) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    Devolve (e esquece) os validadores vistos para a página `url` neste run.
+    Só devem ser persistidos depois que o pipeline salvar a vaga; assim uma
+    falha no meio do caminho não gera 304 para conteúdo nunca processado.
+    """
+    with _validators_lock:
+        return _pending.pop(normalize_url(url), {})
+
+
+def _conditional_headers(request_url: str) -> Dict[str, str]:
+    with _validators_lock:
+        v = _validators.get(request_url) or {}
+    headers = {}
+    if v.get("etag"):
+        headers["If-None-Match"] = v["etag"]
+    if v.get("last_modified"):
+        headers["If-Modified-Since"] = v["last_modified"]
+    return headers
+
+
+def _remember_validators(page_url: str, request_url: str, resp: requests.Response) -> None:
+    etag = resp.headers.get("ETag")
+    last_modified = resp.headers.get("Last-Modified")
+    if not etag and not last_modified:
+        return
+    with _validators_lock:
+        _pending.setdefault(page_url, {})[request_url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+
+def is_dns_error(exc: BaseException) -> bool:
+    """Host não resolve (ex.: domínio digitado errado). Retry não resolve isso."""
+    seen = set()
+    stack = [exc]
+    while stack:
+        e = stack.pop()
+        if e is None or id(e) in seen:
+            continue
+        seen.add(id(e))
+        if isinstance(e, socket.gaierror) or type(e).__name__ == "NameResolutionError":
+            return True
+        stack.extend([e.__cause__, e.__context__, getattr(e, "reason", None)])
+        stack.extend(a for a in getattr(e, "args", ()) if isinstance(a, BaseException))
+    return False
+
+
+def _is_transient(exc: BaseException) -> bool:
+    return isinstance(exc, TRANSIENT) and not is_dns_error(exc)
+
+
+# retry/backoff na unidade "GET + leitura do corpo" (_fetch_direct,
+# _fetch_adapter_body): com stream=True o corpo chega depois dos headers, e
+# timeout/queda no meio dele também é transitório
+_retry_transient = retry(
     reraise=True,
     stop=stop_after_attempt(4),
     wait=wait_exponential_jitter(initial=1, max=20),
-    retry=retry_if_exception_type(TRANSIENT),
+    retry=retry_if_exception(_is_transient),
 )
-def _http_get(url: str, timeout: int = 25) -> requests.Response:
-    _rate.wait(url)
+
+
+def _http_get(
+    url: str,
+    timeout: int = 25,
+    conditional: bool = False,
+    accept: str = "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+) -> requests.Response:
+    _rate.acquire(url)
     headers = {
         "User-Agent": pick_user_agent(),
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept": accept,
         "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
     }
-    return requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
+    if conditional:
+        headers.update(_conditional_headers(url))
+    # stream=True: só status + headers aqui; o corpo é lido por _read_body
+    resp = _session_for(url).get(url, headers=headers, timeout=timeout, allow_redirects=True, stream=True)
+    _rate.feedback(url, resp.status_code, resp.headers.get("Retry-After"))
+    if resp.status_code in THROTTLE_STATUS:
+        resp.close()
+        raise Throttled(f"HTTP {resp.status_code} (throttled)", response=resp)
+    return resp
 
 def _html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html, "lxml")
-    # remove scripts/styles
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    text = soup.get_text("\n", strip=True)
-    return text
+    # extrator plugável (HTML_EXTRACTOR=lxml|bs4), ver extractors.py
+    return extract_text(html)
 
-def _try_jina(url: str) -> str | None:
+def _try_jina(url: str, conditional: bool = False) -> str | None:
     """
     Fallback gratuito: r.jina.ai (boa chance de extrair texto limpo).
+    Levanta NotModified se o reader responder 304.
     """
-    jina_url = "https://r.jina.ai/http://" + normalize_url(url).replace("https://", "").replace("http://", "")
+    jina_url = f"https://{JINA_HOST}/http://" + normalize_url(url).replace("https://", "").replace("http://", "")
     try:
-        _rate.wait(jina_url)
+        _rate.acquire(jina_url)
         headers = {"User-Agent": pick_user_agent()}
-        r = requests.get(jina_url, headers=headers, timeout=25)
-        if r.status_code == 200 and len(r.text) > 400:
-            return r.text
+        if JINA_API_KEY:
+            headers["Authorization"] = f"Bearer {JINA_API_KEY}"
+        if conditional:
+            headers.update(_conditional_headers(jina_url))
+        r = _session_for(jina_url).get(jina_url, headers=headers, timeout=25, stream=True)
+    except Exception:
+        return None
+    _rate.feedback(jina_url, r.status_code, r.headers.get("Retry-After"))
+    if r.status_code != 200:
+        r.close()
+        if r.status_code == 304:
+            raise NotModified(url)
         return None
+    try:
+        text = _read_body(r, url)
     except Exception:
         return None
+    if len(text) > 400:
+        _remember_validators(url, jina_url, r)
+        _cache_put(url, "jina", raw=text, text=text)
+        return text
+    return None
 
-def get_page_text(url: str) -> str:
+def get_cached_page_text(url: str, max_age: float | None = None) -> str | None:
+    """
+    Texto da página a partir do cache em disco (None se não houver).
+    Para coletas diretas o texto é re-extraído do HTML salvo, então mudanças
+    em _html_to_text valem sem recoletar.
+    """
+    if _page_cache is None:
+        return None
+    hit = _page_cache.get(url, max_age=max_age, strategies=("jina", "direct"))
+    if not hit:
+        return None
+    if hit["strategy"] == "direct":
+        return _html_to_text(hit["raw"])
+    return hit["text"]
+
+def get_cached_adapter_body(url: str, max_age: float | None = None) -> str | None:
+    """Corpo (JSON/HTML) que o adapter de ATS leu da URL, do cache em disco (None se não houver)."""
+    if _page_cache is None:
+        return None
+    hit = _page_cache.get(url, max_age=max_age, strategies=("adapter",))
+    return hit["raw"] if hit else None
+
+def get_page_text(
+    url: str,
+    conditional: bool = False,
+    max_age: float | None = None,
+    offline: bool = False,
+) -> str:
     """
     Scraper robusto:
     1) tenta jina
     2) fallback requests + bs4
+    (a ordem é ajustada por domínio conforme strategy_stats; a próxima
+    estratégia só roda se a anterior falhar)
     Levanta exceção em status claramente inválidos.
+
+    conditional=True envia If-None-Match/If-Modified-Since com os validadores
+    conhecidos; se o servidor responder 304, levanta NotModified.
+
+    max_age (segundos): serve do cache em disco se a cópia for mais nova.
+    offline=True: serve só do cache (qualquer idade), sem rede.
     """
     url = normalize_url(url)
 
-    # 1) tenta jina
-    jina = _try_jina(url)
-    if jina:
-        return jina
+    if offline or max_age is not None:
+        cached = get_cached_page_text(url, max_age=None if offline else max_age)
+        if cached is not None:
+            return cached
+        if offline:
+            raise RuntimeError("Offline: página não está no cache")
+
+    # ordem adaptativa por domínio (padrão: jina -> direct)
+    domain = stats_domain(url)
+    last_exc: Exception | None = None
+    blocked: Blocked | None = None
+    for strategy in strategy_stats.order(domain):
+        t0 = time.time()
+        try:
+            if strategy == "jina":
+                text = _try_jina(url, conditional=conditional)
+                if not text:
+                    raise RuntimeError("Jina sem conteúdo útil")
+            else:
+                text = _fetch_direct(url, conditional=conditional)
+        except (NotModified, PageRemoved):
+            strategy_stats.record(domain, strategy, True, int((time.time() - t0) * 1000), 0)
+            raise
+        except Exception as e:
+            strategy_stats.record(domain, strategy, False, int((time.time() - t0) * 1000), 0)
+            if isinstance(e, Blocked):
+                blocked = e
+            # o erro do HTML direto é o mais informativo
+            if last_exc is None or strategy == "direct":
+                last_exc = e
+            continue
+        strategy_stats.record(domain, strategy, True, int((time.time() - t0) * 1000), len(text))
+        return text
+
+    if blocked is not None:
+        # nenhuma estratégia passou do bloqueio: devolve o aviso (vira "duvidosa")
+        with _metrics_lock:
+            _fetch_metrics.setdefault(url, {})["blocked"] = blocked.status_code
+        return blocked.text
+    raise last_exc
+
+@_retry_transient
+def _fetch_direct(url: str, conditional: bool = False) -> str:
+    """requests + bs4 (com retry/backoff, corpo incluso)."""
+    resp = _http_get(url, conditional=conditional)
 
-    # 2) requests normal
-    resp = _http_get(url)
+    if resp.status_code == 304:
+        resp.close()
+        raise NotModified(url)
 
     # status handling
     if resp.status_code in (404, 410):
-        raise RuntimeError(f"Page removed ({resp.status_code})")
+        resp.close()
+        raise PageRemoved(f"Page removed ({resp.status_code})")
     if resp.status_code in (401, 403):
-        # pode ser bloqueio; ainda dá para tentar parsear, mas marque como duvidosa depois
-        # aqui devolvemos texto, mas curto
-        return f"HTTP {resp.status_code} - possível bloqueio ao acessar: {url}\n\n" + (resp.text[:2000] if resp.text else "")
+        # pode ser bloqueio; get_page_text tenta outra estratégia e, se nada
+        # passar, devolve este texto curto (marcado como duvidosa depois)
+        body = _read_body(resp, url, max_bytes=8192)
+        raise Blocked(
+            resp.status_code,
+            f"HTTP {resp.status_code} - possível bloqueio ao acessar: {url}\n\n" + body[:2000],
+        )
 
-    resp.raise_for_status()
+    if resp.status_code >= 400:
+        resp.close()
+        resp.raise_for_status()
 
-    text = _html_to_text(resp.text)
+    html = _read_body(resp, url)
+    text = _html_to_text(html)
     if len(text) < 200:
         raise RuntimeError("Texto muito curto após parse HTML")
+    _remember_validators(url, url, resp)
+    _cache_put(url, "direct", raw=html, text=text)
     return text
 
 
 
+def probe_status(url: str, timeout: int = 10) -> int:
+    """
+    Checagem barata (sem retry): HEAD e, se o servidor não aceitar HEAD,
+    GET em streaming fechado logo após os headers. Devolve o status HTTP.
+    """
+    _rate.acquire(url)
+    headers = {"User-Agent": pick_user_agent()}
+    s = _session_for(url)
+    r = s.head(url, headers=headers, timeout=timeout, allow_redirects=True)
+    if r.status_code in (405, 501):
+        r = s.get(url, headers=headers, timeout=timeout, allow_redirects=True, stream=True)
+        r.close()
+    _rate.feedback(url, r.status_code, r.headers.get("Retry-After"))
+    return r.status_code
+
+
+@_retry_transient
+def _fetch_adapter_body(url: str, page_url: str | None, timeout: int, accept: str, conditional: bool) -> str:
+    """
+    GET dos adapters: mesma sessão/rate limit/retry do HTML, GET condicional
+    (304 -> NotModified da página) e corpo no cache em disco ("adapter").
+    """
+    page_url = normalize_url(page_url or url)
+    resp = _http_get(url, timeout=timeout, conditional=conditional, accept=accept)
+    if resp.status_code == 304:
+        resp.close()
+        raise NotModified(page_url)
+    if resp.status_code in (404, 410):
+        resp.close()
+        raise PageRemoved(f"Page removed ({resp.status_code})")
+    if resp.status_code >= 400:
+        resp.close()
+        resp.raise_for_status()
+    body = _read_body(resp, page_url)
+    _remember_validators(page_url, url, resp)
+    _cache_put(page_url, "adapter", raw=body, text=body)
+    return body
+
+
+def fetch_json(url: str, timeout: int = 25, page_url: str | None = None, conditional: bool = False):
+    """
+    GET de API JSON (adapters de ATS). `page_url`: URL da vaga (chave do
+    cache, métricas e validadores), se diferente da URL da API.
+    404/410 levantam PageRemoved; 304 (conditional=True) levanta NotModified.
+    """
+    return json.loads(_fetch_adapter_body(url, page_url, timeout, "application/json", conditional))
+
+
+def fetch_html(url: str, timeout: int = 25, page_url: str | None = None, conditional: bool = False) -> str:
+    """HTML bruto (sem extração de texto), p/ adapters que leem JSON embutido."""
+    return _fetch_adapter_body(
+        url, page_url, timeout, "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8", conditional
+    )
+
+
 def fetch_text_with_jina(url: str, timeout: int = 25) -> str:
     """
     Tenta usar o reader gratuito do Jina:
@@ -99,7 +522,9 @@ def fetch_text_with_jina(url: str, timeout: int = 25) -> str:
     Retorna texto/markdown.
     """
     jina_url = "https://r.jina.ai/" + url
-    r = requests.get(jina_url, headers=DEFAULT_HEADERS, timeout=timeout)
+    _rate.acquire(jina_url)
+    r = _session_for(jina_url).get(jina_url, headers=DEFAULT_HEADERS, timeout=timeout)
+    _rate.feedback(jina_url, r.status_code, r.headers.get("Retry-After"))
     r.raise_for_status()
     text = r.text.strip()
     return text
@@ -109,16 +534,13 @@ def fetch_text_with_requests(url: str, timeout: int = 25) -> str:
     """
     Fallback: baixa HTML e extrai texto bruto.
     """
-    r = requests.get(url, headers=DEFAULT_HEADERS, timeout=timeout)
+    _rate.acquire(url)
+    r = _session_for(url).get(url, headers=DEFAULT_HEADERS, timeout=timeout)
+    _rate.feedback(url, r.status_code, r.headers.get("Retry-After"))
     r.raise_for_status()
 
-    soup = BeautifulSoup(r.text, "lxml")
-
-    # remove scripts e styles
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-
-    text = soup.get_text(separator="\n")
+    # mesmo extrator de get_page_text (os dois caminhos não divergem mais)
+    text = _html_to_text(r.text)
     lines = [ln.strip() for ln in text.splitlines()]
     lines = [ln for ln in lines if ln]
     return "\n".join(lines)
@@ -0,0 +1,133 @@
+"""
+Estatísticas de coleta por domínio e estratégia ("jina" / "direct").
+
+Guarda taxa de sucesso, latência e tamanho do texto de cada tentativa e usa
+isso para decidir a ordem das estratégias por domínio (ex.: em gupy.io ir
+direto no HTML se o Jina é lento ou falha). Persistido em cache/jobs.db.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import random
+import threading
+from typing import Dict, List, Sequence, Tuple
+from urllib.parse import urlparse
+
+DEFAULT_ORDER = ("jina", "direct")
+
+FETCH_STATS_MIN_SAMPLES = int(os.getenv("FETCH_STATS_MIN_SAMPLES", "3"))
+FETCH_EXPLORE_RATE = float(os.getenv("FETCH_EXPLORE_RATE", "0.1"))
+FETCH_SKIP_BELOW = float(os.getenv("FETCH_SKIP_BELOW", "0.15"))
+# acima disso as contagens são divididas por 2 (dados antigos pesam menos)
+FETCH_STATS_DECAY_AT = 200
+
+# sufixos de 2 níveis comuns nas nossas fontes
+_TWO_LEVEL_SUFFIXES = ("com.br", "net.br", "org.br", "gov.br", "co.uk", "com.au")
+
+
+def stats_domain(url: str) -> str:
+    """
+    Domínio "registrável" para agrupar subdomínios de ATS:
+      fcamara.gupy.io -> gupy.io | unisys.wd5.myworkdayjobs.com -> myworkdayjobs.com
+    """
+    host = urlparse(url).netloc.lower().split(":")[0]
+    parts = [p for p in host.split(".") if p]
+    if len(parts) <= 2 or host.replace(".", "").isdigit():
+        return host
+    if ".".join(parts[-2:]) in _TWO_LEVEL_SUFFIXES:
+        return ".".join(parts[-3:])
+    return ".".join(parts[-2:])
+
+
+class StrategyStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (domain, strategy) -> {"n", "ok", "total_ms", "total_chars"}
+        self._data: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def load(self, rows: List[Dict]) -> None:
+        with self._lock:
+            self._data = {
+                (r["domain"], r["strategy"]): {
+                    "n": r["n"], "ok": r["ok"],
+                    "total_ms": r["total_ms"], "total_chars": r["total_chars"],
+                }
+                for r in rows
+            }
+
+    def rows(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {"domain": d, "strategy": s, **dict(v)}
+                for (d, s), v in sorted(self._data.items())
+            ]
+
+    def record(self, domain: str, strategy: str, ok: bool, ms: int, chars: int) -> None:
+        with self._lock:
+            st = self._data.setdefault(
+                (domain, strategy), {"n": 0, "ok": 0, "total_ms": 0, "total_chars": 0}
+            )
+            if st["n"] >= FETCH_STATS_DECAY_AT:
+                for k in st:
+                    st[k] = st[k] / 2
+            st["n"] += 1
+            st["ok"] += 1 if ok else 0
+            st["total_ms"] += ms
+            st["total_chars"] += chars if ok else 0
+
+    def _summary(self, domain: str, strategy: str) -> Dict[str, float] | None:
+        st = self._data.get((domain, strategy))
+        if not st or st["n"] <= 0:
+            return None
+        return {
+            "n": st["n"],
+            "success": st["ok"] / st["n"],
+            "avg_ms": st["total_ms"] / st["n"],
+            "avg_chars": st["total_chars"] / st["ok"] if st["ok"] else 0.0,
+        }
+
+    def order(self, domain: str, strategies: Sequence[str] = DEFAULT_ORDER) -> List[str]:
+        """
+        Ordem de tentativa para o domínio.
+        - poucos dados: ordem padrão (jina -> direct)
+        - com dados: menor custo esperado (latência média / taxa de sucesso)
+          primeiro; estratégias com sucesso < FETCH_SKIP_BELOW são puladas
+        - com probabilidade FETCH_EXPLORE_RATE: ordem aleatória com todas,
+          para as estatísticas não "congelarem"
+        """
+        strategies = list(strategies)
+        if random.random() < FETCH_EXPLORE_RATE:
+            random.shuffle(strategies)
+            return strategies
+
+        with self._lock:
+            summaries = {s: self._summary(domain, s) for s in strategies}
+        if any(v is None or v["n"] < FETCH_STATS_MIN_SAMPLES for v in summaries.values()):
+            return strategies
+
+        def cost(s: str) -> float:
+            v = summaries[s]
+            return v["avg_ms"] / max(v["success"], 0.05)
+
+        ranked = sorted(strategies, key=cost)
+        kept = [s for s in ranked if summaries[s]["success"] >= FETCH_SKIP_BELOW]
+        return kept or ranked
+
+    def summary_lines(self) -> List[str]:
+        """Uma linha por domínio, para o log do run."""
+        with self._lock:
+            domains = sorted({d for d, _ in self._data})
+            lines = []
+            for d in domains:
+                parts = []
+                for s in DEFAULT_ORDER:
+                    v = self._summary(d, s)
+                    if v is None:
+                        continue
+                    parts.append(
+                        f"{s}: ok={v['success']:.0%} avg_ms={v['avg_ms']:.0f} "
+                        f"avg_chars={v['avg_chars']:.0f} n={v['n']:.0f}"
+                    )
+                lines.append(f"{d} | " + " | ".join(parts))
+        return lines
@@ -1,4 +1,14 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
 import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# "budget": blocos ranqueados por relevância dentro de um orçamento de tokens
+# "legacy": extract_relevant_sections (cabeçalho + miolo + linhas com hints, corte por chars)
+TEXT_REDUCER = os.getenv("TEXT_REDUCER", "budget")
+TEXT_TOKEN_BUDGET = int(os.getenv("TEXT_TOKEN_BUDGET", "1500"))
 
 SECTION_HINTS = [
     "responsabilidades", "atribuições", "atividades",
@@ -16,7 +26,72 @@ REMOVAL_HINTS = [
     "404", "página não encontrada", "pagina nao encontrada",
 ]
 
+# ---------- motor de uma passada ----------
+# Cada lista de hints vira uma regex só (alternação em árvore de prefixos:
+# "s(?:al(?:ario|ário)|obre ...)"); o texto é percorrido uma vez, linha a
+# linha, e cada linha é classificada uma vez (minúsculas, palavras, hints).
+# Quem muda as listas em tempo de execução precisa chamar compile_hints().
+def _hint_regex(hints: Iterable[str]) -> "re.Pattern[str]":
+    trie: Dict[str, dict] = {}
+    for h in hints:
+        node = trie
+        for ch in h:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        if "" in node:
+            return ""  # hint inteiro: os mais longos com o mesmo começo não mudam o "contém"
+        alts = [re.escape(ch) + build(sub) for ch, sub in sorted(node.items())]
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    return re.compile(build(trie) or "(?!)")
+
+
+def _alternation(hints: Iterable[str]) -> str:
+    return "|".join(re.escape(h) for h in sorted(set(hints), key=len, reverse=True)) or "(?!)"
+
+
+def compile_hints() -> None:
+    global _SECTION_RE, _BOILERPLATE_RE
+    _SECTION_RE = _hint_regex(SECTION_HINTS)
+    # palavra inteira (não "conc-entrar"), item de menu só como linha inteira
+    # (não "Home office"); re.M: vale para cada linha de um bloco
+    _BOILERPLATE_RE = re.compile(
+        rf"\b(?:{_alternation(BOILERPLATE_HINTS)})\b|^\W*(?:{_alternation(BOILERPLATE_LINES)})\W*$",
+        re.MULTILINE,
+    )
+
+
+_WS_RUN_RE = re.compile(r"[ \t]+")
+
+
+def iter_clean_lines(text: str) -> Iterator[str]:
+    """Linhas de clean_text, uma por vez (sem montar o texto intermediário)."""
+    if not text:
+        return
+    # \r de \r\n e espaços nas pontas saem no strip; linhas vazias somem,
+    # então não precisa normalizar quebras nem juntar \n repetidos
+    for ln in text.split("\n"):
+        if "\t" in ln or "  " in ln:
+            ln = _WS_RUN_RE.sub(" ", ln)
+        ln = ln.strip()
+        if len(ln) > 2:
+            yield ln
+
+
+def scan_lines(lines: Iterable[str]) -> List[Tuple[str, str, int, bool]]:
+    """(linha, minúsculas, nº de palavras, tem hint de seção) por linha."""
+    search = _SECTION_RE.search
+    out = []
+    for ln in lines:
+        low = ln.lower()
+        out.append((ln, low, len(ln.split()), search(low) is not None))
+    return out
+
+
 def detect_status_from_text(text: str) -> str:
+    # texto inteiro, poucos hints: `in` (busca em C) ganha da regex única
     t = (text or "").lower()
     for h in REMOVAL_HINTS:
         if h in t:
@@ -27,65 +102,185 @@ def detect_status_from_text(text: str) -> str:
 
 def clean_text(text: str) -> str:
     """Limpeza leve (sem destruir conteúdo útil)."""
-    if not text:
+    return "\n".join(iter_clean_lines(text))
+
+def extract_relevant_sections(text: str, max_chars: int = 9000) -> str:
+    """
+    Reduz texto mantendo partes relevantes, evitando duplicar trechos.
+    """
+    rows = scan_lines(iter_clean_lines(text))
+    if not rows:
         return ""
-    t = text
 
-    # Normaliza espaços
-    t = t.replace("\r\n", "\n")
-    t = re.sub(r"[ \t]+", " ", t)
-    t = re.sub(r"\n{3,}", "\n\n", t)
+    # cabeçalho + miolo + linhas com hints, deduplicado mantendo a ordem
+    chosen = [r for r in rows if r[3]][:200]
+    seen = set()
+    out_lines: List[str] = []
+    for part in (rows[:40], rows[40:220], chosen):
+        if out_lines and out_lines[-1] != "":
+            out_lines.append("")  # separador de bloco
+        for ln, low, _, _ in part:
+            if low in seen:
+                continue
+            seen.add(low)
+            out_lines.append(ln)
 
-    # Remove linhas muito repetitivas (heurística simples)
-    lines = [ln.strip() for ln in t.split("\n")]
-    filtered = []
-    for ln in lines:
-        if not ln:
-            continue
-        if len(ln) <= 2:
+    out = "\n".join(out_lines).strip()
+
+    if len(out) > max_chars:
+        out = out[:max_chars] + "\n\n[TRUNCADO]"
+
+    return out
+
+
+# ---------- redução por orçamento de tokens ----------
+# rodapé/banner: casam como palavras inteiras em qualquer ponto da linha
+BOILERPLATE_HINTS = [
+    "cookies", "política de privacidade", "politica de privacidade", "termos de uso",
+    "todos os direitos reservados", "all rights reserved", "cadastre-se",
+    "compartilhar", "pular para o conteúdo", "skip to content",
+]
+# itens de menu: palavras comuns em conteúdo ("Home office", "SharePoint"),
+# só contam quando são a linha inteira
+BOILERPLATE_LINES = ["entrar", "login", "voltar", "menu", "home", "início", "inicio", "share"]
+
+# pedaços de até 4 letras ~ 1 token (BPE em pt/en), pontuação = 1 token
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+_HEADER_MAX_WORDS = 6
+_BLOCK_MAX_LINES = 12
+
+compile_hints()
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa rápida de tokens (sem tokenizer do modelo)."""
+    return len(_TOKEN_RE.findall(text or ""))
+
+
+# linha já classificada: (linha, minúsculas, palavras, hint de seção, cabeçalho, tokens)
+_Row = Tuple[str, str, int, bool, bool, int]
+
+
+def _scan_for_budget(lines: Iterable[str]) -> List[_Row]:
+    """Uma passada: tira menus/rodapés curtos e classifica cada linha."""
+    section, boiler, tokens = _SECTION_RE, _BOILERPLATE_RE.search, _TOKEN_RE.findall
+    rows = []
+    for ln, low, n_words, hint in scan_lines(lines):
+        if n_words <= 3 and boiler(low):
             continue
-        filtered.append(ln)
-    return "\n".join(filtered)
+        header = n_words <= _HEADER_MAX_WORDS and (
+            ln.endswith(":") or ln.isupper() or (hint and section.match(low) is not None)
+        )
+        rows.append((ln, low, n_words, hint, header, len(tokens(ln))))
+    return rows
 
-def extract_relevant_sections(text: str, max_chars: int = 9000) -> str:
+
+def _split_blocks(rows: List[_Row]) -> List[List[_Row]]:
+    """Um bloco começa em cada cabeçalho (ou a cada _BLOCK_MAX_LINES linhas)."""
+    blocks: List[List[_Row]] = []
+    cur: List[_Row] = []
+    for row in rows:
+        if cur and (row[4] or len(cur) >= _BLOCK_MAX_LINES):
+            blocks.append(cur)
+            cur = []
+        cur.append(row)
+    if cur:
+        blocks.append(cur)
+    return blocks
+
+
+def _block_score(block: List[_Row], keywords: List[str]) -> float:
+    n_words = max(1, sum(r[2] for r in block))
+
+    score = 0.0
+    if block[0][3]:
+        score += 3.0  # cabeçalho de seção conhecida
+    score += sum(1 for r in block if r[3]) * 0.5
+    text = None
+    if keywords:
+        text = "\n".join(r[1] for r in block)
+        hits = sum(text.count(k) for k in keywords)
+        score += min(3.0, 30.0 * hits / n_words)  # densidade dos termos_busca
+    # prosa (linhas longas) vale mais que menu/rodapé (linhas curtas)
+    avg_words = n_words / len(block)
+    score += min(2.0, avg_words / 6)
+    if avg_words < 5:
+        text = "\n".join(r[1] for r in block) if text is None else text
+        if _BOILERPLATE_RE.search(text):
+            score -= 2.0
+    return score
+
+
+def reduce_to_budget(
+    text: str,
+    max_tokens: Optional[int] = None,
+    keywords: Optional[Iterable[str]] = None,
+) -> str:
     """
-    Reduz texto mantendo partes relevantes, evitando duplicar trechos.
+    Reduz o texto para caber em `max_tokens` (estimados), mantendo os blocos
+    mais relevantes na ordem original:
+    - cabeçalhos de seção (SECTION_HINTS) e continuação da seção (o bloco
+      seguinte a um cabeçalho relevante herda parte da nota)
+    - densidade dos termos de busca (config.json -> termos_busca)
+    - prosa acima de menus/rodapés (BOILERPLATE_HINTS / BOILERPLATE_LINES)
+    O primeiro bloco que não é menu (título/empresa) entra sempre.
     """
-    t = clean_text(text)
-    if not t:
+    max_tokens = max_tokens or TEXT_TOKEN_BUDGET
+    lines = list(iter_clean_lines(text))
+    if not lines:
         return ""
+    t = "\n".join(lines)
+    if estimate_tokens(t) <= max_tokens:
+        return t
 
-    lines = t.split("\n")
+    kws = [k.lower() for k in (keywords or []) if k]
+    blocks = _split_blocks(_scan_for_budget(lines))
+    if not blocks:
+        return ""
+    scores = [_block_score(b, kws) for b in blocks]
+    for i in range(1, len(blocks)):
+        # continuidade: seção longa quebrada em vários blocos
+        if not blocks[i][0][4] and scores[i - 1] >= 3.0:
+            scores[i] += 0.5 * scores[i - 1]
+    # título/empresa: primeiro bloco que não é menu
+    first = next((i for i, sc in enumerate(scores) if sc > 0), 0)
+    scores[first] += 100.0
 
-    head_lines = lines[:40]
-    mid_lines = lines[40:220]
+    costs = [sum(r[5] for r in b) for b in blocks]
+    order = sorted(range(len(blocks)), key=lambda i: scores[i] / max(1, costs[i]) ** 0.5, reverse=True)
 
-    chosen_lines = []
-    for ln in lines:
-        low = ln.lower()
-        if any(h in low for h in SECTION_HINTS):
-            chosen_lines.append(ln)
+    chosen, used = set(), 0
+    for i in order:
+        if scores[i] <= 0:
+            continue
+        if used + costs[i] > max_tokens:
+            continue
+        chosen.add(i)
+        used += costs[i]
 
-    # monta e deduplica mantendo ordem
-    combined = head_lines + [""] + mid_lines + [""] + chosen_lines[:200]
+    if not chosen:
+        # nem o bloco do título coube: corta por linhas
+        out, used = [], 0
+        for r in blocks[first]:
+            if used + r[5] > max_tokens:
+                break
+            out.append(r[0])
+            used += r[5]
+        return "\n".join(out)
 
     seen = set()
     out_lines = []
-    for ln in combined:
-        key = ln.strip().lower()
-        if not key:
-            # mantém separadores de bloco (vazios) com parcimônia
-            if out_lines and out_lines[-1] != "":
-                out_lines.append("")
-            continue
-        if key in seen:
-            continue
-        seen.add(key)
-        out_lines.append(ln)
-
-    out = "\n".join(out_lines).strip()
+    for i in sorted(chosen):
+        for r in blocks[i]:
+            if r[1] in seen:
+                continue
+            seen.add(r[1])
+            out_lines.append(r[0])
+    return "\n".join(out_lines)
 
-    if len(out) > max_chars:
-        out = out[:max_chars] + "\n\n[TRUNCADO]"
 
-    return out
+def reduce_text(text: str, keywords: Optional[Iterable[str]] = None) -> str:
+    """Redução configurada (TEXT_REDUCER): o que vai para a IA."""
+    if TEXT_REDUCER == "legacy":
+        return extract_relevant_sections(text, max_chars=9000)
+    return reduce_to_budget(text, TEXT_TOKEN_BUDGET, keywords)
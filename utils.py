@@ -3,7 +3,6 @@ import json
 import hashlib
 from datetime import datetime
 from typing import Any, Dict, List
-import time
 import random
 from urllib.parse import urlparse, urlunparse
 import re
@@ -22,6 +21,10 @@ def detect_platform(url: str) -> str:
         return "linkedin"
     if "indeed." in host:
         return "indeed"
+    if "greenhouse.io" in host:
+        return "greenhouse"
+    if "myworkdayjobs.com" in host:
+        return "workday"
     return "unknown"
 
 def extract_job_id(url: str) -> str:
@@ -66,29 +69,26 @@ def normalize_url(url: str) -> str:
         norm = norm[:-1]
     return norm
 
-class DomainRateLimiter:
+def parse_duration(value: str) -> float:
     """
-    Rate limit por domínio com jitter.
-    Ex.: min_interval=1.2 => no máximo ~0.8 req/s por domínio.
+    "90" -> 90s | "30m" -> 1800s | "6h" -> 21600s | "2d" -> 172800s
     """
-    def __init__(self, min_interval: float = 1.2, jitter: float = 0.25):
-        self.min_interval = float(min_interval)
-        self.jitter = float(jitter)
-        self._last = {}  # domain -> time
-
-    def wait(self, url: str):
-        domain = urlparse(url).netloc.lower()
-        now = time.time()
-        last = self._last.get(domain, 0.0)
-        elapsed = now - last
-        target = self.min_interval + random.uniform(0, self.jitter)
-        if elapsed < target:
-            time.sleep(target - elapsed)
-        self._last[domain] = time.time()
+    v = str(value).strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if v and v[-1] in units:
+        return float(v[:-1]) * units[v[-1]]
+    return float(v)
 
 def now_iso() -> str:
     return datetime.now().isoformat(timespec="seconds")
 
+def iso_to_ts(value) -> float | None:
+    """Timestamp de uma data de now_iso() (None se vazia/inválida)."""
+    try:
+        return datetime.fromisoformat(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
 
 def ensure_dirs():
     os.makedirs("output", exist_ok=True)